@@ -0,0 +1,85 @@
+"""
+Database connection setup cost, through Django's own connection handling.
+
+Times what a cheap request pays for its first query under each setting:
+a new connection (DB_CONN_MAX_AGE=0), a reused one (persistent), and a
+reused one that is health-checked first (DB_CONN_HEALTH_CHECKS, one extra
+round trip per request). With DB_POOL=True in the environment (psycopg 3)
+it times a checkout from the pool instead, which includes the pool's own
+health check. Uses the POSTGRES_* settings; no tables are touched.
+
+    python benchmarks/db_connections.py --iterations 500
+    POSTGRES_HOST=127.0.0.1 python benchmarks/db_connections.py   # TCP instead of a local socket
+    DB_POOL=True python benchmarks/db_connections.py
+"""
+import argparse, json, os, statistics, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+
+
+def query():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def new_connection():
+    connection.close()  # what CONN_MAX_AGE=0 does after every request (with a pool: hands it back)
+
+
+def request_started():
+    # What close_old_connections does when a request starts; with health checks enabled the
+    # request's first query is preceded by a check that the connection still works.
+    connection.close_if_unusable_or_obsolete()
+
+
+def time_requests(before, iterations):
+    # Milliseconds from the start of a "request" to its first query's result.
+    samples = []
+    for _ in range(iterations):
+        before()
+        started = time.perf_counter()
+        query()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'mean_ms': round(statistics.mean(samples), 3),
+        'p50_ms': round(samples[len(samples) // 2], 3),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=500)
+    args = parser.parse_args()
+
+    database = settings.DATABASES['default']
+    pooled = 'pool' in database['OPTIONS']
+    database['CONN_HEALTH_CHECKS'] = False  # fresh connections are never checked anyway
+    query()
+    connection.close_at = None  # keep this connection whatever DB_CONN_MAX_AGE says
+    connection.health_check_enabled = False
+    report = {'host': database['HOST'], 'pool': pooled, 'iterations': args.iterations}
+    report['reused'] = time_requests(request_started, args.iterations)
+    if pooled:
+        # The pool checks connections itself when it hands them out.
+        report['pool_checkout'] = time_requests(new_connection, args.iterations)
+    else:
+        connection.health_check_enabled = True
+        report['reused_health_checked'] = checked = time_requests(request_started, args.iterations)
+        report['new_connection'] = fresh = time_requests(new_connection, args.iterations)
+        report['saved_ms_per_request'] = round(fresh['mean_ms'] - checked['mean_ms'], 3)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Content export benchmark: peak Python memory and throughput of the
+streaming NDJSON/CSV export at growing row counts, next to serializing the
+same rows with ContentSerializer in one go (what a full API pull builds).
+
+Tops the content table up to the largest size with synthetic rows, then
+exports the first N rows of each size. Run it against a scratch database.
+
+    POSTGRES_DB=bench python benchmarks/export_bench.py --sizes 1000 10000 100000 1000000
+"""
+import argparse, json, os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from content.models import Content  # noqa: E402
+from content.serializers.content_serializers import ContentSerializer  # noqa: E402
+from content.services.export import stream_export  # noqa: E402
+
+
+def grow(target, batch_size=5000):
+    owner, _ = get_user_model().objects.get_or_create(username='export-bench')
+    current = Content.objects.count()
+    while current < target:
+        count = min(batch_size, target - current)
+        Content.objects.bulk_create([
+            Content(
+                title=f'Post {current + i}', body='Lorem ipsum dolor sit amet. ' * 40, summary='Lorem ipsum.',
+                sentiment='neutral', topics=['lorem', 'ipsum'], owner=owner, analysis_status='done',
+            )
+            for i in range(count)
+        ])
+        current += count
+        print(f'  {current}/{target} rows', file=sys.stderr, flush=True)
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': round(elapsed, 2), 'peak_mb': round(peak / 2 ** 20, 1), 'output_mb': round(size / 2 ** 20, 1)}
+
+
+def first_rows(size):
+    last_pk = Content.objects.order_by('pk').values_list('pk', flat=True)[size - 1]
+    return Content.objects.filter(pk__lte=last_pk)
+
+
+def export(queryset, output):
+    chunks, _ = stream_export(queryset, output, settings.EXPORT_CHUNK_SIZE)
+    return sum(len(chunk) for chunk in chunks)
+
+
+def serialize(queryset):
+    data = ContentSerializer(queryset.select_related('category', 'owner'), many=True).data
+    return len(json.dumps(data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--serializer-max', type=int, default=100000, help='Largest size also run through ContentSerializer.')
+    args = parser.parse_args()
+
+    grow(max(args.sizes))
+    results = []
+    for size in sorted(args.sizes):
+        queryset = first_rows(size)
+        result = {
+            'rows': size,
+            'ndjson': measure(lambda: export(queryset, 'ndjson')),
+            'csv': measure(lambda: export(queryset, 'csv')),
+        }
+        if size <= args.serializer_max:
+            result['serializer'] = measure(lambda: serialize(queryset))
+        results.append(result)
+        print(json.dumps(result), file=sys.stderr, flush=True)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Local stand-in for the GROQ chat-completions API, for load tests.
+
+Answers every POST with a canned analysis after a configurable delay, so
+benchmarks measure our own stack rather than GROQ. The delay can grow with
+the prompt size, and chosen shares of requests get an error status, a 429
+with Retry-After, or a reply that is not valid analysis JSON. Token usage
+is estimated like GROQ reports it. Requests with "stream": true get the
+reply as server-sent events: the first token after --ttft, the rest spread
+over the remaining latency; streams the client abandons are counted as
+cancelled. GET on any path returns request counts as JSON. Built on
+asyncio streams, so it can hold thousands of slow requests at once.
+
+    python benchmarks/fake_groq.py --port 9999 --latency 0.5
+    python benchmarks/fake_groq.py --latency 0.3 --latency-per-ktok 0.2 --error-rate 0.02 --rate-limit-rate 0.05
+    GROQ_API_URL=http://127.0.0.1:9999/openai/v1/chat/completions ...
+"""
+import argparse, asyncio, json, random, re
+from http import HTTPStatus
+
+
+REPLY = json.dumps({
+    'summary': 'A short summary of the text.',
+    'sentiment': 'neutral',
+    'topics': ['benchmark', 'testing'],
+    'recommendations': 'Read more about load testing.',
+})
+
+
+MALFORMED_REPLY = 'Sure! Here is the analysis you asked for: summary - a text about things.'
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def completion(content, prompt_tokens=0):
+    completion_tokens = estimate_tokens(content)
+    return {
+        'id': 'chatcmpl-fake',
+        'object': 'chat.completion',
+        'model': 'llama3-8b-8192',
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens},
+    }
+
+
+def stream_chunk(content=None, usage=None):
+    chunk = {
+        'id': 'chatcmpl-fake',
+        'object': 'chat.completion.chunk',
+        'model': 'llama3-8b-8192',
+        'choices': [{'index': 0, 'delta': {'content': content} if content else {}, 'finish_reason': None if content else 'stop'}],
+    }
+    if usage:
+        chunk['x_groq'] = {'usage': usage}
+    return f'data: {json.dumps(chunk)}\n\n'.encode()
+
+
+class FakeGroq:
+    def __init__(self, latency, jitter, error_rate, error_status=503, rate_limit_rate=0.0, retry_after=1,
+                 malformed_rate=0.0, latency_per_ktok=0.0, ttft=0.2):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.malformed_rate = malformed_rate
+        self.latency_per_ktok = latency_per_ktok
+        self.ttft = ttft
+        self.counts = {
+            'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0, 'malformed': 0, 'prompt_tokens': 0,
+            'streamed': 0, 'cancelled': 0,
+        }
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                extra = ''
+                if request_line.startswith(b'GET '):
+                    status, payload = '200 OK', self.counts
+                else:
+                    self.counts['requests'] += 1
+                    status, payload, rest = await self.respond(body)
+                    if status.startswith('429'):
+                        extra = f'Retry-After: {self.retry_after}\r\n'
+                    if rest is not None and status.startswith('200'):
+                        if not await self.stream(reader, writer, payload, rest):
+                            break
+                        continue
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f'HTTP/1.1 {status}\r\nContent-Type: application/json\r\n{extra}'
+                    f'Content-Length: {len(data)}\r\nConnection: keep-alive\r\n\r\n'.encode() + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, body):
+        # (status, payload, seconds left to spread a streamed reply over, or None when not streamed)
+        try:
+            request = json.loads(body)
+            messages = request.get('messages') or []
+            prompt_tokens = sum(estimate_tokens(str(message.get('content', ''))) for message in messages)
+            stream = request.get('stream') is True
+        except (ValueError, AttributeError):
+            prompt_tokens, stream = 0, False
+        draw = random.random()
+        if draw < self.rate_limit_rate:
+            # GROQ rejects over-limit requests straight away.
+            self.counts['rate_limited'] += 1
+            return '429 Too Many Requests', {'error': {'message': 'Rate limit reached', 'type': 'tokens'}}, None
+        delay = max(0.0, self.latency + prompt_tokens / 1000 * self.latency_per_ktok + random.uniform(-self.jitter, self.jitter))
+        first = min(self.ttft, delay) if stream else delay
+        await asyncio.sleep(first)
+        rest = delay - first if stream else None
+        draw -= self.rate_limit_rate
+        if draw < self.error_rate:
+            self.counts['errors'] += 1
+            return f'{self.error_status} {HTTPStatus(self.error_status).phrase}', {'error': {'message': 'Injected failure'}}, None
+        self.counts['prompt_tokens'] += prompt_tokens
+        if draw - self.error_rate < self.malformed_rate:
+            self.counts['malformed'] += 1
+            return '200 OK', completion(MALFORMED_REPLY, prompt_tokens), rest
+        self.counts['ok'] += 1
+        return '200 OK', completion(REPLY, prompt_tokens), rest
+
+    async def stream(self, reader, writer, payload, duration):
+        """
+        Sends `payload`'s reply word by word as chunked server-sent events
+        over `duration` seconds. Returns False if the client went away.
+        """
+        self.counts['streamed'] += 1
+        tokens = re.findall(r'\S+\s*', payload['choices'][0]['message']['content'])
+        events = [stream_chunk(token) for token in tokens] + [stream_chunk(usage=payload['usage']), b'data: [DONE]\n\n']
+        writer.write(
+            b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n'
+            b'Connection: keep-alive\r\n\r\n'
+        )
+        for index, event in enumerate(events):
+            if index and index < len(tokens):
+                await asyncio.sleep(duration / max(len(tokens) - 1, 1))
+            if reader.at_eof() or writer.is_closing():
+                self.counts['cancelled'] += 1
+                return False
+            writer.write(f'{len(event):x}\r\n'.encode() + event + b'\r\n')
+            try:
+                await writer.drain()
+            except ConnectionError:
+                self.counts['cancelled'] += 1
+                return False
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+        return True
+
+
+async def serve(host, port, fake):
+    server = await asyncio.start_server(fake.handle, host, port, backlog=4096)
+    print(f'Fake GROQ listening on http://{host}:{port}/openai/v1/chat/completions', flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds before each reply.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Uniform +/- jitter on the latency, in seconds.')
+    parser.add_argument('--latency-per-ktok', type=float, default=0.0, help='Extra seconds per 1000 prompt tokens.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with --error-status.')
+    parser.add_argument('--error-status', type=int, default=503, help='Status of injected failures.')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of requests answered at once with 429.')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429s.')
+    parser.add_argument('--ttft', type=float, default=0.2, help='Seconds before the first token of streamed replies.')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='Fraction of replies that are not analysis JSON.')
+    args = parser.parse_args()
+    fake = FakeGroq(
+        args.latency, args.jitter, args.error_rate, error_status=args.error_status, rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after, malformed_rate=args.malformed_rate, latency_per_ktok=args.latency_per_ktok,
+        ttft=args.ttft,
+    )
+    try:
+        asyncio.run(serve(args.host, args.port, fake))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Concurrent load generator for the AI analysis endpoints.
+
+Logs in through /api/token/, then keeps `--concurrency` requests in flight
+until `--requests` have completed, sending a unique text each time so the
+analysis cache never answers. Prints a JSON report (throughput, latency
+percentiles, status codes).
+
+    python benchmarks/load_ai.py --base-url http://127.0.0.1:8000 \
+        --path /api/ai/analyze/ --username bench --password benchpass123
+"""
+import argparse, asyncio, json, time, uuid
+import httpx
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return round(values[index] * 1000, 1)
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        response = await client.post('/api/token/', json={'username': args.username, 'password': args.password})
+        response.raise_for_status()
+        headers = {'Authorization': f"Bearer {response.json()['access']}"}
+
+        latencies, statuses = [], {}
+        remaining = args.requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                payload = {args.field: f'Benchmark text {uuid.uuid4()}', **args.extra}
+                started = time.perf_counter()
+                try:
+                    reply = await client.post(args.path, json=payload, headers=headers)
+                    code = str(reply.status_code)
+                except httpx.HTTPError as e:
+                    code = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[code] = statuses.get(code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        'path': args.path,
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'elapsed_s': round(elapsed, 2),
+        'rps': round(args.requests / elapsed, 1),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--path', default='/api/ai/analyze/')
+    parser.add_argument('--field', default='text', help='JSON field carrying the generated text ("body" for content).')
+    parser.add_argument('--extra', type=json.loads, default={}, help='Extra JSON fields, e.g. \'{"title": "Bench"}\'.')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Related-content index benchmark: build time, size on disk and top-k query
+latency of the memory-mapped similarity index at growing item counts.
+
+Texts are synthetic: each belongs to one of `--topics` topics that draw most
+of their words from their own vocabulary, so the share of top-k neighbours
+from the query's topic shows whether the hashed vectors rank sensibly. The
+int8 vectors are also compared with exact float32 scores (recall@k). No
+database is needed; the index is written to a temporary directory.
+
+    python benchmarks/related_bench.py --sizes 10000 100000
+"""
+import argparse, json, os, random, shutil, statistics, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+from django.conf import settings  # noqa: E402
+from content.services.similarity import SimilarityIndex, content_text, dense_vectors  # noqa: E402
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ren', 'tor', 'vi', 'sa', 'nu', 'pel', 'dra', 'qui', 'zen', 'bo', 'tek', 'lu', 'mar']
+
+
+def words(count, rng):
+    found = set()
+    while len(found) < count:
+        found.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(found)
+
+
+def corpus(size, topics, rng):
+    shared = words(2000, rng)
+    own = [words(60, random.Random(rng.random())) for _ in range(topics)]
+    rows = []
+    for pk in range(1, size + 1):
+        topic = pk % topics
+        # About a third of the words come from the topic, the rest from a shared vocabulary.
+        body = ' '.join(rng.choice(own[topic]) if rng.random() < 0.35 else rng.choice(shared) for _ in range(rng.randint(80, 300)))
+        title = ' '.join(rng.choice(own[topic]) for _ in range(4))
+        rows.append((pk, content_text(title, body)))
+    return rows
+
+
+def percentile(samples, share):
+    return round(samples[min(len(samples) - 1, int(len(samples) * share))], 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--topics', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    results = []
+    for size in sorted(args.sizes):
+        rng = random.Random(args.seed)
+        print(f'Generating {size} texts...', file=sys.stderr, flush=True)
+        rows = corpus(size, args.topics, rng)
+        path = tempfile.mkdtemp()
+        try:
+            index = SimilarityIndex(path, settings.SIMILARITY_DIMENSIONS)
+            started = time.perf_counter()
+            index.rebuild(lambda: iter(rows))
+            build = time.perf_counter() - started
+            disk = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+            mapped = index._refresh()
+            exact = dense_vectors([text for _, text in rows], mapped.df, mapped.documents, index.dimensions)
+
+            samples, same_topic, recall = [], [], []
+            for pk in rng.sample(range(1, size + 1), args.queries):
+                started = time.perf_counter()
+                found = index.related(pk, args.k)
+                samples.append((time.perf_counter() - started) * 1000)
+                ids = [other for other, _ in found]
+                same_topic.append(sum(other % args.topics == pk % args.topics for other in ids) / args.k)
+                scores = exact @ exact[pk - 1]
+                scores[pk - 1] = -1
+                best = set((np.argsort(-scores)[:args.k] + 1).tolist())
+                recall.append(len(best & set(ids)) / args.k)
+            samples.sort()
+            result = {
+                'items': size,
+                'build_s': round(build, 1),
+                'disk_mb': round(disk / 2 ** 20, 1),
+                'p50_ms': percentile(samples, 0.5),
+                'p95_ms': percentile(samples, 0.95),
+                'p99_ms': percentile(samples, 0.99),
+                'same_topic': round(statistics.mean(same_topic), 3),
+                'recall_vs_float32': round(statistics.mean(recall), 3),
+            }
+        finally:
+            shutil.rmtree(path)
+        results.append(result)
+        print(json.dumps(result), file=sys.stderr, flush=True)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
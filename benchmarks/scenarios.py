@@ -0,0 +1,218 @@
+"""
+Scripted load scenarios against a running server: category list, content
+list, search, detail, create and update, and AI analyze.
+
+Logs in as a seeded user, then runs each scenario in turn with
+`--concurrency` requests in flight until `--requests` have completed.
+Reports throughput, latency and time-to-first-byte percentiles (the two
+differ for streamed responses), status codes and, from the Server-Timing
+header (METRICS_ENABLED), DB queries and GROQ calls per request. The report is printed and written to `--output` as JSON; pass an
+earlier report as `--baseline` to add the change in RPS and latency.
+
+    python manage.py seed_content --content 10000
+    python benchmarks/fake_groq.py --latency 0.3 &
+    python benchmarks/scenarios.py --base-url http://127.0.0.1:8000 --output run.json
+    python benchmarks/scenarios.py --only list search --baseline run.json
+    python benchmarks/scenarios.py --only analyze --analyze-extra '{"stream": true}'
+"""
+import argparse, asyncio, json, random, re, statistics, subprocess, sys, time, uuid
+from datetime import datetime, timezone
+import httpx
+
+SCENARIOS = ['categories', 'list', 'search', 'detail', 'create', 'update', 'analyze']
+TIMING = re.compile(r'(\w+);dur=([\d.]+)(?:;desc="(\d+) )?')
+WORDS = (
+    'data model system user network cloud design market energy health policy travel music science '
+    'history software privacy climate finance sports learning security city food research'
+).split()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return round(values[index] * 1000, 1)
+
+
+def text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + f'. {uuid.uuid4()}.'
+
+
+def server_timing(header):
+    # {'db': (ms, queries), 'llm': (ms, calls), 'total': (ms, None)}
+    return {name: (float(dur), int(count) if count else None) for name, dur, count in TIMING.findall(header or '')}
+
+
+class Runner:
+    def __init__(self, client, headers, args):
+        self.client = client
+        self.headers = headers
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.ids, self.terms, self.own_ids, self.texts = [], [], [], []
+
+    async def prepare(self):
+        # Detail and search targets come from the first page of content; searches use words from its titles.
+        reply = await self.client.get('/api/content/', params={'page_size': 100}, headers=self.headers)
+        reply.raise_for_status()
+        rows = reply.json()['results']
+        if not rows:
+            sys.exit('No content visible; run `manage.py seed_content` first.')
+        self.ids = [row['id'] for row in rows]
+        self.terms = sorted({word for row in rows for word in row['title'].lower().split() if len(word) > 3})
+
+    def request(self, name):
+        rng = self.rng
+        if name == 'categories':
+            return 'GET', '/api/categories/', {}
+        if name == 'list':
+            return 'GET', '/api/content/', {}
+        if name == 'search':
+            return 'GET', '/api/content/', {'params': {'search': rng.choice(self.terms)}}
+        if name == 'detail':
+            return 'GET', f'/api/content/{rng.choice(self.ids)}/', {}
+        if name == 'create':
+            return 'POST', '/api/content/', {'json': {'title': text(rng, 5), 'body': text(rng, rng.randint(100, 400))}}
+        if name == 'update':
+            return 'PATCH', f'/api/content/{rng.choice(self.own_ids)}/', {'json': {'body': text(rng, rng.randint(100, 400))}}
+        # Analyze: unique texts miss the analysis cache; --cache-share of them repeat an earlier one.
+        if self.texts and rng.random() < self.args.cache_share:
+            body = rng.choice(self.texts)
+        else:
+            body = text(rng, rng.randint(50, 300))
+            self.texts.append(body)
+        return 'POST', self.args.analyze_path, {'json': {'text': body, **self.args.analyze_extra}}
+
+    async def run(self, name):
+        if name == 'update' and not self.own_ids:
+            # Rows of our own to update when the create scenario did not run.
+            for _ in range(min(self.args.concurrency, 50)):
+                method, path, kwargs = self.request('create')
+                reply = await self.client.request(method, path, headers=self.headers, **kwargs)
+                reply.raise_for_status()
+                self.own_ids.append(reply.json()['id'])
+
+        latencies, first_bytes, statuses, timings = [], [], {}, []
+        remaining = self.args.requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                method, path, kwargs = self.request(name)
+                started = time.perf_counter()
+                try:
+                    async with self.client.stream(method, path, headers=self.headers, **kwargs) as reply:
+                        body = b''
+                        async for chunk in reply.aiter_bytes():
+                            if not body:
+                                first_bytes.append(time.perf_counter() - started)
+                            body += chunk
+                    code = str(reply.status_code)
+                except httpx.HTTPError as e:
+                    code, reply = type(e).__name__, None
+                latencies.append(time.perf_counter() - started)
+                statuses[code] = statuses.get(code, 0) + 1
+                if reply is not None:
+                    timings.append(server_timing(reply.headers.get('Server-Timing')))
+                    if name == 'create' and reply.status_code == 201:
+                        self.own_ids.append(json.loads(body)['id'])
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+        def mean(key, index):
+            values = [timing[key][index] for timing in timings if key in timing and timing[key][index] is not None]
+            return round(statistics.mean(values), 2) if values else None
+
+        return {
+            'scenario': name,
+            'requests': self.args.requests,
+            'concurrency': self.args.concurrency,
+            'elapsed_s': round(elapsed, 2),
+            'rps': round(self.args.requests / elapsed, 1),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'ttfb_p50_ms': percentile(first_bytes, 50),
+            'ttfb_p95_ms': percentile(first_bytes, 95),
+            'statuses': statuses,
+            'db_queries_per_request': mean('db', 1),
+            'db_ms_per_request': mean('db', 0),
+            'llm_calls_per_request': mean('llm', 1),
+            'server_ms_per_request': mean('total', 0),
+        }
+
+
+def compare(result, baseline):
+    # Relative change against the same scenario of an earlier report (positive RPS and negative latency are better).
+    before = next((item for item in baseline.get('scenarios', []) if item['scenario'] == result['scenario']), None)
+    if not before:
+        return None
+    return {
+        key: round((result[key] - before[key]) / before[key] * 100, 1) if before.get(key) and result.get(key) is not None else None
+        for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms', 'ttfb_p50_ms', 'db_queries_per_request')
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        reply = await client.post('/api/token/', json={'username': args.username, 'password': args.password})
+        reply.raise_for_status()
+        runner = Runner(client, {'Authorization': f"Bearer {reply.json()['access']}"}, args)
+        await runner.prepare()
+        results = []
+        for name in (name for name in SCENARIOS if name in args.only):
+            print(f'Running {name}...', file=sys.stderr, flush=True)
+            result = await runner.run(name)
+            if args.baseline:
+                result['vs_baseline_pct'] = compare(result, args.baseline)
+            results.append(result)
+            print(json.dumps(result), file=sys.stderr, flush=True)
+    return {
+        'started_at': args.started_at,
+        'base_url': args.base_url,
+        'git_commit': git_commit(),
+        'seed': args.seed,
+        'scenarios': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--username', default='bench-1', help='A user created by seed_content (default prefix).')
+    parser.add_argument('--password', default='benchpass123')
+    parser.add_argument('--only', nargs='+', choices=SCENARIOS, default=SCENARIOS, help='Scenarios to run, in the usual order.')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=500, help='Requests per scenario.')
+    parser.add_argument('--analyze-path', default='/api/ai/analyze/', help='e.g. /api/async/ai/analyze/ on the ASGI server.')
+    parser.add_argument('--analyze-extra', type=json.loads, default={}, help='Extra JSON fields, e.g. \'{"engine": "local"}\'.')
+    parser.add_argument('--cache-share', type=float, default=0.0, help='Share of analyze requests that repeat an earlier text.')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Also write the JSON report to this file.')
+    parser.add_argument('--baseline', type=argparse.FileType(), help='Earlier report to compare against.')
+    args = parser.parse_args()
+    args.baseline = json.load(args.baseline) if args.baseline else None
+    args.started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Content search benchmark: Postgres full-text search vs the old `icontains`
+scan over seven columns.
+
+Grows the content table to each requested size with synthetic rows, then
+times the first page (20 rows) of `?search=` for common, rare and missing
+terms.
+Run it against a scratch database; it inserts rows and never deletes them.
+
+    POSTGRES_DB=bench python benchmarks/search_bench.py --sizes 10000 100000 1000000
+"""
+import argparse, json, os, random, statistics, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Q  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from content.filters import FullTextSearchFilter  # noqa: E402
+from content.models import Content  # noqa: E402
+
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ren', 'tor', 'vi', 'sa', 'nu', 'pel', 'dra', 'qui', 'zen', 'bo', 'tek', 'lu', 'mar']
+LEGACY_FIELDS = ['title', 'body', 'metadata', 'summary', 'sentiment', 'topics', 'recommendations']
+
+
+def vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words)
+    weights = [1 / (rank + 1) for rank in range(len(words))]  # Zipf-like word frequencies
+    return words, weights
+
+
+def sentence(words, weights, rng, length):
+    return ' '.join(rng.choices(words, weights, k=length))
+
+
+def grow(target, owner, words, weights, rng, batch_size=5000):
+    current = Content.objects.count()
+    while current < target:
+        count = min(batch_size, target - current)
+        Content.objects.bulk_create([
+            Content(
+                title=sentence(words, weights, rng, 6),
+                body=sentence(words, weights, rng, rng.randint(100, 400)),
+                summary=sentence(words, weights, rng, 30),
+                sentiment=rng.choice(['positive', 'neutral', 'negative']),
+                topics=rng.choices(words, weights, k=3),
+                recommendations=sentence(words, weights, rng, 15),
+                metadata={'source': 'bench'},
+                owner=owner,
+                analysis_status='done',
+            )
+            for _ in range(count)
+        ])
+        current += count
+        print(f'  {current}/{target} rows', file=sys.stderr, flush=True)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE content_content')
+
+
+def timed(fn, terms):
+    samples = []
+    for term in terms:
+        started = time.perf_counter()
+        fn(term)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'p50_ms': round(statistics.median(samples), 2),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 2),
+        'max_ms': round(samples[-1], 2),
+    }
+
+
+def fulltext(term):
+    request = Request(APIRequestFactory().get('/api/content/', {'search': term}))
+    return list(FullTextSearchFilter().filter_queryset(request, Content.objects.all(), None)[:20])
+
+
+def legacy(term):
+    query = Q()
+    for field in LEGACY_FIELDS:
+        query |= Q(**{f'{field}__icontains': term})
+    return list(Content.objects.filter(query)[:20])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=25, help='Common and rare search terms timed per size.')
+    parser.add_argument('--skip-legacy', action='store_true', help='Only time full-text search.')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words, weights = vocabulary(5000, rng)
+    owner, _ = get_user_model().objects.get_or_create(username='search-bench')
+    results = []
+    for size in sorted(args.sizes):
+        print(f'Preparing {size} rows...', file=sys.stderr, flush=True)
+        grow(size, owner, words, weights, rng)
+        # Common words match a large share of rows (worst case for ranking); rare and missing words
+        # are the worst case for a scan, which cannot stop early after 20 matches.
+        terms = {
+            'common': rng.sample(words[:100], args.queries),
+            'rare': rng.sample(words[-500:], args.queries),
+            'missing': [f'missing{i}' for i in range(args.queries)],
+        }
+        result = {'rows': size}
+        for kind, sample in terms.items():
+            result[f'fulltext_{kind}'] = timed(fulltext, sample)
+            if not args.skip_legacy:
+                result[f'icontains_{kind}'] = timed(legacy, sample)
+        results.append(result)
+        print(json.dumps(result), file=sys.stderr, flush=True)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Extras
     'rest_framework',
@@ -57,6 +58,9 @@ MIDDLEWARE = [
     # CORS config
     'corsheaders.middleware.CorsMiddleware',
 
+    # Request metrics and Server-Timing; early so the timing covers the other middleware
+    'content.metrics.MetricsMiddleware',
+
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,6 +93,18 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connection reuse. Under gunicorn each worker thread keeps its connection for DB_CONN_MAX_AGE seconds
+# instead of opening one per request, and checks it is still alive before reusing it. Under ASGI set
+# DB_CONN_MAX_AGE=0 and use the pool instead: DB_POOL=True needs psycopg 3 (pip install "psycopg[binary,pool]")
+# and keeps up to DB_POOL_MAX_SIZE connections per process. Either way size Postgres' max_connections for
+# WEB_CONCURRENCY workers x GUNICORN_THREADS (or x DB_POOL_MAX_SIZE), plus the analysis worker.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '60'))  # seconds, 0 = close after every request
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', os.getenv('GUNICORN_THREADS', '4')))  # one per request served at once
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))  # seconds to wait for a free connection
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -97,9 +113,35 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
         'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,  # a pool replaces persistent connections
+        'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+        'OPTIONS': {},
+    }
+}
+
+if DB_POOL:
+    # Django checks pooled connections before handing them out when CONN_HEALTH_CHECKS is on.
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': DB_POOL_MIN_SIZE,
+        'max_size': DB_POOL_MAX_SIZE,
+        'timeout': DB_POOL_TIMEOUT,
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process, so the response cache is off by default and refused on it: set a shared
+# backend (file, Redis, Memcached) and RESPONSE_CACHE_TIMEOUT so that invalidation reaches every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'content-api'),
     }
 }
 
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '0'))  # seconds, 0 = off
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -155,11 +197,16 @@ REST_FRAMEWORK = {
         'rest_framework.throttling.AnonRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'user': '1000/day',
-        'anon': '100/day',
+        'user': os.getenv('THROTTLE_RATE_USER', '1000/day'),
+        'anon': os.getenv('THROTTLE_RATE_ANON', '100/day'),
     },
+    'DEFAULT_PAGINATION_CLASS': 'content.pagination.KeysetCursorPagination',
 }
 
+# Pagination config
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '20'))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '100'))  # hard cap for ?page_size=
+
 # Simple JWT config
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -174,6 +221,92 @@ CORS_ORIGIN_ALLOW_ALL = True
 # Staticfiles config
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# AI analysis job queue config
+ANALYSIS_JOB_MAX_ATTEMPTS = int(os.getenv('ANALYSIS_JOB_MAX_ATTEMPTS', '3'))
+ANALYSIS_JOB_RETRY_DELAY = int(os.getenv('ANALYSIS_JOB_RETRY_DELAY', '30'))  # seconds, doubled on every retry
+ANALYSIS_JOB_STALE_AFTER = int(os.getenv('ANALYSIS_JOB_STALE_AFTER', '300'))  # seconds before a running job is requeued
+# Seconds between the worker's sweeps for pending rows that have no job (saved outside the API, e.g. in
+# the admin or by loaddata); rows are swept once they have not been written for as long. 0 disables.
+ANALYSIS_SWEEP_INTERVAL = int(os.getenv('ANALYSIS_SWEEP_INTERVAL', '60'))
+# The analytics counters' deltas are folded in by the worker every round, by `manage.py rollup_counters`
+# (for a cron schedule when no worker runs), and by /api/analytics/ once this many are waiting. 0 disables the last.
+ANALYTICS_ROLLUP_THRESHOLD = int(os.getenv('ANALYTICS_ROLLUP_THRESHOLD', '10000'))
+# Body edits at least this similar (word-level, 0-1; 1 disables) are re-analyzed after a delay instead of at once.
+ANALYSIS_MINOR_EDIT_SIMILARITY = float(os.getenv('ANALYSIS_MINOR_EDIT_SIMILARITY', '0.9'))
+ANALYSIS_MINOR_EDIT_DELAY = int(os.getenv('ANALYSIS_MINOR_EDIT_DELAY', '600'))  # seconds
+
+# Long texts are split into chunks of ANALYSIS_CHUNK_TOKENS (estimated) that are analyzed separately and
+# then combined. A chunk plus the prompt and ANALYSIS_MAX_TOKENS must fit the model context (8192 tokens).
+ANALYSIS_MAX_TOKENS = int(os.getenv('ANALYSIS_MAX_TOKENS', '512'))  # reply tokens per analysis call
+ANALYSIS_CHUNK_TOKENS = int(os.getenv('ANALYSIS_CHUNK_TOKENS', '3000'))
+ANALYSIS_CHUNK_WORKERS = int(os.getenv('ANALYSIS_CHUNK_WORKERS', '4'))  # concurrent chunk calls per text
+
+# Analysis engine: "groq", "local" (in-process, no network) or "auto" (GROQ, with the local
+# analyzer as fallback when GROQ fails or does not answer within ANALYSIS_LATENCY_BUDGET).
+ANALYSIS_ENGINE = os.getenv('ANALYSIS_ENGINE', 'groq')
+ANALYSIS_LATENCY_BUDGET = float(os.getenv('ANALYSIS_LATENCY_BUDGET', '5'))  # seconds requests wait for GROQ in auto mode, 0 = no limit
+
+# GROQ client config
+GROQ_API_URL = os.getenv('GROQ_API_URL', 'https://api.groq.com/openai/v1/chat/completions')
+GROQ_POOL_SIZE = int(os.getenv('GROQ_POOL_SIZE', '10'))  # keep-alive connections per process
+GROQ_ASYNC_POOL_SIZE = int(os.getenv('GROQ_ASYNC_POOL_SIZE', '100'))  # concurrent connections per event loop (ASGI)
+GROQ_MAX_RETRIES = int(os.getenv('GROQ_MAX_RETRIES', '2'))  # retries on 429/5xx and connection errors
+GROQ_BACKOFF_BASE = float(os.getenv('GROQ_BACKOFF_BASE', '0.5'))  # seconds
+GROQ_BACKOFF_MAX = float(os.getenv('GROQ_BACKOFF_MAX', '8'))  # seconds
+GROQ_CONNECT_TIMEOUT = float(os.getenv('GROQ_CONNECT_TIMEOUT', '3.05'))  # seconds
+GROQ_READ_TIMEOUT = float(os.getenv('GROQ_READ_TIMEOUT', '30'))  # seconds
+GROQ_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('GROQ_CIRCUIT_FAILURE_THRESHOLD', '5'))  # consecutive failures before failing fast
+GROQ_CIRCUIT_RESET_TIMEOUT = float(os.getenv('GROQ_CIRCUIT_RESET_TIMEOUT', '30'))  # seconds before a trial call
+
+# LLM usage limits config (0 = no limit). Requests reserve their estimated GROQ tokens in a sliding
+# window; AI requests also hold an in-flight slot. The counters live in CACHES, which must then be
+# Redis or memcached (shared and atomic), so the limits are off unless set (see .env.example).
+LLM_TOKEN_WINDOW = int(os.getenv('LLM_TOKEN_WINDOW', '60'))  # seconds
+LLM_USER_TOKENS_PER_WINDOW = int(os.getenv('LLM_USER_TOKENS_PER_WINDOW', '0'))
+LLM_GLOBAL_TOKENS_PER_WINDOW = int(os.getenv('LLM_GLOBAL_TOKENS_PER_WINDOW', '0'))
+LLM_USER_CONCURRENCY = int(os.getenv('LLM_USER_CONCURRENCY', '0'))  # AI requests in flight per user
+LLM_GLOBAL_CONCURRENCY = int(os.getenv('LLM_GLOBAL_CONCURRENCY', '0'))
+LLM_SLOT_TTL = int(os.getenv('LLM_SLOT_TTL', '300'))  # seconds before slots of a crashed worker are freed (idle scope)
+
+# AI analysis cache config
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', '1024'))  # in-process LRU size
+ANALYSIS_CACHE_DB_MAX_ENTRIES = int(os.getenv('ANALYSIS_CACHE_DB_MAX_ENTRIES', '100000'))  # database tier size
+ANALYSIS_CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', str(7 * 24 * 3600)))  # seconds
+
+# AI analysis single-flight config. Concurrent analyses of the same text share one GROQ call: in a process
+# callers wait on the call, across processes on a lease in CACHES (use a shared backend).
+ANALYSIS_SINGLEFLIGHT_WAIT = float(os.getenv('ANALYSIS_SINGLEFLIGHT_WAIT', '30'))  # seconds to wait on another process's call, 0 = no lease
+ANALYSIS_SINGLEFLIGHT_LEASE_TTL = int(os.getenv('ANALYSIS_SINGLEFLIGHT_LEASE_TTL', '90'))  # seconds before a crashed holder's lease expires
+
+# Batch AI analysis config
+AI_BATCH_WORKERS = int(os.getenv('AI_BATCH_WORKERS', '4'))  # concurrent GROQ calls per batch
+AI_BATCH_RATE = float(os.getenv('AI_BATCH_RATE', '5'))  # GROQ calls per second, 0 = unlimited
+AI_BATCH_MAX_ITEMS = int(os.getenv('AI_BATCH_MAX_ITEMS', '50'))  # items per /api/ai/analyze/batch/ request
+
+# Content search config
+CONTENT_SEARCH_RANK_WINDOW = int(os.getenv('CONTENT_SEARCH_RANK_WINDOW', '1000'))  # newest matches ranked per query, 0 = all
+
+# Content export config
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))  # rows fetched per server-side cursor round trip
+
+# Content bulk write config
+CONTENT_BULK_MAX_ITEMS = int(os.getenv('CONTENT_BULK_MAX_ITEMS', '500'))  # items per /api/content/bulk/ request
+
+# Related-content index config
+SIMILARITY_INDEX_DIR = os.getenv('SIMILARITY_INDEX_DIR', os.path.join(BASE_DIR, 'var', 'similarity'))  # shared by all workers
+SIMILARITY_DIMENSIONS = int(os.getenv('SIMILARITY_DIMENSIONS', '256'))  # vector size; run rebuild_similarity_index after a change
+RELATED_CONTENT_MAX_RESULTS = int(os.getenv('RELATED_CONTENT_MAX_RESULTS', '50'))  # largest ?limit= for /related/
+
+# Metrics config
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'  # /metrics endpoint and Server-Timing headers
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # bearer token required by /metrics when set
+# Without a token, /metrics only answers staff users and clients in these networks.
+METRICS_ALLOWED_NETWORKS = [
+    network.strip() for network in os.getenv('METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128').split(',') if network.strip()
+]
+METRICS_DIR = os.getenv('METRICS_DIR', '')  # shared by all processes: /metrics sums them; empty = per process
+METRICS_PUBLISH_INTERVAL = float(os.getenv('METRICS_PUBLISH_INTERVAL', '1'))  # seconds between a process's writes there
+
 # Swagger config
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
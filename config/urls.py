@@ -25,6 +25,7 @@ from rest_framework_simplejwt.views import (
 )
 
 from config.utils import schema_view
+from content.views.metrics_views import metrics_view
 
 
 urlpatterns = [
@@ -38,6 +39,8 @@ urlpatterns = [
 
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
+    path('metrics', metrics_view, name='metrics'),
+
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
 
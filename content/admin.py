@@ -1,5 +1,5 @@
 from django.contrib import admin
-from content.models import Category, Content
+from content.models import AnalysisJob, Category, Content
 
 
 @admin.register(Category)
@@ -13,21 +13,30 @@ class CategoryAdmin(admin.ModelAdmin):
 class ContentAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'title', 'body', 'category', 'metadata', 'owner', 'is_public', 'created_at', 'updated_at',
-        'summary', 'sentiment', 'topics', 'recommendations'
+        'summary', 'sentiment', 'topics', 'recommendations', 'analysis_status'
     )
-    readonly_fields = ('summary', 'sentiment', 'topics', 'recommendations', 'created_at', 'updated_at')
+    readonly_fields = ('summary', 'sentiment', 'topics', 'recommendations', 'analysis_status', 'created_at', 'updated_at')
     list_display_links = ('title',)
     list_editable = ('is_public',)
-    list_filter = ('is_public', 'category', 'sentiment')
+    list_filter = ('is_public', 'category', 'sentiment', 'analysis_status')
     search_fields = ('title', 'body', 'summary', 'sentiment', 'topics', 'recommendations')
     fieldsets = (
         (None, {
             'fields': ('title', 'body', 'category', 'owner', 'is_public', 'metadata')
         }),
         ('AI Analysis', {
-            'fields': ('summary', 'sentiment', 'topics', 'recommendations')
+            'fields': ('summary', 'sentiment', 'topics', 'recommendations', 'analysis_status')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at')
         }),
     )
+
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'content', 'status', 'attempts', 'run_after', 'locked_at', 'created_at', 'updated_at')
+    list_display_links = ('content',)
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'updated_at')
+    raw_id_fields = ('content',)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ContentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'content'
+
+    def ready(self):
+        from content import metrics, signals  # noqa: F401
+        from content.caching import check_response_cache_backend
+        from content.throttling import check_cache_backend
+        check_response_cache_backend()
+        check_cache_backend()
@@ -0,0 +1,127 @@
+import hashlib, json, time
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+
+# Response cache for read endpoints. Every cached response depends on one or
+# more namespaces ("content", "category"); each namespace has a version stamp
+# that is part of the cache key. Writes bump the stamp (see content.signals
+# and ContentQuerySet), which orphans every cached response built on old data.
+
+VERSION_KEY = 'response-cache:version:{}'
+STATS_KEY = 'response-cache:stats:{}'
+
+
+def check_response_cache_backend():
+    """
+    Raises ImproperlyConfigured when the response cache is enabled on local
+    memory: the version stamps would be per process, so a write in one
+    worker would leave the others serving stale responses.
+    """
+    if settings.RESPONSE_CACHE_TIMEOUT and isinstance(caches['default'], LocMemCache):
+        raise ImproperlyConfigured(
+            'The response cache (RESPONSE_CACHE_TIMEOUT) needs a CACHE_BACKEND shared by every process, '
+            'not local memory; set one or set RESPONSE_CACHE_TIMEOUT to 0.'
+        )
+
+
+def get_version(namespace):
+    version = cache.get(VERSION_KEY.format(namespace))
+    if version is None:
+        version = time.time_ns()
+        cache.add(VERSION_KEY.format(namespace), version, None)
+    return version
+
+
+def invalidate(*namespaces):
+    """
+    Drops cached responses of the given namespaces, now and again when the
+    current transaction commits (so a concurrent read cannot re-cache rows
+    that are about to change).
+    """
+    def bump():
+        for namespace in namespaces:
+            cache.set(VERSION_KEY.format(namespace), time.time_ns(), None)
+    bump()
+    transaction.on_commit(bump)
+
+
+def count(name):
+    key = STATS_KEY.format(name)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:  # evicted in between
+        cache.set(key, 1, None)
+
+
+def get_response_cache_stats():
+    hits = cache.get(STATS_KEY.format('hits'), 0)
+    misses = cache.get(STATS_KEY.format('misses'), 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+    }
+
+
+def make_etag(data):
+    payload = json.dumps(data, sort_keys=True, default=str).encode('utf-8')
+    return '"{}"'.format(hashlib.sha256(payload).hexdigest()[:32])
+
+
+class CachedResponseMixin:
+    """
+    Caches `list` and `retrieve` responses keyed by URL, query parameters and
+    the caller's visibility scope, and answers `If-None-Match` with 304.
+    """
+    cache_namespaces = ()
+
+    def get_cache_scope(self):
+        """
+        Identifies callers that may see different data for the same URL.
+        """
+        return 'public'
+
+    def get_cache_key(self, request):
+        versions = ':'.join(str(get_version(namespace)) for namespace in self.cache_namespaces)
+        params = sorted(request.query_params.lists())
+        raw = f'{versions}|{self.get_cache_scope()}|{request.get_host()}|{request.path}|{params}'
+        return 'response-cache:entry:' + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_TIMEOUT:
+            return handler(request, *args, **kwargs)
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            count('misses')
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = (response.data, make_etag(response.data))
+            cache.set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+            cache_status = 'MISS'
+        else:
+            count('hits')
+            cache_status = 'HIT'
+
+        data, etag = entry
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        response['X-Cache'] = cache_status
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
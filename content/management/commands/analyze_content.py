@@ -0,0 +1,64 @@
+import json, os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from content.models import Content
+from content.services.analysis import ENGINES
+from content.services.batch import analyze_contents
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-analyzes content rows with GROQ and writes the results back in batches. '
+        'Progress is checkpointed so an interrupted run can be resumed with --resume.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-analyze every row, not only pending or failed ones.')
+        parser.add_argument('--workers', type=int, default=settings.AI_BATCH_WORKERS, help='Concurrent GROQ calls.')
+        parser.add_argument('--rate', type=float, default=settings.AI_BATCH_RATE, help='Max GROQ calls per second (0 = unlimited).')
+        parser.add_argument('--engine', choices=ENGINES, help='Analysis engine (default: ANALYSIS_ENGINE); "local" needs no API key.')
+        parser.add_argument('--chunk-size', type=int, default=100, help='Rows fetched and written back per batch.')
+        parser.add_argument('--checkpoint', default='analyze_content.checkpoint.json', help='Checkpoint file path.')
+        parser.add_argument('--resume', action='store_true', help='Continue after the last checkpointed row.')
+
+    def handle(self, *args, **options):
+        queryset = Content.objects.all()
+        if not options['all']:
+            queryset = queryset.filter(analysis_status__in=[Content.AnalysisStatus.PENDING, Content.AnalysisStatus.FAILED])
+
+        checkpoint = options['checkpoint']
+        state = {'last_pk': 0, 'processed': 0, 'succeeded': 0}
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                state.update(json.load(f))
+            self.stdout.write(f"Resuming after content #{state['last_pk']}.")
+
+        total = queryset.filter(pk__gt=state['last_pk']).count()
+        done = 0
+        progress = analyze_contents(
+            queryset, workers=options['workers'], rate=options['rate'],
+            chunk_size=options['chunk_size'], after_pk=state['last_pk'], engine=options['engine'],
+        )
+        try:
+            for step in progress:
+                done = step['processed']
+                self._save_checkpoint(checkpoint, {
+                    'last_pk': step['last_pk'],
+                    'processed': state['processed'] + step['processed'],
+                    'succeeded': state['succeeded'] + step['succeeded'],
+                })
+                self.stdout.write(f"{done}/{total} rows analyzed ({step['succeeded']} succeeded), last id {step['last_pk']}.")
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Interrupted; run again with --resume to continue.'))
+            return
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(f'Analyzed {done} content row(s).'))
+
+    def _save_checkpoint(self, path, state):
+        # Write-then-rename so an interrupt never leaves a truncated file.
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
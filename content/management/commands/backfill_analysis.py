@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from content.services.jobs import enqueue_missing_analyses
+
+
+class Command(BaseCommand):
+    help = 'Queues AI analysis jobs for content rows that are missing summary, sentiment, topics or recommendations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of rows flagged per transaction.')
+        parser.add_argument('--include-failed', action='store_true', help='Also retry rows whose analysis has failed.')
+        parser.add_argument('--upgrade-local', action='store_true', help='Also re-analyze rows analyzed by the local engine.')
+
+    def handle(self, *args, **options):
+        created = enqueue_missing_analyses(options['batch_size'], options['include_failed'], options['upgrade_local'])
+        self.stdout.write(self.style.SUCCESS(f'Queued {created} analysis job(s).'))
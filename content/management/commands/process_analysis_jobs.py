@@ -0,0 +1,41 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from content.metrics import start_publishing
+from content.services.counters import rollup_counters
+from content.services.jobs import enqueue_missing_analyses, process_jobs, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs queued AI analysis jobs. Keeps polling the queue unless --once is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the currently due jobs and exit.')
+        parser.add_argument('--batch-size', type=int, default=10, help='Number of jobs claimed per round.')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty.')
+
+    def handle(self, *args, **options):
+        total, next_sweep = 0, 0.0
+        start_publishing()  # GROQ call metrics, for /metrics when METRICS_DIR is shared with the web processes
+        try:
+            while True:
+                # What Django does around every request: drop a connection past CONN_MAX_AGE or, with
+                # CONN_HEALTH_CHECKS, one that stopped working (e.g. Postgres restarted) before reusing it.
+                close_old_connections()
+                requeue_stale_jobs()
+                interval = settings.ANALYSIS_SWEEP_INTERVAL
+                if interval and time.monotonic() >= next_sweep:
+                    # Rows written around the API (admin, loaddata, scripts) are left pending without a job.
+                    enqueue_missing_analyses(idle_for=interval)
+                    next_sweep = time.monotonic() + interval
+                rollup_counters()  # the analytics counters' pending deltas
+                processed = process_jobs(options['batch_size'])
+                total += processed
+                if options['once'] and not processed:
+                    break
+                if not processed:
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} analysis job(s).'))
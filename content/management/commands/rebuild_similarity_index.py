@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from content.models import Content
+from content.services.similarity import content_text, get_similarity_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the related-content similarity index from every content row, recomputing its IDF weights. '
+        'Content saved while it runs is re-indexed on its next save or rebuild.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip.')
+
+    def handle(self, *args, **options):
+        def rows():
+            queryset = Content.objects.order_by('pk').values_list('pk', 'title', 'body')
+            return ((pk, content_text(title, body)) for pk, title, body in queryset.iterator(chunk_size=options['chunk_size']))
+
+        count = get_similarity_index().rebuild(rows)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} content row(s).'))
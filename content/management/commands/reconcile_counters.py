@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from content.services.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the analytics counters from the user, category and content tables and reports any drift.'
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters()
+        for (dimension, key), delta in sorted(drift.items()):
+            self.stdout.write(f'{dimension}[{key}]: {delta:+d}')
+        self.stdout.write(self.style.SUCCESS(f'Corrected {len(drift)} counter(s).'))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from content.services.counters import rollup_counters
+
+
+class Command(BaseCommand):
+    help = 'Folds the pending analytics counter deltas into the counters (the analysis worker also does this every round).'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'Updated {rollup_counters()} counter(s).'))
@@ -0,0 +1,127 @@
+import itertools, math, random
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from content.models import Category, Content
+from content.services.analysis import apply_analysis
+from content.services.local_analysis import NEGATIVE, POSITIVE, STOPWORDS, analyze_local
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ren', 'tor', 'vi', 'sa', 'nu', 'pel', 'dra', 'qui', 'zen', 'bo', 'tek', 'lu', 'mar']
+BODY_WORDS_MEDIAN = 250  # log-normal body length: most bodies are a few hundred words, a few run to thousands
+BODY_WORDS_SIGMA = 0.9
+BODY_WORDS_RANGE = (20, 6000)
+
+
+class TextGenerator:
+    """
+    Deterministic English-looking text: real stopwords and sentiment words
+    around a Zipf-distributed vocabulary of made-up content words, in
+    sentences and paragraphs of natural lengths.
+    """
+    def __init__(self, rng, vocabulary_size=5000):
+        self.rng = rng
+        words = set()
+        while len(words) < vocabulary_size:
+            words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+        self.words = sorted(words)
+        self.cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(self.words))))
+        self.stopwords = sorted(STOPWORDS)
+        self.polar = sorted(POSITIVE) + sorted(NEGATIVE)
+
+    def word(self):
+        draw = self.rng.random()
+        if draw < 0.45:
+            return self.rng.choice(self.stopwords)
+        if draw < 0.48:
+            return self.rng.choice(self.polar)
+        return self.rng.choices(self.words, cum_weights=self.cum_weights)[0]
+
+    def sentence(self, length):
+        words = [self.word() for _ in range(length)]
+        return ' '.join(words).capitalize() + '.'
+
+    def title(self):
+        return ' '.join(self.rng.choices(self.words, cum_weights=self.cum_weights, k=self.rng.randint(3, 8))).capitalize()
+
+    def body(self):
+        target = round(self.rng.lognormvariate(math.log(BODY_WORDS_MEDIAN), BODY_WORDS_SIGMA))
+        target = min(max(target, BODY_WORDS_RANGE[0]), BODY_WORDS_RANGE[1])
+        paragraphs, paragraph, count = [], [], 0
+        while count < target:
+            length = min(self.rng.randint(8, 25), target - count)
+            paragraph.append(self.sentence(max(length, 3)))
+            count += length
+            if len(paragraph) >= self.rng.randint(3, 8):
+                paragraphs.append(' '.join(paragraph))
+                paragraph = []
+        if paragraph:
+            paragraphs.append(' '.join(paragraph))
+        return '\n\n'.join(paragraphs)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds synthetic users, categories and content rows (log-normal body lengths) for load tests and benchmarks. '
+        'Reruns add rows; users and categories with the same names are reused.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--content', type=int, default=10000, help='Content rows to add.')
+        parser.add_argument('--prefix', default='bench', help='Usernames are <prefix>-<n>, category names "<prefix> category <n>".')
+        parser.add_argument('--password', default='benchpass123', help='Password of every seeded user.')
+        parser.add_argument('--analyzed', type=float, default=0.8, help='Share of rows given a local analysis (0-1); the rest stay pending.')
+        parser.add_argument('--private', type=float, default=0.1, help='Share of rows that are private (0-1).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows generated and inserted per batch.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--skip-index', action='store_true', help='Do not rebuild the related-content index afterwards.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1.')
+        rng = random.Random(options['seed'])
+        text = TextGenerator(rng)
+        owners = self.seed_users(options['prefix'], options['users'], options['password'])
+        categories = self.seed_categories(options['prefix'], options['categories'])
+        self.stdout.write(f'{len(owners)} user(s) and {len(categories)} category(ies) ready.')
+
+        created = 0
+        while created < options['content']:
+            batch = []
+            for _ in range(min(options['batch_size'], options['content'] - created)):
+                batch.append(Content(
+                    title=text.title(),
+                    body=text.body(),
+                    category=rng.choice(categories) if categories and rng.random() < 0.9 else None,
+                    metadata={'source': 'seed_content', 'tags': rng.sample(text.words[:200], 2)},
+                    owner=rng.choice(owners),
+                    is_public=rng.random() >= options['private'],
+                ))
+            analyzed = [content for content in batch if rng.random() < options['analyzed']]
+            for content, ai_result in zip(analyzed, analyze_local([content.body for content in analyzed])):
+                apply_analysis(content, ai_result)
+                content.analysis_status = Content.AnalysisStatus.DONE
+            Content.objects.bulk_create(batch)
+            created += len(batch)
+            self.stdout.write(f'{created}/{options["content"]} content rows created.')
+
+        if not options['skip_index']:
+            call_command('rebuild_similarity_index', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Seeded {created} content row(s).'))
+
+    def seed_users(self, prefix, count, password):
+        User = get_user_model()
+        usernames = [f'{prefix}-{n}' for n in range(1, count + 1)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        hashed = make_password(password)  # hashing is slow by design; every seeded user shares one hash
+        User.objects.bulk_create(
+            [User(username=name, email=f'{name}@example.com', password=hashed) for name in usernames if name not in existing],
+        )
+        return list(User.objects.filter(username__in=usernames))
+
+    def seed_categories(self, prefix, count):
+        names = [f'{prefix} category {n}' for n in range(1, count + 1)]
+        Category.objects.bulk_create([Category(name=name) for name in names], ignore_conflicts=True)
+        return list(Category.objects.filter(name__in=names))
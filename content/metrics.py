@@ -0,0 +1,403 @@
+import atexit, bisect, contextvars, json, os, socket, threading, time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+# In-process metrics for the hot paths: request latency per endpoint, DB
+# queries, GROQ calls and analysis cache lookups. Recording is a lock and a
+# few additions, so it stays on in production. Values are kept per process;
+# with METRICS_DIR set, every process publishes them to a file there and
+# /metrics serves the sum over all processes, whichever worker answers.
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNMATCHED = 'unmatched'  # requests that resolved to no URL pattern share one label
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _labels(self, values, extra=()):
+        pairs = list(zip(self.labels, values)) + list(extra)
+        return '{%s}' % ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) if pairs else ''
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self):
+        """
+        A copy of the values, as [labels, value] pairs that survive JSON.
+        """
+        with self._lock:
+            return [[list(labels), self._copy(value)] for labels, value in self._values.items()]
+
+    def render(self, values=None):
+        """
+        Exposition lines for `values` (labels -> value), by default this
+        process's own.
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        if values is None:
+            values = {tuple(labels): value for labels, value in self.snapshot()}
+        lines.extend(self._samples(sorted(values.items())))
+        return lines
+
+
+class Counter(Metric):
+    """
+    Monotonic total per label combination.
+    """
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self._values.get(labels, 0)
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    @staticmethod
+    def combine(value, other):
+        return value + other
+
+    def _samples(self, items):
+        for labels, value in items:
+            yield f'{self.name}{self._labels(labels)} {_format(value)}'
+
+
+class Histogram(Metric):
+    """
+    Counts observations into fixed upper-bounded buckets (plus their sum and
+    count) per label combination; rendered cumulatively, as Prometheus expects.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def get(self, *labels):
+        """
+        (count, sum) of the observations with these labels.
+        """
+        state = self._values.get(labels)
+        return (state[2], state[1]) if state else (0, 0.0)
+
+    @staticmethod
+    def _copy(value):
+        return [list(value[0]), value[1], value[2]]
+
+    @staticmethod
+    def combine(value, other):
+        return [[a + b for a, b in zip(value[0], other[0])], value[1] + other[1], value[2] + other[2]]
+
+    def _samples(self, items):
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket
+                yield f'{self.name}_bucket{self._labels(labels, [("le", _format(bound))])} {cumulative}'
+            yield f'{self.name}_sum{self._labels(labels)} {_format(total)}'
+            yield f'{self.name}_count{self._labels(labels)} {count}'
+
+
+REGISTRY = []
+PROCESS_STARTED = time.time()
+
+HTTP_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time until the response (or, when streamed, its headers) is ready.',
+    ['method', 'route'], buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],
+)
+HTTP_RESPONSES = Counter('http_responses_total', 'Responses by endpoint and status code.', ['method', 'route', 'status'])
+HTTP_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries run per request.',
+    ['method', 'route'], buckets=[0, 1, 2, 5, 10, 20, 50, 100, 200],
+)
+DB_QUERIES = Counter('db_queries_total', 'Database queries by endpoint ("" outside requests).', ['route'])
+DB_QUERY_SECONDS = Counter('db_query_seconds_total', 'Time spent in database queries by endpoint.', ['route'])
+LLM_DURATION = Histogram(
+    'llm_request_duration_seconds', 'GROQ chat completions, including retries, by model and outcome.',
+    ['model', 'outcome'], buckets=[0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60],
+)
+LLM_RETRIES = Counter('llm_retries_total', 'GROQ calls retried after a 429/5xx or connection error.')
+LLM_TOKENS = Counter('llm_tokens_total', 'Tokens reported by GROQ, by model and kind (prompt, completion).', ['model', 'kind'])
+LLM_THROTTLED = Counter('llm_throttled_total', 'Requests refused by the LLM usage limits, by limit.', ['limit'])
+ANALYSIS_CACHE = Counter('analysis_cache_lookups_total', 'AI analysis cache lookups by result (hit, miss).', ['result'])
+ANALYSIS_COALESCED = Counter(
+    'analysis_coalesced_total', 'Analyses that reused a concurrent identical GROQ call, by where it ran (process, shared).', ['scope'],
+)
+
+
+# Shared store. Each process (gunicorn workers, uvicorn, the analysis worker)
+# writes all its values to METRICS_DIR/<host>-<pid>-<start>.json from a
+# background thread every METRICS_PUBLISH_INTERVAL seconds, and a scrape
+# adds up every file. Files of exited processes are kept so that totals
+# never go down; the directory is emptied when gunicorn starts (see
+# gunicorn.conf.py).
+
+_publish_lock = threading.Lock()
+_publisher_pid = None
+
+
+def publish():
+    """
+    Writes this process's values to METRICS_DIR, if set.
+    """
+    directory = settings.METRICS_DIR
+    if not directory:
+        return
+    with _publish_lock:
+        snapshot = {'started': PROCESS_STARTED, 'metrics': {metric.name: metric.snapshot() for metric in REGISTRY}}
+        path = os.path.join(directory, f'{socket.gethostname()}-{os.getpid()}-{PROCESS_STARTED:.6f}.json')
+        os.makedirs(directory, exist_ok=True)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(f'{path}.tmp', path)  # scrapes never see a half-written file
+
+
+def start_publishing():
+    """
+    Starts this process's publishing thread when METRICS_DIR is set (once
+    per process: a forked worker starts its own).
+    """
+    global _publisher_pid
+    if not settings.METRICS_DIR or _publisher_pid == os.getpid():
+        return
+    with _publish_lock:
+        if _publisher_pid == os.getpid():
+            return
+        _publisher_pid = os.getpid()
+
+    def run():
+        while True:
+            time.sleep(settings.METRICS_PUBLISH_INTERVAL)
+            try:
+                publish()
+            except OSError:
+                pass  # directory briefly unavailable; the next round retries
+
+    threading.Thread(target=run, name='metrics-publisher', daemon=True).start()
+
+
+@atexit.register
+def _publish_on_exit():
+    if settings.configured and getattr(settings, 'METRICS_ENABLED', False) and _publisher_pid == os.getpid():
+        publish()
+
+
+def collect():
+    """
+    (values per metric name, start time): this process's own, or with
+    METRICS_DIR the sum over every process that published there, and the
+    earliest of their start times.
+    """
+    if not settings.METRICS_DIR:
+        return {metric.name: None for metric in REGISTRY}, PROCESS_STARTED
+    publish()
+    totals, started = {metric.name: {} for metric in REGISTRY}, PROCESS_STARTED
+    for name in os.listdir(settings.METRICS_DIR):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(settings.METRICS_DIR, name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue  # removed since listing
+        started = min(started, snapshot['started'])
+        for metric in REGISTRY:
+            values = totals[metric.name]
+            for labels, value in snapshot['metrics'].get(metric.name, ()):
+                labels = tuple(labels)
+                values[labels] = metric.combine(values[labels], value) if labels in values else value
+    return totals, started
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    values, started = collect()
+    lines = [
+        '# HELP process_start_time_seconds Start time of the (earliest) process since the Unix epoch.',
+        '# TYPE process_start_time_seconds gauge',
+        f'process_start_time_seconds {started}',
+    ]
+    for metric in REGISTRY:
+        lines.extend(metric.render(values[metric.name]))
+    return '\n'.join(lines) + '\n'
+
+
+class RequestTimings:
+    """
+    What one request spent on the database and on GROQ, for its metrics and
+    its Server-Timing header.
+    """
+    __slots__ = ('db_count', 'db_time', 'llm_count', 'llm_time', 'cache_hits')
+
+    def __init__(self):
+        self.db_count = self.db_time = self.llm_count = self.llm_time = self.cache_hits = 0
+
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+def record_llm_call(model, outcome, duration, usage=None):
+    LLM_DURATION.observe(duration, model, outcome)
+    for kind in ('prompt', 'completion'):
+        tokens = (usage or {}).get(f'{kind}_tokens')
+        if isinstance(tokens, int):
+            LLM_TOKENS.inc(model, kind, amount=tokens)
+    timings = _current.get()
+    if timings is not None:
+        timings.llm_count += 1
+        timings.llm_time += duration
+
+
+class llm_call:
+    """
+    Times one GROQ chat completion; set `usage` to the response's usage block.
+    Used by both the sync and the async client.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.usage = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_llm_call(self.model, exc_type.__name__ if exc_type else 'ok', time.perf_counter() - self.started, self.usage)
+
+
+def record_cache_lookup(hit):
+    ANALYSIS_CACHE.inc('hit' if hit else 'miss')
+    timings = _current.get()
+    if timings is not None and hit:
+        timings.cache_hits += 1
+
+
+def _time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        timings = _current.get()
+        if timings is None:
+            DB_QUERIES.inc('')
+            DB_QUERY_SECONDS.inc('', amount=duration)
+        else:
+            # Added to the totals under the request's route once it finishes.
+            timings.db_count += 1
+            timings.db_time += duration
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Every connection, including those of worker threads, which see the request through a copied context.
+    if settings.METRICS_ENABLED and _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def route_of(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED
+    return match.view_name or match.route
+
+
+def server_timing(timings, total):
+    return ', '.join([
+        f'db;dur={timings.db_time * 1000:.1f};desc="{timings.db_count} queries"',
+        f'llm;dur={timings.llm_time * 1000:.1f};desc="{timings.llm_count} calls, {timings.cache_hits} cached"',
+        f'total;dur={total * 1000:.1f}',
+    ])
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status and DB queries per endpoint (labelled by URL
+    pattern name, so ids in paths do not multiply series) and adds a
+    Server-Timing header with the time spent on the database and on GROQ.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        timings, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings, started)
+
+    def start(self):
+        timings = RequestTimings()
+        return timings, _current.set(timings), time.perf_counter()
+
+    def finish(self, request, response, timings, started):
+        total = time.perf_counter() - started
+        route = route_of(request)
+        HTTP_DURATION.observe(total, request.method, route)
+        HTTP_RESPONSES.inc(request.method, route, str(response.status_code))
+        HTTP_DB_QUERIES.observe(timings.db_count, request.method, route)
+        if timings.db_count:
+            DB_QUERIES.inc(route, amount=timings.db_count)
+            DB_QUERY_SECONDS.inc(route, amount=timings.db_time)
+        response['Server-Timing'] = server_timing(timings, total)
+        start_publishing()
+        return response
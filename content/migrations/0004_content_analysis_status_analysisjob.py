@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mark_existing_content_done(apps, schema_editor):
+    # Rows created before the job queue existed were analyzed inline.
+    Content = apps.get_model('content', 'Content')
+    Content.objects.update(analysis_status='done')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0003_alter_content_sentiment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='content',
+            name='analysis_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=16),
+        ),
+        migrations.RunPython(mark_existing_content_done, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='AnalysisJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('content', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analysis_jobs', to='content.content')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='analysisjob_status_run_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+from django.db.models import Q
+
+
+def flag_missing_analysis(apps, schema_editor):
+    # Legacy rows used to be analyzed on read; flag them for the backfill instead.
+    Content = apps.get_model('content', 'Content')
+    missing = (
+        Q(summary__isnull=True) | Q(summary='')
+        | Q(sentiment__isnull=True) | Q(sentiment='')
+        | Q(topics__isnull=True) | Q(topics=[])
+        | Q(recommendations__isnull=True) | Q(recommendations='')
+    )
+    Content.objects.filter(missing, analysis_status='done').update(analysis_status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0004_content_analysis_status_analysisjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(flag_missing_analysis, migrations.RunPython.noop),
+    ]
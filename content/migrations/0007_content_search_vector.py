@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:38
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Keeps content_content.search_vector in sync on every INSERT/UPDATE, including
+# bulk_create/bulk_update and queryset.update(), which bypass Model.save().
+CREATE_TRIGGER = """
+CREATE FUNCTION content_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.summary, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.body, '')), 'C') ||
+        setweight(jsonb_to_tsvector('english', coalesce(NEW.topics, '[]'::jsonb), '["string"]'), 'D');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER content_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, summary, body, topics ON content_content
+    FOR EACH ROW EXECUTE FUNCTION content_search_vector_update();
+
+UPDATE content_content SET title = title;
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS content_search_vector_trigger ON content_content;
+DROP FUNCTION IF EXISTS content_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0006_analysiscacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='content',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='content',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='content_search_vector_idx'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0007_content_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='content',
+            index=models.Index(fields=['-created_at', '-id'], name='content_created_id_idx'),
+        ),
+        # Keyset index for the /api/users/ cursor (auth.User is not ours to add Meta indexes to).
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS content_user_joined_id_idx ON auth_user (date_joined DESC, id DESC);',
+            'DROP INDEX IF EXISTS content_user_joined_id_idx;',
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+# Keeps content_analyticscounter current on every write, including bulk_create/bulk_update,
+# queryset.update() and cascading deletes, which bypass model signals. Content keys mirror
+# content.services.counters.GROUND_TRUTH_SQL.
+CREATE_TRIGGERS = """
+CREATE FUNCTION content_counter_add(dim text, k text, delta bigint) RETURNS void AS $$
+BEGIN
+    INSERT INTO content_analyticscounter (dimension, key, value) VALUES (dim, k, delta)
+    ON CONFLICT (dimension, key) DO UPDATE SET value = content_analyticscounter.value + EXCLUDED.value;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION content_counters_rows() RETURNS trigger AS $$
+BEGIN
+    PERFORM content_counter_add(TG_ARGV[0], '', CASE TG_OP WHEN 'INSERT' THEN 1 ELSE -1 END);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION content_counters_content() RETURNS trigger AS $$
+DECLARE
+    dims text[] := ARRAY['content', 'content_category', 'content_sentiment', 'content_owner', 'content_day'];
+    old_keys text[];
+    new_keys text[];
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        old_keys := ARRAY[
+            '', coalesce(OLD.category_id::text, ''), lower(btrim(coalesce(OLD.sentiment, ''))),
+            OLD.owner_id::text, (OLD.created_at AT TIME ZONE 'UTC')::date::text
+        ];
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        new_keys := ARRAY[
+            '', coalesce(NEW.category_id::text, ''), lower(btrim(coalesce(NEW.sentiment, ''))),
+            NEW.owner_id::text, (NEW.created_at AT TIME ZONE 'UTC')::date::text
+        ];
+    END IF;
+    FOR i IN 1..array_length(dims, 1) LOOP
+        IF old_keys[i] IS DISTINCT FROM new_keys[i] THEN
+            IF old_keys[i] IS NOT NULL THEN
+                PERFORM content_counter_add(dims[i], old_keys[i], -1);
+            END IF;
+            IF new_keys[i] IS NOT NULL THEN
+                PERFORM content_counter_add(dims[i], new_keys[i], 1);
+            END IF;
+        END IF;
+    END LOOP;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER content_counters_user_trigger
+    AFTER INSERT OR DELETE ON auth_user
+    FOR EACH ROW EXECUTE FUNCTION content_counters_rows('users');
+
+CREATE TRIGGER content_counters_category_trigger
+    AFTER INSERT OR DELETE ON content_category
+    FOR EACH ROW EXECUTE FUNCTION content_counters_rows('categories');
+
+CREATE TRIGGER content_counters_content_trigger
+    AFTER INSERT OR DELETE OR UPDATE OF category_id, sentiment, owner_id, created_at ON content_content
+    FOR EACH ROW EXECUTE FUNCTION content_counters_content();
+
+INSERT INTO content_analyticscounter (dimension, key, value)
+SELECT 'users', '', count(*) FROM auth_user
+UNION ALL SELECT 'categories', '', count(*) FROM content_category
+UNION ALL SELECT 'content', '', count(*) FROM content_content
+UNION ALL SELECT 'content_category', coalesce(category_id::text, ''), count(*) FROM content_content GROUP BY 2
+UNION ALL SELECT 'content_sentiment', lower(btrim(coalesce(sentiment, ''))), count(*) FROM content_content GROUP BY 2
+UNION ALL SELECT 'content_owner', owner_id::text, count(*) FROM content_content GROUP BY 2
+UNION ALL SELECT 'content_day', (created_at AT TIME ZONE 'UTC')::date::text, count(*) FROM content_content GROUP BY 2;
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS content_counters_user_trigger ON auth_user;
+DROP TRIGGER IF EXISTS content_counters_category_trigger ON content_category;
+DROP TRIGGER IF EXISTS content_counters_content_trigger ON content_content;
+DROP FUNCTION IF EXISTS content_counters_content();
+DROP FUNCTION IF EXISTS content_counters_rows();
+DROP FUNCTION IF EXISTS content_counter_add(text, text, bigint);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('content', '0009_content_visibility_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('users', 'Users'), ('categories', 'Categories'), ('content', 'Content'), ('content_category', 'Content by category'), ('content_sentiment', 'Content by sentiment'), ('content_owner', 'Content by owner'), ('content_day', 'Content by day')], max_length=32)),
+                ('key', models.CharField(blank=True, max_length=128)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dimension', '-value'], name='analyticscounter_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'key'), name='analyticscounter_dimension_key_uniq')],
+            },
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:03
+
+from django.db import migrations, models
+
+
+# Same value as content.services.cache.fingerprint(): sha256 of the body with whitespace runs collapsed.
+# Rows whose whitespace normalizes differently here are just analyzed once more on their next update.
+BACKFILL = r"""
+UPDATE content_content
+SET body_fingerprint = encode(sha256(convert_to(btrim(regexp_replace(body, '\s+', ' ', 'g')), 'UTF8')), 'hex');
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0011_content_updated_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='content',
+            name='body_fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+# Every analysis stored before engines were recorded came from GROQ.
+BACKFILL = "UPDATE content_content SET analysis_engine = 'groq' WHERE analysis_status = 'done';"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0012_content_body_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='content',
+            name='analysis_engine',
+            field=models.CharField(blank=True, choices=[('groq', 'GROQ'), ('local', 'Local')], max_length=16),
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='content',
+            index=models.Index(condition=models.Q(('analysis_engine', 'local')), fields=['id'], name='content_local_analysis_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:26
+
+from django.db import migrations, models
+
+
+# The counter triggers of migration 0010 upserted one row per counter, so every content write
+# locked the ('content', '') and today's row until it committed and concurrent writers queued
+# behind each other. They now append to an insert-only delta table instead.
+APPEND_DELTAS = """
+CREATE OR REPLACE FUNCTION content_counter_add(dim text, k text, delta bigint) RETURNS void AS $$
+BEGIN
+    INSERT INTO content_analyticscounterdelta (dimension, key, delta) VALUES (dim, k, delta);
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# Folds the pending deltas back in before restoring the upserting function.
+UPSERT_COUNTERS = """
+WITH moved AS (DELETE FROM content_analyticscounterdelta RETURNING dimension, key, delta)
+INSERT INTO content_analyticscounter (dimension, key, value)
+SELECT dimension, key, sum(delta) FROM moved GROUP BY dimension, key
+ON CONFLICT (dimension, key) DO UPDATE SET value = content_analyticscounter.value + EXCLUDED.value;
+
+CREATE OR REPLACE FUNCTION content_counter_add(dim text, k text, delta bigint) RETURNS void AS $$
+BEGIN
+    INSERT INTO content_analyticscounter (dimension, key, value) VALUES (dim, k, delta)
+    ON CONFLICT (dimension, key) DO UPDATE SET value = content_analyticscounter.value + EXCLUDED.value;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0013_content_analysis_engine'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsCounterDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('users', 'Users'), ('categories', 'Categories'), ('content', 'Content'), ('content_category', 'Content by category'), ('content_sentiment', 'Content by sentiment'), ('content_owner', 'Content by owner'), ('content_day', 'Content by day')], max_length=32)),
+                ('key', models.CharField(blank=True, max_length=128)),
+                ('delta', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunSQL(APPEND_DELTAS, UPSERT_COUNTERS),
+    ]
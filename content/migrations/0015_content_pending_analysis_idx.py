@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0014_analyticscounterdelta'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='content',
+            index=models.Index(condition=models.Q(('analysis_status', 'pending')), fields=['id'], name='content_pending_analysis_idx'),
+        ),
+    ]
@@ -1,5 +1,9 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
+from content.caching import invalidate
 
 
 class Category(models.Model):
@@ -10,7 +14,41 @@ class Category(models.Model):
         return self.name
 
 
+class ContentQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """
+        Public content plus the user's own rows; admins see everything.
+        """
+        if user.is_staff:
+            return self
+        if user.is_authenticated:
+            return self.filter(models.Q(is_public=True) | models.Q(owner=user))
+        return self.filter(is_public=True)
+
+    # Bulk writes skip post_save, so they drop cached API responses here
+    # (bulk_update goes through update()).
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        invalidate('content')
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        invalidate('content')
+        return objs
+
+
 class Content(models.Model):
+    class AnalysisStatus(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        PROCESSING = 'processing', 'Processing'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    class AnalysisEngine(models.TextChoices):
+        GROQ = 'groq', 'GROQ'
+        LOCAL = 'local', 'Local'  # in-process fallback, see content.services.local_analysis
+
     title = models.CharField(max_length=255)
     body = models.TextField()
     category = models.ForeignKey(Category, related_name='contents', on_delete=models.SET_NULL, null=True)
@@ -24,6 +62,123 @@ class Content(models.Model):
     sentiment = models.CharField(max_length=128, blank=True, null=True)
     topics = models.JSONField(blank=True, null=True)
     recommendations = models.TextField(blank=True, null=True)
+    analysis_status = models.CharField(max_length=16, choices=AnalysisStatus.choices, default=AnalysisStatus.PENDING)
+    # Which analyzer produced the AI fields; local results are queued for GROQ by `backfill_analysis --upgrade-local`.
+    analysis_engine = models.CharField(max_length=16, choices=AnalysisEngine.choices, blank=True)
+    # Fingerprint of the body the current (or queued) analysis is for; see content.services.cache.fingerprint.
+    body_fingerprint = models.CharField(max_length=64, blank=True, editable=False)
+    # Weighted full-text document (title > summary > body > topics). Kept current by a database
+    # trigger (migration 0007), so bulk writes and update() calls stay in sync too.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ContentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='content_search_vector_idx'),
+            models.Index(fields=['-created_at', '-id'], name='content_created_id_idx'),  # list pagination
+            # Visibility-filtered lists: anonymous users (public rows) and "my content".
+            models.Index(
+                fields=['-created_at', '-id'], condition=models.Q(is_public=True), name='content_public_created_idx',
+            ),
+            models.Index(fields=['owner', '-created_at', '-id'], name='content_owner_created_idx'),
+            models.Index(fields=['updated_at', 'id'], name='content_updated_id_idx'),  # incremental export
+            models.Index(fields=['id'], condition=models.Q(analysis_engine='local'), name='content_local_analysis_idx'),
+            # The analysis worker's sweep for pending rows without a job.
+            models.Index(fields=['id'], condition=models.Q(analysis_status='pending'), name='content_pending_analysis_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class AnalysisJob(models.Model):
+    """
+    A queued AI analysis of one Content row. Jobs are stored in the database
+    and picked up by the `process_analysis_jobs` management command, so no
+    external broker is needed.
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    content = models.ForeignKey(Content, related_name='analysis_jobs', on_delete=models.CASCADE)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='analysisjob_status_run_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.content_id}: {self.status}'
+
+
+class AnalysisCacheEntry(models.Model):
+    """
+    Persistent tier of the AI analysis cache. Keyed on a hash of the
+    normalized text, the model and the prompt (see content.services.cache).
+    """
+    key = models.CharField(max_length=64, unique=True)
+    result = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class AnalyticsCounter(models.Model):
+    """
+    Pre-aggregated row counts for the analytics endpoint. Database triggers
+    on the user, category and content tables append changes to
+    AnalyticsCounterDelta (migrations 0010, 0014); `rollup_counters` folds
+    them in here. `reconcile_counters` rebuilds both from the source tables.
+    """
+    class Dimension(models.TextChoices):
+        USERS = 'users', 'Users'
+        CATEGORIES = 'categories', 'Categories'
+        CONTENT = 'content', 'Content'
+        CONTENT_CATEGORY = 'content_category', 'Content by category'
+        CONTENT_SENTIMENT = 'content_sentiment', 'Content by sentiment'
+        CONTENT_OWNER = 'content_owner', 'Content by owner'
+        CONTENT_DAY = 'content_day', 'Content by day'
+
+    dimension = models.CharField(max_length=32, choices=Dimension.choices)
+    # Category id, sentiment, owner id or ISO date ('' for totals and missing values).
+    key = models.CharField(max_length=128, blank=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], name='analyticscounter_dimension_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['dimension', '-value'], name='analyticscounter_top_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.dimension}[{self.key}] = {self.value}'
+
+
+class AnalyticsCounterDelta(models.Model):
+    """
+    A change to an AnalyticsCounter not yet rolled up. Insert-only, so
+    concurrent writers never wait on each other's counter rows; readers add
+    the pending deltas to the counters.
+    """
+    dimension = models.CharField(max_length=32, choices=AnalyticsCounter.Dimension.choices)
+    key = models.CharField(max_length=128, blank=True)
+    delta = models.BigIntegerField()
+
+    def __str__(self):
+        return f'{self.dimension}[{self.key}] {self.delta:+d}'
@@ -0,0 +1,34 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination: every page is a `WHERE key < cursor ... LIMIT n`
+    query on an indexed ordering, so memory and latency do not grow with the
+    table size or page depth. Clients pick `?page_size=` up to a hard cap.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        self.page_size = settings.API_PAGE_SIZE
+        self.max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class ContentCursorPagination(KeysetCursorPagination):
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        # Full-text search results page through their relevance ranking.
+        if request.query_params.get('search', '').strip():
+            return ('-search_rank', '-id')
+        return super().get_ordering(request, queryset, view)
+
+
+class CategoryCursorPagination(KeysetCursorPagination):
+    ordering = 'name'
+
+
+class UserCursorPagination(KeysetCursorPagination):
+    ordering = ('-date_joined', '-id')
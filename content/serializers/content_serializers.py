@@ -1,7 +1,12 @@
-import os, requests, json, re
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from content.models import Category, Content
 from content.serializers.category_serializers import CategorySerializer
+from content.services.analysis import analyze_text
+from content.services.cache import fingerprint
+from content.services.jobs import enqueue_analyses, enqueue_analysis, reanalysis_time
+from content.services.similarity import index_on_commit
 
 
 class ContentSerializer(serializers.ModelSerializer):
@@ -16,87 +21,167 @@ class ContentSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'body', 'category', 'category_id', 'metadata',
             'owner', 'is_public', 'created_at', 'updated_at',
-            'summary', 'sentiment', 'topics', 'recommendations',
+            'summary', 'sentiment', 'topics', 'recommendations', 'analysis_status', 'analysis_engine',
+        ]
+        read_only_fields = [
+            'id', 'owner', 'created_at', 'updated_at',
+            'summary', 'sentiment', 'topics', 'recommendations', 'analysis_status', 'analysis_engine',
         ]
-        read_only_fields = ['id', 'owner', 'created_at', 'updated_at', 'summary', 'sentiment', 'topics', 'recommendations']
 
     def analyze_with_groq(self, text):
         """
         Calls the GROQ API to analyze the given text and return a dict with
-        summary, sentiment, topics, and recommendations. Handles extracting
-        the JSON object from the AI's response, even if wrapped in markdown.
+        summary, sentiment, topics, and recommendations.
         """
-        api_key = os.getenv('GROQ_API_KEY')
-        if not api_key or not text:
-            return {}
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json',
-        }
-        payload = {
-            "model": "llama3-8b-8192",
-            "messages": [
-                {"role": "system", "content": "You are an AI assistant that summarizes, analyzes sentiment, extracts topics, and recommends related content. Return a JSON object with keys: summary, sentiment, topics, recommendations."},
-                {"role": "user", "content": f"Summarize, analyze sentiment, extract topics, and recommend related content for: {text}"}
-            ],
-            "max_tokens": 256,
-        }
-        try:
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30,
-            )
-            if response.status_code != 200:
-                return {}
-            result = response.json()
-            ai_content = result['choices'][0]['message']['content']
-            match = re.search(r'```\n({[\s\S]+?})\n```', ai_content)
-            if match:
-                return json.loads(match.group(1))
-            match = re.search(r'({[\s\S]+?})', ai_content)
-            if match:
-                return json.loads(match.group(1))
-            return {}
-        except Exception:
-            return {}
+        return analyze_text(text)
 
     def create(self, validated_data):
         """
-        On content creation, automatically analyze the body text using GROQ
-        and populate summary, sentiment, topics, and recommendations fields.
+        On content creation, queue an AI analysis of the body text. The
+        summary, sentiment, topics, and recommendations fields are filled in
+        by the background worker.
         """
-        ai_result = self.analyze_with_groq(validated_data.get('body', ''))
-        validated_data['summary'] = ai_result.get('summary') or ''
-        validated_data['sentiment'] = ai_result.get('sentiment') or ''
-        validated_data['topics'] = ai_result.get('topics')
-        validated_data['recommendations'] = ai_result.get('recommendations') or ''
-        return super().create(validated_data)
+        instance = super().create(validated_data)
+        self.analysis_run_after = enqueue_analysis(instance).run_after
+        return instance
 
     def update(self, instance, validated_data):
         """
-        On content update, re-analyze the (possibly updated) body text using GROQ
-        and update the AI-generated fields accordingly.
+        On content update, queue a re-analysis if the body text changed
+        (deferred for minor edits, see `reanalysis_time`). The previous AI
+        fields are kept until the new result is ready.
         """
-        ai_result = self.analyze_with_groq(validated_data.get('body', instance.body))
-        validated_data['summary'] = ai_result.get('summary') or ''
-        validated_data['sentiment'] = ai_result.get('sentiment') or ''
-        validated_data['topics'] = ai_result.get('topics')
-        validated_data['recommendations'] = ai_result.get('recommendations') or ''
-        return super().update(instance, validated_data)
-
-    def to_representation(self, instance):
+        old_body = instance.body
+        instance = super().update(instance, validated_data)
+        self.analysis_run_after = reanalysis_time(instance, old_body)
+        if self.analysis_run_after is not None:
+            enqueue_analysis(instance, self.analysis_run_after)
+        return instance
+
+
+class BatchPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves primary keys from rows fetched once per batch instead of
+    running one query per item.
+    """
+    def __init__(self, objects, **kwargs):
+        self.objects = objects
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool) or not isinstance(data, (int, str)):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.objects[int(data)]
+        except ValueError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+def is_id(value):
+    # JSON integers only: true/false are ints to Python, and lists or objects cannot be looked up.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class BulkContentSerializer(serializers.ListSerializer):
+    """
+    Validates and writes a batch of content items. Items with an `id`
+    partially update that row (the caller's own, unless they are staff);
+    the others create new rows. Invalid items are collected in
+    `item_errors` by index instead of rejecting the whole batch.
+    """
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not data:
+            self.fail('empty')
+        if self.max_length is not None and len(data) > self.max_length:
+            self.fail('max_length', max_length=self.max_length)
+
+        items = [item if isinstance(item, dict) else {} for item in data]
+        user = self.context['request'].user
+        instances = Content.objects.filter(pk__in=[item['id'] for item in items if is_id(item.get('id'))])
+        if not user.is_staff:
+            instances = instances.filter(owner=user)
+        instances = instances.in_bulk()
+        categories = Category.objects.in_bulk([
+            # isdecimal(), not isdigit(): int() rejects digits such as '²'; the field reports those per item.
+            int(item['category_id']) for item in items if str(item.get('category_id', '')).isdecimal()
+        ])
+        self.child.fields['category_id'] = BatchPrimaryKeyRelatedField(
+            objects=categories, queryset=Category.objects.all(), source='category', write_only=True, required=False,
+        )
+
+        validated, self.item_errors, seen = [], {}, set()
+        for index, item in enumerate(data):
+            instance = None
+            if isinstance(item, dict) and 'id' in item:
+                pk = item['id']
+                if not is_id(pk):
+                    self.item_errors[index] = {'id': ['A valid integer is required.']}
+                    continue
+                if pk in seen:
+                    # bulk_update() would silently keep only one of the writes
+                    self.item_errors[index] = {'id': ['Duplicate id in this batch.']}
+                    continue
+                seen.add(pk)
+                instance = instances.get(pk)
+                if instance is None:
+                    self.item_errors[index] = {'id': ['Not found.']}
+                    continue
+            self.child.instance = instance
+            self.child.initial_data = item
+            self.partial = instance is not None  # fields check the root serializer for partial updates
+            try:
+                validated.append((index, instance, self.child.run_validation(item)))
+            except serializers.ValidationError as exc:
+                self.item_errors[index] = exc.detail
+        self.partial = False
+        self.child.instance = None
+        return validated
+
+    def save(self, owner):
         """
-        When serializing (GET), if any AI field is missing, analyze the content
-        on-the-fly and save the results. Ensures all AI fields are always present
-        in API responses, even for legacy or incomplete data.
+        Writes every valid item in one transaction with bulk_create and
+        bulk_update, then queues AI analysis for new rows and changed bodies
+        (deferred for minor edits, as in ContentSerializer.update) and
+        updates their related-content vectors (bulk writes send no
+        signals). New rows belong to `owner`. Returns (index, content,
+        created) for each written item.
         """
-        if not instance.summary or not instance.sentiment or not instance.topics or not instance.recommendations:
-            ai_result = self.analyze_with_groq(instance.body)
-            instance.summary = ai_result.get('summary') or ''
-            instance.sentiment = ai_result.get('sentiment') or ''
-            instance.topics = ai_result.get('topics')
-            instance.recommendations = ai_result.get('recommendations') or ''
-            instance.save(update_fields=['summary', 'sentiment', 'topics', 'recommendations'])
-        return super().to_representation(instance)
+        now = timezone.now()
+        written, fields = [], {'updated_at', 'body_fingerprint'}
+        to_analyze = {}  # run_after -> rows
+        to_index = []
+        for index, instance, attrs in self.validated_data:
+            if instance is None:
+                instance = Content(owner=owner, **attrs)
+                run_after = now
+                written.append((index, instance, True))
+                to_index.append(instance)
+            else:
+                old_body = instance.body
+                for field, value in attrs.items():
+                    setattr(instance, field, value)
+                    fields.add(field)
+                instance.updated_at = now  # bulk_update() skips auto_now
+                run_after = reanalysis_time(instance, old_body, now)
+                written.append((index, instance, False))
+                if {'title', 'body'} & attrs.keys():
+                    to_index.append(instance)
+            if run_after is not None:
+                instance.body_fingerprint = fingerprint(instance.body)
+                to_analyze.setdefault(run_after, []).append(instance)
+        if not written:
+            return written
+
+        with transaction.atomic():
+            Content.objects.bulk_create([content for _, content, created in written if created])
+            updated = [content for _, content, created in written if not created]
+            if updated:
+                Content.objects.bulk_update(updated, sorted(fields))
+            for run_after, contents in to_analyze.items():
+                enqueue_analyses(contents, run_after)
+            index_on_commit(to_index)
+        return written
@@ -0,0 +1,424 @@
+import asyncio, contextvars, math, os, json, logging, re, threading
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from content.metrics import record_cache_lookup
+from content.services.cache import fingerprint, get_analysis_cache, make_key
+from content.services.chunking import estimate_tokens, split_text
+from content.services.llm import GROQ_MODEL, get_async_client, get_client
+from content.services.local_analysis import analyze_local
+from content.services.singleflight import AsyncSingleFlight, SingleFlight, shared_lease, shared_lease_async
+
+
+logger = logging.getLogger(__name__)
+
+AI_FIELDS = ['summary', 'sentiment', 'topics', 'recommendations']
+
+# ANALYSIS_ENGINE values: GROQ only, the in-process analyzer only, or GROQ
+# with the local analyzer as fallback when GROQ is down or over budget.
+ENGINE_GROQ = 'groq'
+ENGINE_LOCAL = 'local'
+ENGINE_AUTO = 'auto'
+ENGINES = [ENGINE_AUTO, ENGINE_GROQ, ENGINE_LOCAL]
+
+ANALYSIS_SYSTEM_PROMPT = "You are an AI assistant that summarizes, analyzes sentiment, extracts topics, and recommends related content. Return a JSON object with keys: summary, sentiment, topics, recommendations."
+ANALYSIS_USER_PROMPT = "Summarize, analyze sentiment, extract topics, and recommend related content for: {text}"
+COMBINE_USER_PROMPT = "These are analyses of consecutive sections of one text, as a JSON list. Combine them into one analysis of the whole text: {text}"
+
+# Concurrent misses for the same cache key share one GROQ call (see content.services.singleflight).
+_flights = SingleFlight()
+_async_flights = AsyncSingleFlight()
+
+
+class AnalysisParseError(ValueError):
+    """
+    GROQ answered, but not with a usable analysis. Asking again for the same
+    text tends to give the same answer, so callers record it rather than retry.
+    """
+    def __init__(self, message, reply=''):
+        super().__init__(message)
+        self.reply = reply
+
+
+def analyze_text(text, raise_parse_errors=False, engine=None, latency_budget=None):
+    """
+    Analyzes the given text and returns a dict with summary, sentiment,
+    topics, and recommendations, using `engine` (ANALYSIS_ENGINE by
+    default). GROQ replies are parsed even if wrapped in markdown; texts
+    longer than ANALYSIS_CHUNK_TOKENS go through `analyze_chunks`, and
+    results are cached by text hash. GROQ returns an empty dict (not cached)
+    when the API key is missing or the call fails; unusable replies raise
+    AnalysisParseError instead when `raise_parse_errors` is set. In auto
+    mode those empty results, and calls still running after `latency_budget`
+    seconds (ANALYSIS_LATENCY_BUDGET by default), are replaced by a local
+    analysis.
+    """
+    engine = engine or settings.ANALYSIS_ENGINE
+    if not text:
+        return {}
+    if engine == ENGINE_LOCAL:
+        return analyze_local([text])[0]
+    if not os.getenv('GROQ_API_KEY'):
+        return analyze_local([text])[0] if engine == ENGINE_AUTO else {}
+    if engine != ENGINE_AUTO:
+        return _analyze_groq(text, raise_parse_errors)
+
+    budget = settings.ANALYSIS_LATENCY_BUDGET if latency_budget is None else latency_budget
+    try:
+        ai_result = call_within_budget(budget, _analyze_groq, text, raise_parse_errors)
+    except TimeoutError:
+        logger.info('GROQ analysis over the %ss budget; using the local analyzer.', budget)
+        ai_result = {}
+    return ai_result or analyze_local([text])[0]
+
+
+def _analyze_groq(text, raise_parse_errors=False):
+    chunks = split_text(text, settings.ANALYSIS_CHUNK_TOKENS)
+    if len(chunks) > 1:
+        return analyze_chunks(chunks, raise_parse_errors)
+    return _analyze(text, ANALYSIS_USER_PROMPT, raise_parse_errors)
+
+
+_budget_pool = None
+_budget_pool_lock = threading.Lock()
+
+
+def call_within_budget(budget, fn, *args, **kwargs):
+    """
+    Returns fn(*args, **kwargs), or raises TimeoutError once `budget`
+    seconds have passed (0 waits as long as it takes). Timed-out calls keep
+    running on a shared pool, so a slow GROQ answer still reaches the
+    analysis cache for the next request. The call sees the caller's context
+    variables, so its GROQ and DB time count towards the caller's request.
+    """
+    global _budget_pool
+    if not budget:
+        return fn(*args, **kwargs)
+    with _budget_pool_lock:
+        if _budget_pool is None:
+            _budget_pool = ThreadPoolExecutor(max_workers=settings.GROQ_POOL_SIZE, thread_name_prefix='groq-budget')
+    return _budget_pool.submit(contextvars.copy_context().run, _in_thread, fn, *args, **kwargs).result(timeout=budget)
+
+
+def analyze_chunks(chunks, raise_parse_errors=False):
+    """
+    Map-reduce analysis of a long text: analyzes the chunks concurrently,
+    then has GROQ combine the partial analyses into one. Each chunk is cached
+    on its own, so after an edit only the chunks that changed cost a call.
+    Returns an empty dict if any chunk fails.
+    """
+    contexts = [contextvars.copy_context() for _ in chunks]  # a context can only be entered by one thread at a time
+    with ThreadPoolExecutor(max_workers=settings.ANALYSIS_CHUNK_WORKERS) as pool:
+        partials = list(pool.map(
+            lambda context, chunk: context.run(_in_thread, _analyze, chunk, ANALYSIS_USER_PROMPT, raise_parse_errors),
+            contexts, chunks,
+        ))
+    while len(partials) > 1 and all(partials):
+        partials = [
+            _analyze(combine_input(group), COMBINE_USER_PROMPT, raise_parse_errors) if len(group) > 1 else group[0]
+            for group in combine_groups(partials)
+        ]
+    return partials[0] if all(partials) else {}
+
+
+def _analyze(text, user_prompt, raise_parse_errors=False):
+    # One cached GROQ call.
+    cache = get_analysis_cache()
+    cache_key = make_key(text, GROQ_MODEL, ANALYSIS_SYSTEM_PROMPT + user_prompt)
+    cached = cache.get(cache_key)
+    record_cache_lookup(cached is not None)
+    if cached is not None:
+        return cached
+
+    try:
+        return coalesced(cache_key, lambda: parse_analysis(
+            get_client().chat(analysis_messages(text, user_prompt), max_tokens=settings.ANALYSIS_MAX_TOKENS)
+        ))
+    except AnalysisParseError as e:
+        if raise_parse_errors:
+            raise
+        logger.warning('Unusable AI analysis reply: %s', e)
+        return {}
+    except Exception:
+        return {}
+
+
+def coalesced(cache_key, call):
+    """
+    Returns `call()`, the value to store under `cache_key` in the analysis
+    cache, and caches it. Concurrent misses for the same key share one call:
+    threads of this process wait for it and get its result (or exception),
+    other processes wait for the result to reach the analysis cache.
+    """
+    return _flights.do(cache_key, _call_once, cache_key, call)
+
+
+def _call_once(cache_key, call):
+    cache = get_analysis_cache()
+    with shared_lease(cache_key, lambda: cache.get(cache_key)) as cached:
+        if cached is not None:
+            return cached
+        value = call()
+        cache.set(cache_key, value)
+        return value
+
+
+def _in_thread(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # Worker threads get their own DB connection (analysis cache lookups).
+        connections.close_all()
+
+
+async def analyze_text_async(text, engine=None, latency_budget=None):
+    """
+    Same as `analyze_text`, but awaits GROQ through the async client so an
+    ASGI worker can serve other requests meanwhile. Chunks of long texts are
+    analyzed concurrently on the event loop. Over the latency budget the
+    GROQ calls are cancelled rather than left running.
+    """
+    engine = engine or settings.ANALYSIS_ENGINE
+    if not text:
+        return {}
+    if engine == ENGINE_LOCAL:
+        return await _analyze_local_async(text)
+    if not os.getenv('GROQ_API_KEY'):
+        return await _analyze_local_async(text) if engine == ENGINE_AUTO else {}
+    if engine != ENGINE_AUTO:
+        return await _analyze_groq_async(text)
+
+    budget = settings.ANALYSIS_LATENCY_BUDGET if latency_budget is None else latency_budget
+    try:
+        ai_result = await asyncio.wait_for(_analyze_groq_async(text), budget or None)
+    except asyncio.TimeoutError:
+        logger.info('GROQ analysis over the %ss budget; using the local analyzer.', budget)
+        ai_result = {}
+    return ai_result or await _analyze_local_async(text)
+
+
+async def _analyze_local_async(text):
+    # NumPy work, run in a worker thread rather than on the event loop.
+    return (await sync_to_async(analyze_local, thread_sensitive=False)([text]))[0]
+
+
+async def _analyze_groq_async(text):
+    chunks = split_text(text, settings.ANALYSIS_CHUNK_TOKENS)
+    limit = asyncio.Semaphore(settings.ANALYSIS_CHUNK_WORKERS)  # as many chunk calls at once as analyze_chunks
+
+    async def analyze_chunk(chunk):
+        async with limit:
+            return await _analyze_async(chunk, ANALYSIS_USER_PROMPT)
+
+    partials = await asyncio.gather(*(analyze_chunk(chunk) for chunk in chunks))
+    while len(partials) > 1 and all(partials):
+        partials = [
+            await _analyze_async(combine_input(group), COMBINE_USER_PROMPT) if len(group) > 1 else group[0]
+            for group in combine_groups(partials)
+        ]
+    return partials[0] if all(partials) else {}
+
+
+async def _analyze_async(text, user_prompt):
+    cache = get_analysis_cache()
+    cache_key = make_key(text, GROQ_MODEL, ANALYSIS_SYSTEM_PROMPT + user_prompt)
+    cached = await sync_to_async(cache.get)(cache_key)
+    record_cache_lookup(cached is not None)
+    if cached is not None:
+        return cached
+
+    try:
+        return await coalesced_async(cache_key, lambda: _chat_async(text, user_prompt))
+    except AnalysisParseError as e:
+        logger.warning('Unusable AI analysis reply: %s', e)
+        return {}
+    except Exception:
+        return {}
+
+
+async def _chat_async(text, user_prompt):
+    return parse_analysis(
+        await get_async_client().chat(analysis_messages(text, user_prompt), max_tokens=settings.ANALYSIS_MAX_TOKENS)
+    )
+
+
+async def coalesced_async(cache_key, call):
+    """
+    Same as `coalesced` for a coroutine function `call`. The shared call is
+    cancelled once every caller waiting on it has been cancelled.
+    """
+    return await _async_flights.do(cache_key, _call_once_async, cache_key, call)
+
+
+async def _call_once_async(cache_key, call):
+    cache = get_analysis_cache()
+    async with shared_lease_async(cache_key, sync_to_async(lambda: cache.get(cache_key))) as cached:
+        if cached is not None:
+            return cached
+        value = await call()
+        await sync_to_async(cache.set)(cache_key, value)
+        return value
+
+
+def estimate_analysis_tokens(text, max_tokens=None):
+    """
+    GROQ tokens (prompt plus reply) an analysis of `text` is expected to
+    use, counting the chunk and combine calls of long texts.
+    """
+    max_tokens = max_tokens or settings.ANALYSIS_MAX_TOKENS
+    prompt = estimate_tokens(ANALYSIS_SYSTEM_PROMPT + ANALYSIS_USER_PROMPT) + estimate_tokens(text or '')
+    chunks = math.ceil(prompt / settings.ANALYSIS_CHUNK_TOKENS)
+    cost = prompt + chunks * max_tokens
+    if chunks > 1:
+        cost += chunks * max_tokens * 2 + max_tokens  # partial analyses read back, then one combined reply
+    return cost
+
+
+def analysis_messages(text, user_prompt=ANALYSIS_USER_PROMPT):
+    return [
+        {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt.format(text=text)}
+    ]
+
+
+def combine_input(partials):
+    return json.dumps(partials, ensure_ascii=False)
+
+
+def combine_groups(partials):
+    """
+    Groups consecutive partial analyses so that each combine prompt stays
+    within ANALYSIS_CHUNK_TOKENS; very long texts are combined over several
+    rounds.
+    """
+    groups, current, size = [], [], 0
+    for partial in partials:
+        cost = estimate_tokens(combine_input(partial))
+        if current and size + cost > settings.ANALYSIS_CHUNK_TOKENS:
+            groups.append(current)
+            current, size = [], 0
+        current.append(partial)
+        size += cost
+    groups.append(current)
+    if len(groups) == len(partials):
+        # Nothing fits together; pair them up so every round still halves the list.
+        groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+    return groups
+
+
+def extract_json_objects(text):
+    """
+    Yields every top-level JSON object embedded in `text`, in order. Decodes
+    incrementally from each "{", so nested objects, braces inside strings and
+    prose or markdown fences around the JSON are all handled.
+    """
+    decoder = json.JSONDecoder()
+    index = text.find('{')
+    while index != -1:
+        try:
+            obj, end = decoder.raw_decode(text, index)
+        except json.JSONDecodeError:
+            index = text.find('{', index + 1)
+            continue
+        if isinstance(obj, dict):
+            yield obj
+        index = text.find('{', end)
+
+
+def _nested_objects(obj):
+    # The object itself, then any objects nested in it (e.g. {"analysis": {...}}).
+    queue = [obj]
+    while queue:
+        obj = queue.pop(0)
+        yield obj
+        queue.extend(value for value in obj.values() if isinstance(value, dict))
+
+
+def _text(value, field):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        raise AnalysisParseError(f'"{field}" must be a string, got {type(value).__name__}.')
+    return value.strip()
+
+
+def validate_analysis(data):
+    """
+    Checks a decoded object against the analysis schema and returns it
+    normalized: summary, sentiment and recommendations as strings, topics as
+    a list of strings. Accepts shapes models commonly produce instead
+    (capitalized keys, {"label": ...} sentiments, comma-separated topics,
+    recommendation lists). Raises AnalysisParseError otherwise.
+    """
+    data = {str(key).strip().lower(): value for key, value in data.items()}
+    missing = [field for field in AI_FIELDS if field not in data]
+    if missing:
+        raise AnalysisParseError(f'Missing keys: {", ".join(missing)}.')
+
+    summary = _text(data['summary'], 'summary')
+    if not summary:
+        raise AnalysisParseError('"summary" is empty.')
+
+    sentiment = data['sentiment']
+    if isinstance(sentiment, dict):
+        sentiment = sentiment.get('label') or sentiment.get('overall') or sentiment.get('sentiment') or ''
+    sentiment = _text(sentiment, 'sentiment').lower()[:128]
+    if not sentiment:
+        raise AnalysisParseError('"sentiment" is empty.')
+
+    topics = data['topics']
+    if isinstance(topics, str):
+        topics = topics.split(',')
+    if not isinstance(topics, list) or not all(isinstance(topic, str) for topic in topics):
+        raise AnalysisParseError('"topics" must be a list of strings.')
+    topics = [topic.strip() for topic in topics if topic.strip()]
+
+    recommendations = data['recommendations']
+    if isinstance(recommendations, list):
+        recommendations = '\n'.join(
+            item.get('title') or json.dumps(item) if isinstance(item, dict) else _text(item, 'recommendations')
+            for item in recommendations
+        )
+    recommendations = _text(recommendations, 'recommendations')
+
+    return {'summary': summary, 'sentiment': sentiment, 'topics': topics, 'recommendations': recommendations}
+
+
+def parse_analysis(ai_content):
+    """
+    Extracts the analysis object from the AI's response, even if wrapped in
+    prose or markdown, and validates it. Raises AnalysisParseError (carrying
+    the reply) when there is no usable object.
+    """
+    if not isinstance(ai_content, str) or not ai_content.strip():
+        raise AnalysisParseError('Empty reply.', ai_content or '')
+    candidates = list(extract_json_objects(ai_content))
+    if not candidates:
+        # Trailing commas are the most common near-JSON slip.
+        candidates = list(extract_json_objects(re.sub(r',\s*([}\]])', r'\1', ai_content)))
+    if not candidates:
+        raise AnalysisParseError('No JSON object in reply.', ai_content)
+
+    error = None
+    for candidate in candidates:
+        for obj in _nested_objects(candidate):
+            try:
+                return validate_analysis(obj)
+            except AnalysisParseError as e:
+                error = error or e
+    error.reply = ai_content
+    raise error
+
+
+def apply_analysis(instance, ai_result):
+    """
+    Copies an analysis result onto a Content instance (without saving),
+    recording which body it belongs to and which engine produced it.
+    """
+    instance.summary = ai_result.get('summary') or ''
+    instance.sentiment = ai_result.get('sentiment') or ''
+    instance.topics = ai_result.get('topics')
+    instance.recommendations = ai_result.get('recommendations') or ''
+    instance.body_fingerprint = fingerprint(instance.body)
+    instance.analysis_engine = ai_result.get('engine') or ENGINE_GROQ
@@ -0,0 +1,116 @@
+import contextvars, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connections, transaction
+from content.models import AnalysisJob, Content
+from django.conf import settings
+from content.services.analysis import AI_FIELDS, ENGINE_LOCAL, analyze_text, apply_analysis
+from content.services.local_analysis import analyze_local
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket allowing `rate` calls per second on average,
+    with bursts of up to `burst` calls. A rate of 0 disables limiting.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _analyze(text, limiter, engine):
+    limiter.acquire()
+    try:
+        return analyze_text(text, engine=engine)
+    finally:
+        # Worker threads get their own DB connection (analysis cache lookups).
+        connections.close_all()
+
+
+def analyze_texts(texts, workers=4, rate=0, engine=None):
+    """
+    Analyzes several texts concurrently on a bounded thread pool and returns
+    the results in input order. The local engine analyzes them all in one
+    vectorized pass instead.
+    """
+    if (engine or settings.ANALYSIS_ENGINE) == ENGINE_LOCAL:
+        return analyze_local(texts)
+    limiter = RateLimiter(rate, burst=workers)
+    contexts = [contextvars.copy_context() for _ in texts]  # GROQ time counts towards the calling request
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda context, text: context.run(_analyze, text, limiter, engine), contexts, texts))
+
+
+def save_results(contents, results):
+    """
+    Writes a chunk of analysis results back with a single bulk_update and
+    closes any queued jobs for the analyzed rows. Rows whose analysis came
+    back empty are marked as failed. Rows whose body was edited while they
+    were being analyzed are left alone: the edit queued its own job.
+    Returns the number of successes written.
+    """
+    with transaction.atomic():
+        current = dict(
+            Content.objects.select_for_update().filter(pk__in=[content.pk for content in contents]).values_list('pk', 'body')
+        )
+        written, succeeded = [], []
+        for content, ai_result in zip(contents, results):
+            if current.get(content.pk) != content.body:
+                continue
+            if ai_result:
+                apply_analysis(content, ai_result)
+                content.analysis_status = Content.AnalysisStatus.DONE
+                succeeded.append(content.pk)
+            else:
+                content.analysis_status = Content.AnalysisStatus.FAILED
+            written.append(content)
+        Content.objects.bulk_update(written, AI_FIELDS + ['body_fingerprint', 'analysis_engine', 'analysis_status'])
+        AnalysisJob.objects.filter(content_id__in=succeeded, status=AnalysisJob.Status.QUEUED).update(status=AnalysisJob.Status.DONE)
+    return len(succeeded)
+
+
+def analyze_contents(queryset, workers=4, rate=0, chunk_size=100, after_pk=0, engine=None):
+    """
+    Streams the content rows of `queryset` in primary-key order, starting
+    after `after_pk`, and analyzes them chunk by chunk. Yields a progress
+    dict after every chunk; its `last_pk` can be used to resume later.
+    """
+    queryset = (
+        queryset
+        .filter(pk__gt=after_pk)
+        .order_by('pk')
+        .only('pk', 'body', *AI_FIELDS, 'body_fingerprint', 'analysis_engine', 'analysis_status')
+    )
+    processed = succeeded = 0
+    chunk = []
+
+    def flush():
+        nonlocal processed, succeeded
+        results = analyze_texts([content.body for content in chunk], workers=workers, rate=rate, engine=engine)
+        succeeded += save_results(chunk, results)
+        processed += len(chunk)
+        return {'last_pk': chunk[-1].pk, 'processed': processed, 'succeeded': succeeded}
+
+    for content in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(content)
+        if len(chunk) >= chunk_size:
+            yield flush()
+            chunk = []
+    if chunk:
+        yield flush()
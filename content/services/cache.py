@@ -0,0 +1,170 @@
+import hashlib, threading, time
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from content.models import AnalysisCacheEntry
+
+
+def normalize_text(text):
+    """
+    Collapses whitespace so trivially different copies of a text share a key.
+    """
+    return ' '.join((text or '').split())
+
+
+def fingerprint(text):
+    """
+    Hash of the normalized text. Content stores the fingerprint of the body
+    its analysis was made (or queued) for, so updates that leave the body
+    alone, or only touch whitespace, do not trigger a new analysis.
+    """
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def make_key(text, model, prompt):
+    """
+    Builds the cache key for an analysis: a hash of the normalized text plus
+    the model and prompt it was produced with.
+    """
+    digest = hashlib.sha256()
+    for part in (model, prompt, normalize_text(text)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    Small thread-safe in-process LRU with a per-entry TTL.
+    """
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class AnalysisCache:
+    """
+    Two-tier cache for AI analysis results: an in-process LRU in front of
+    the AnalysisCacheEntry table. Both tiers expire entries after `ttl`
+    seconds; the table is also trimmed to `db_max_entries` (least recently
+    used first).
+    """
+    PRUNE_EVERY = 100  # writes between two trims of the database tier
+
+    def __init__(self, max_entries, ttl, db_max_entries):
+        self.ttl = ttl
+        self.db_max_entries = db_max_entries
+        self.memory = LRUCache(max_entries, ttl)
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+
+        cutoff = timezone.now() - timedelta(seconds=self.ttl)
+        entry = AnalysisCacheEntry.objects.filter(key=key, created_at__gte=cutoff).only('result').first()
+        if entry is None:
+            self._count('misses')
+            return None
+        AnalysisCacheEntry.objects.filter(pk=entry.pk).update(last_used_at=timezone.now(), hits=F('hits') + 1)
+        self.memory.set(key, entry.result)
+        self._count('db_hits')
+        return entry.result
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        AnalysisCacheEntry.objects.update_or_create(
+            key=key, defaults={'result': value, 'created_at': timezone.now(), 'last_used_at': timezone.now()}
+        )
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """
+        Deletes expired rows and trims the table to `db_max_entries`.
+        """
+        cutoff = timezone.now() - timedelta(seconds=self.ttl)
+        deleted, _ = AnalysisCacheEntry.objects.filter(created_at__lt=cutoff).delete()
+        keep = (
+            AnalysisCacheEntry.objects
+            .order_by('-last_used_at')
+            .values_list('last_used_at', flat=True)[self.db_max_entries:self.db_max_entries + 1]
+        )
+        boundary = next(iter(keep), None)
+        if boundary is not None:
+            deleted += AnalysisCacheEntry.objects.filter(last_used_at__lte=boundary).delete()[0]
+        return deleted
+
+    def clear(self):
+        self.memory.clear()
+        AnalysisCacheEntry.objects.all().delete()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = sum(stats.values())
+        hits = stats['memory_hits'] + stats['db_hits']
+        stats['hit_ratio'] = round(hits / lookups, 4) if lookups else 0.0
+        stats['memory_entries'] = len(self.memory)
+        return stats
+
+
+_analysis_cache = None
+
+
+def get_analysis_cache():
+    """
+    Returns the per-process analysis cache, configured from settings.
+    """
+    global _analysis_cache
+    if _analysis_cache is None:
+        _analysis_cache = AnalysisCache(
+            max_entries=settings.ANALYSIS_CACHE_MAX_ENTRIES,
+            ttl=settings.ANALYSIS_CACHE_TTL,
+            db_max_entries=settings.ANALYSIS_CACHE_DB_MAX_ENTRIES,
+        )
+    return _analysis_cache
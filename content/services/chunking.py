@@ -0,0 +1,71 @@
+import math, re, zlib
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text):
+    """
+    Conservative token estimate without loading a tokenizer: about four
+    ASCII characters per token, and one token per other character (accented
+    letters, CJK, emoji), which Llama-style tokenizers split finely.
+    """
+    ascii_chars = sum(1 for char in text if char < '\x80')
+    return math.ceil(ascii_chars / 4) + len(text) - ascii_chars
+
+
+def _pieces(text, budget):
+    # Paragraphs, with oversized ones cut into sentences and oversized sentences into word runs.
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= budget:
+            yield paragraph
+            continue
+        for sentence in SENTENCE_END.split(paragraph):
+            if estimate_tokens(sentence) <= budget:
+                yield sentence
+                continue
+            words, size = [], 0
+            for word in sentence.split():
+                cost = estimate_tokens(word) + 1
+                if words and size + cost > budget:
+                    yield ' '.join(words)
+                    words, size = [], 0
+                words.append(word)
+                size += cost
+            if words:
+                yield ' '.join(words)
+
+
+def _is_boundary(piece):
+    # Content-defined cut points (about one piece in four), stable across processes.
+    return zlib.crc32(piece.encode('utf-8')) % 4 == 0
+
+
+def split_text(text, budget):
+    """
+    Splits text into chunks of at most `budget` estimated tokens, cutting
+    only between paragraphs (or sentences, for huge paragraphs). Once a chunk
+    is half full it also ends after any paragraph whose hash marks a cut
+    point, so chunk boundaries depend on local content rather than on
+    offsets: editing one paragraph changes its own chunk (and rarely a
+    neighbour), and the other chunks keep their text and cached analyses.
+    """
+    if estimate_tokens(text) <= budget:
+        return [text]
+    chunks, current, size = [], [], 0
+    for piece in _pieces(text, budget):
+        cost = estimate_tokens(piece) + 1
+        if current and size + cost > budget:
+            chunks.append('\n\n'.join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += cost
+        if size >= budget // 2 and _is_boundary(piece):
+            chunks.append('\n\n'.join(current))
+            current, size = [], 0
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
@@ -0,0 +1,170 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+from content.models import AnalyticsCounter, AnalyticsCounterDelta, Category
+
+Dimension = AnalyticsCounter.Dimension
+
+# Ground truth for every counter; keys must match the triggers in migration 0010.
+GROUND_TRUTH_SQL = """
+SELECT 'users', '', count(*) FROM auth_user
+UNION ALL SELECT 'categories', '', count(*) FROM content_category
+UNION ALL SELECT 'content', '', count(*) FROM content_content
+UNION ALL SELECT 'content_category', coalesce(category_id::text, ''), count(*) FROM content_content GROUP BY 2
+UNION ALL SELECT 'content_sentiment', lower(btrim(coalesce(sentiment, ''))), count(*) FROM content_content GROUP BY 2
+UNION ALL SELECT 'content_owner', owner_id::text, count(*) FROM content_content GROUP BY 2
+UNION ALL SELECT 'content_day', (created_at AT TIME ZONE 'UTC')::date::text, count(*) FROM content_content GROUP BY 2
+"""
+
+
+# Counter values as the triggers see them: rolled-up value plus the deltas not rolled up yet.
+CURRENT_SQL = """
+SELECT dimension, key, sum(value)::bigint FROM (
+    SELECT dimension, key, value FROM content_analyticscounter WHERE {where}
+    UNION ALL
+    SELECT dimension, key, delta FROM content_analyticscounterdelta WHERE {where}
+) AS counters
+GROUP BY dimension, key
+HAVING sum(value) > 0
+"""
+
+# The top owners without reading every owner's counter: each owner with pending deltas, plus
+# enough of the top rolled-up owners that the ones whose deltas lowered them cannot push
+# anyone out of the result.
+TOP_OWNERS_SQL = """
+WITH pending AS (
+    SELECT key, sum(delta)::bigint AS delta FROM content_analyticscounterdelta WHERE dimension = %(dimension)s GROUP BY key
+), candidates AS (
+    (
+        SELECT key FROM content_analyticscounter WHERE dimension = %(dimension)s
+        ORDER BY value DESC, key LIMIT %(limit)s + (SELECT count(*) FROM pending)
+    )
+    UNION SELECT key FROM pending
+)
+SELECT candidates.key, coalesce(counter.value, 0) + coalesce(pending.delta, 0) AS value
+FROM candidates
+LEFT JOIN content_analyticscounter counter ON counter.dimension = %(dimension)s AND counter.key = candidates.key
+LEFT JOIN pending ON pending.key = candidates.key
+WHERE coalesce(counter.value, 0) + coalesce(pending.delta, 0) > 0
+ORDER BY value DESC, candidates.key
+LIMIT %(limit)s
+"""
+
+ROLLUP_SQL = """
+WITH moved AS (DELETE FROM content_analyticscounterdelta RETURNING dimension, key, delta)
+INSERT INTO content_analyticscounter (dimension, key, value)
+SELECT dimension, key, sum(delta) FROM moved GROUP BY dimension, key
+ON CONFLICT (dimension, key) DO UPDATE SET value = content_analyticscounter.value + EXCLUDED.value
+"""
+ROLLUP_LOCK = 0x636f756e  # advisory lock id: one rollup at a time
+
+
+def rollup_counters():
+    """
+    Folds the committed deltas into the counters and returns the number of
+    counters changed. Writers only append deltas, so this is the one place
+    counter rows are updated; the analysis worker calls it every round, and
+    `get_analytics` when too many deltas are waiting.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', [ROLLUP_LOCK])
+        if not cursor.fetchone()[0]:
+            return 0  # another process is rolling up
+        cursor.execute(ROLLUP_SQL)
+        return cursor.rowcount
+
+
+def current_counters(where, params=()):
+    with connection.cursor() as cursor:
+        cursor.execute(CURRENT_SQL.format(where=where), list(params) * 2)
+        return cursor.fetchall()
+
+
+def reconcile_counters():
+    """
+    Rebuilds the analytics counters from the source tables, dropping the
+    pending deltas, and returns the drift that was corrected as
+    {(dimension, key): expected - stored}. The counter tables are locked
+    meanwhile, so concurrent writes wait for the rebuild instead of being
+    lost.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Blocks the triggers' inserts; rows written before the lock are visible to the next query.
+            cursor.execute(
+                f'LOCK TABLE {AnalyticsCounter._meta.db_table}, {AnalyticsCounterDelta._meta.db_table} '
+                'IN SHARE ROW EXCLUSIVE MODE'
+            )
+            cursor.execute(GROUND_TRUTH_SQL)
+            expected = {(dimension, key): value for dimension, key, value in cursor.fetchall() if value}
+        stored = {(dimension, key): value for dimension, key, value in current_counters('true')}
+        drift = {
+            key: expected.get(key, 0) - stored.get(key, 0)
+            for key in expected.keys() | stored.keys()
+            if expected.get(key, 0) != stored.get(key, 0)
+        }
+        AnalyticsCounterDelta.objects.all().delete()
+        AnalyticsCounter.objects.all().delete()
+        AnalyticsCounter.objects.bulk_create([
+            AnalyticsCounter(dimension=dimension, key=key, value=value)
+            for (dimension, key), value in expected.items()
+        ])
+    return drift
+
+
+def get_analytics(top_owners=10, days=30):
+    """
+    Reads totals and breakdowns from the counter tables; the cost depends on
+    the number of categories and sentiments (and on the deltas waiting for a
+    rollup), not on the number of rows. Once ANALYTICS_ROLLUP_THRESHOLD
+    deltas are waiting (no worker running), it rolls them up first.
+    """
+    threshold = settings.ANALYTICS_ROLLUP_THRESHOLD
+    if threshold and AnalyticsCounterDelta.objects.all()[threshold - 1:threshold].exists():
+        rollup_counters()
+    small = current_counters('dimension = ANY(%s)', [[
+        Dimension.USERS, Dimension.CATEGORIES, Dimension.CONTENT,
+        Dimension.CONTENT_CATEGORY, Dimension.CONTENT_SENTIMENT,
+    ]])
+    totals, by_category, by_sentiment = {}, {}, {}
+    for dimension, key, value in small:
+        if dimension == Dimension.CONTENT_CATEGORY:
+            by_category[key] = value
+        elif dimension == Dimension.CONTENT_SENTIMENT:
+            by_sentiment[key or None] = value
+        else:
+            totals[dimension] = value
+
+    names = dict(Category.objects.filter(pk__in=[int(pk) for pk in by_category if pk]).values_list('pk', 'name'))
+    with connection.cursor() as cursor:
+        cursor.execute(TOP_OWNERS_SQL, {'dimension': Dimension.CONTENT_OWNER, 'limit': top_owners})
+        owners = cursor.fetchall()
+    usernames = dict(
+        get_user_model().objects.filter(pk__in=[int(pk) for pk, _ in owners]).values_list('pk', 'username')
+    )
+    since = (timezone.now() - timedelta(days=days - 1)).date().isoformat()
+    per_day = sorted(
+        (key, value)
+        for _, key, value in current_counters('dimension = %s AND key >= %s', [Dimension.CONTENT_DAY, since])  # ISO dates sort as text
+    )
+
+    return {
+        'user_count': totals.get(Dimension.USERS, 0),
+        'content_count': totals.get(Dimension.CONTENT, 0),
+        'category_count': totals.get(Dimension.CATEGORIES, 0),
+        'content_by_category': sorted(
+            (
+                {'category': names.get(int(pk)) if pk else None, 'count': value}
+                for pk, value in by_category.items()
+            ),
+            key=lambda item: -item['count'],
+        ),
+        'content_by_sentiment': sorted(
+            ({'sentiment': sentiment, 'count': value} for sentiment, value in by_sentiment.items()),
+            key=lambda item: -item['count'],
+        ),
+        'top_owners': [{'owner': usernames.get(int(pk)), 'count': value} for pk, value in owners],
+        'content_by_day': [{'day': day, 'count': value} for day, value in per_day],
+    }
@@ -0,0 +1,100 @@
+import csv, datetime, io, json
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Exported columns, read with .values() so rows are never turned into model
+# instances or passed through ContentSerializer.
+EXPORT_FIELDS = [
+    'id', 'title', 'body', 'category_id', 'category__name', 'owner_id', 'owner__username', 'is_public',
+    'metadata', 'summary', 'sentiment', 'topics', 'recommendations', 'analysis_status', 'analysis_engine',
+    'created_at', 'updated_at',
+]
+RENAMED = {'category__name': 'category', 'owner__username': 'owner'}
+COLUMNS = [RENAMED.get(field, field) for field in EXPORT_FIELDS]
+JSON_FIELDS = {'metadata', 'topics'}
+FLUSH_BYTES = 64 * 1024  # size of each chunk handed to the WSGI/ASGI server
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder cuts datetimes to milliseconds; watermarks need the full value.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def export_rows(queryset, chunk_size):
+    """
+    Yields export rows as dicts through a server-side cursor, so only
+    `chunk_size` rows are held in memory at a time.
+    """
+    queryset = queryset.order_by('updated_at', 'id').values(*EXPORT_FIELDS)
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield {RENAMED.get(field, field): value for field, value in row.items()}
+
+
+def buffered(lines):
+    """
+    Joins encoded lines into chunks of about FLUSH_BYTES, so the server is
+    not asked to write (and flush) every row separately.
+    """
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def to_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=ExportJSONEncoder) + '\n'
+
+
+def to_csv(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=COLUMNS)
+    writer.writeheader()
+    yield out.getvalue()
+    out.seek(0)
+    out.truncate()
+    for row in rows:
+        for field in JSON_FIELDS:
+            row[field] = json.dumps(row[field]) if row[field] is not None else ''
+        writer.writerow(row)
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+
+
+FORMATS = {
+    'ndjson': (to_ndjson, 'application/x-ndjson'),
+    'csv': (to_csv, 'text/csv'),
+}
+
+
+def stream_export(queryset, output, chunk_size):
+    """
+    Returns (chunks, content_type) for the given output format.
+    """
+    encode, content_type = FORMATS[output]
+    return buffered(encode(export_rows(queryset, chunk_size))), content_type
+
+
+async def aiter_chunks(chunks):
+    """
+    Async iterator over `chunks`, advanced one chunk at a time in Django's
+    sync thread (where the server-side cursor's connection lives). Under
+    ASGI, Django reads a sync iterator into a list before sending any of
+    it, which would hold the whole export in memory.
+    """
+    done = object()
+    advance = sync_to_async(next)
+    try:
+        while (chunk := await advance(chunks, done)) is not done:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()  # closes the cursor when the client goes away early
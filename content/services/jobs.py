@@ -0,0 +1,209 @@
+import difflib
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Least
+from django.utils import timezone
+from content.models import AnalysisJob, Content
+from content.services.analysis import AI_FIELDS, AnalysisParseError, analyze_text, apply_analysis
+from content.services.cache import fingerprint
+
+
+def enqueue_analysis(content, run_after=None):
+    """
+    Queues an AI analysis for the given content and marks it as pending.
+    If a queued job already exists for the content it is reused, so repeated
+    saves do not pile up duplicate jobs; a queued job is never pushed later.
+    """
+    run_after = run_after or timezone.now()
+    job = (
+        AnalysisJob.objects
+        .filter(content=content, status=AnalysisJob.Status.QUEUED)
+        .order_by('id')
+        .first()
+    )
+    if job:
+        job.run_after = min(job.run_after, run_after)
+        job.save(update_fields=['run_after', 'updated_at'])
+    else:
+        job = AnalysisJob.objects.create(content=content, run_after=run_after)
+    content.analysis_status = Content.AnalysisStatus.PENDING
+    content.body_fingerprint = fingerprint(content.body)
+    Content.objects.filter(pk=content.pk).update(
+        analysis_status=content.analysis_status, body_fingerprint=content.body_fingerprint,
+    )
+    return job
+
+
+def is_minor_edit(old_body, new_body):
+    """
+    True when the new body is at least ANALYSIS_MINOR_EDIT_SIMILARITY
+    similar to the old one, comparing word sequences.
+    """
+    threshold = settings.ANALYSIS_MINOR_EDIT_SIMILARITY
+    if threshold >= 1:
+        return False
+    matcher = difflib.SequenceMatcher(None, (old_body or '').split(), (new_body or '').split(), autojunk=False)
+    # The cheap upper bounds settle most large edits without the full diff.
+    return matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold
+
+
+def reanalysis_time(content, old_body, now=None):
+    """
+    When an updated content row should be re-analyzed: None if its body is
+    unchanged (whitespace aside) since the last analysis, later by
+    ANALYSIS_MINOR_EDIT_DELAY seconds for minor edits of an analyzed body,
+    so a burst of small fixes costs one GROQ call, and now otherwise.
+    """
+    if content.body_fingerprint == fingerprint(content.body):
+        return None
+    now = now or timezone.now()
+    # Only defer when the stored analysis covers the previous body.
+    if content.body_fingerprint == fingerprint(old_body) and is_minor_edit(old_body, content.body):
+        return now + timedelta(seconds=settings.ANALYSIS_MINOR_EDIT_DELAY)
+    return now
+
+
+def enqueue_analyses(contents, run_after=None):
+    """
+    Batch version of `enqueue_analysis`: queues an AI analysis for every
+    given content row with a fixed number of queries, reusing queued jobs.
+    Callers keep `body_fingerprint` current on the rows they write.
+    """
+    now = timezone.now()
+    run_after = run_after or now
+    ids = [content.pk for content in contents]
+    queued = AnalysisJob.objects.filter(content_id__in=ids, status=AnalysisJob.Status.QUEUED)
+    existing = set(queued.values_list('content_id', flat=True))
+    queued.update(run_after=Least('run_after', Value(run_after)), updated_at=now)
+    AnalysisJob.objects.bulk_create([AnalysisJob(content_id=pk, run_after=run_after) for pk in ids if pk not in existing])
+    Content.objects.filter(pk__in=ids).update(analysis_status=Content.AnalysisStatus.PENDING)
+    for content in contents:
+        content.analysis_status = Content.AnalysisStatus.PENDING
+
+
+def enqueue_missing_analyses(batch_size=500, include_failed=False, include_local=False, idle_for=None):
+    """
+    Queues a job for every content row flagged as pending (or failed, when
+    `include_failed` is set, or analyzed by the local engine, when
+    `include_local` is set) that has no queued or running job yet, in
+    batches. With `idle_for`, only rows not written in the last `idle_for`
+    seconds are considered, leaving the API's own saves time to queue their
+    job. Returns the number of jobs created.
+    """
+    statuses = [Content.AnalysisStatus.PENDING]
+    if include_failed:
+        statuses.append(Content.AnalysisStatus.FAILED)
+    wanted = Q(analysis_status__in=statuses)
+    if include_local:
+        wanted |= Q(analysis_engine=Content.AnalysisEngine.LOCAL)
+    active = AnalysisJob.objects.filter(status__in=[AnalysisJob.Status.QUEUED, AnalysisJob.Status.RUNNING])
+    queryset = Content.objects.filter(wanted).exclude(pk__in=active.values('content_id'))
+    if idle_for is not None:
+        queryset = queryset.filter(updated_at__lt=timezone.now() - timedelta(seconds=idle_for))
+
+    created = 0
+    last_pk = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            AnalysisJob.objects.bulk_create([AnalysisJob(content_id=pk) for pk in ids])
+            Content.objects.filter(pk__in=ids).update(analysis_status=Content.AnalysisStatus.PENDING)
+        created += len(ids)
+        last_pk = ids[-1]
+    return created
+
+
+def claim_jobs(limit):
+    """
+    Atomically claims up to `limit` due jobs for this worker. Rows locked by
+    another worker are skipped, so several workers can run side by side.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            AnalysisJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=AnalysisJob.Status.QUEUED, run_after__lte=now)
+            .order_by('run_after', 'id')[:limit]
+        )
+        for job in jobs:
+            job.status = AnalysisJob.Status.RUNNING
+            job.locked_at = now
+            job.attempts += 1
+        AnalysisJob.objects.bulk_update(jobs, ['status', 'locked_at', 'attempts'])
+    ids = [job.content_id for job in jobs]
+    Content.objects.filter(pk__in=ids).update(analysis_status=Content.AnalysisStatus.PROCESSING)
+    return jobs
+
+
+def run_job(job):
+    """
+    Runs a claimed job: analyzes the content body and stores the result.
+    Failed analyses are retried with a growing delay until the attempt limit;
+    unusable replies fail the job at once, with the reason in `last_error`.
+    The content row is only written while its body is still the one that
+    was analyzed; an edit meanwhile has queued a newer job, which it keeps.
+    """
+    content = Content.objects.filter(pk=job.content_id).first()
+    if content is None:
+        job.delete()
+        return False
+    unchanged = Content.objects.filter(pk=content.pk, body=content.body)
+
+    try:
+        # Nobody waits on the worker, so GROQ gets as long as it needs even in auto mode.
+        ai_result = analyze_text(content.body, raise_parse_errors=True, latency_budget=0)
+    except AnalysisParseError as e:
+        job.status = AnalysisJob.Status.FAILED
+        job.last_error = f'Unusable analysis reply: {e} Reply: {e.reply[:500]}'
+        job.save(update_fields=['status', 'last_error', 'updated_at'])
+        unchanged.update(analysis_status=Content.AnalysisStatus.FAILED)
+        return False
+    if ai_result:
+        apply_analysis(content, ai_result)
+        content.analysis_status = Content.AnalysisStatus.DONE
+        fields = AI_FIELDS + ['body_fingerprint', 'analysis_engine', 'analysis_status']
+        written = unchanged.update(**{field: getattr(content, field) for field in fields})
+        job.status = AnalysisJob.Status.DONE
+        job.last_error = '' if written else 'Body changed during the analysis; left to the newer job.'
+        job.save(update_fields=['status', 'last_error', 'updated_at'])
+        return bool(written)
+
+    job.last_error = 'Empty analysis result.'
+    if job.attempts >= settings.ANALYSIS_JOB_MAX_ATTEMPTS:
+        job.status = AnalysisJob.Status.FAILED
+        content_status = Content.AnalysisStatus.FAILED
+    else:
+        job.status = AnalysisJob.Status.QUEUED
+        job.run_after = timezone.now() + timedelta(seconds=settings.ANALYSIS_JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+        content_status = Content.AnalysisStatus.PENDING
+    job.save(update_fields=['status', 'last_error', 'run_after', 'updated_at'])
+    unchanged.update(analysis_status=content_status)
+    return False
+
+
+def requeue_stale_jobs():
+    """
+    Puts back jobs that have been running for too long (e.g. the worker that
+    claimed them was killed), so they are picked up again.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.ANALYSIS_JOB_STALE_AFTER)
+    return (
+        AnalysisJob.objects
+        .filter(status=AnalysisJob.Status.RUNNING, locked_at__lt=cutoff)
+        .update(status=AnalysisJob.Status.QUEUED, locked_at=None)
+    )
+
+
+def process_jobs(batch_size=10):
+    """
+    Claims and runs one batch of jobs. Returns the number of jobs processed.
+    """
+    jobs = claim_jobs(batch_size)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
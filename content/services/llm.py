@@ -0,0 +1,522 @@
+import asyncio, json, math, os, random, threading, time, weakref
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from content.metrics import LLM_RETRIES, llm_call, record_llm_call
+from content.throttling import record_llm_usage
+
+
+GROQ_MODEL = "llama3-8b-8192"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+COOLDOWN_KEY = 'llm:groq-cooldown-until'
+
+
+class LLMError(Exception):
+    """
+    Raised when the LLM API cannot produce a completion.
+    """
+
+
+class LLMUnavailable(LLMError):
+    """
+    Raised without calling the API while the circuit breaker is open.
+    """
+
+
+class LLMRateLimited(LLMError):
+    """
+    GROQ rate-limited us (429). Raised at once, without calling the API,
+    while the cooldown it asked for is running; `retry_after` is in seconds.
+    """
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def start_cooldown(seconds):
+    """
+    Makes every process hold off GROQ calls for `seconds` (shared through the
+    default cache, so this needs a shared cache backend to span workers).
+    """
+    until = time.time() + seconds
+    if until > (cache.get(COOLDOWN_KEY) or 0):
+        cache.set(COOLDOWN_KEY, until, math.ceil(seconds) + 1)
+
+
+async def astart_cooldown(seconds):
+    # Same as `start_cooldown`, without blocking the event loop on the cache.
+    until = time.time() + seconds
+    if until > (await cache.aget(COOLDOWN_KEY) or 0):
+        await cache.aset(COOLDOWN_KEY, until, math.ceil(seconds) + 1)
+
+
+def cooldown_remaining():
+    return max(0.0, (cache.get(COOLDOWN_KEY) or 0) - time.time())
+
+
+def _check_cooldown(remaining=None):
+    remaining = cooldown_remaining() if remaining is None else remaining
+    if remaining:
+        raise LLMRateLimited('GROQ API rate limit cooldown.', remaining)
+
+
+async def _acheck_cooldown():
+    _check_cooldown(max(0.0, (await cache.aget(COOLDOWN_KEY) or 0) - time.time()))
+
+
+def parse_stream_line(line):
+    """
+    Decodes one line of a streamed chat completion (server-sent events) into
+    (text delta, usage block or None). Returns None at the closing
+    `data: [DONE]`, and ('', None) for blank and non-data lines.
+    """
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+    if not line.startswith('data:'):
+        return '', None
+    data = line[5:].strip()
+    if data == '[DONE]':
+        return None
+    try:
+        chunk = json.loads(data)
+        choices = chunk.get('choices') or [{}]
+        text = (choices[0].get('delta') or {}).get('content') or ''
+        # GROQ sends the usage with the last chunk, under x_groq; OpenAI-style APIs at the top level.
+        usage = chunk.get('usage') or (chunk.get('x_groq') or {}).get('usage')
+    except (ValueError, AttributeError, TypeError) as e:
+        raise LLMError('GROQ API returned an invalid stream chunk.') from e
+    return text, usage
+
+
+def _stream_outcome(error):
+    # The metrics outcome of a stream that ended with `error`: cancelled when the reader went away.
+    if isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+        return 'cancelled'
+    return type(error).__name__
+
+
+def _retry_after(response):
+    value = response.headers.get('Retry-After', '')
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds. After that a single trial call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def record_refused(self):
+        """
+        The API answered but refused the call (4xx, 429). Not a failure, but
+        it is up: a half-open trial that gets this closes the circuit.
+        """
+        with self._lock:
+            if self._trial_running:
+                self.failures = 0
+                self.opened_at = None
+                self._trial_running = False
+
+
+class GroqClient:
+    """
+    Client for the GROQ chat-completions API. Keeps a pooled keep-alive
+    `requests.Session`, retries 429/5xx and connection errors with jittered
+    exponential backoff, and fails fast through a circuit breaker while the
+    API is down. A 429 starts a cooldown shared by all callers; a 429 asking
+    to wait longer than `backoff_max` raises LLMRateLimited instead of being
+    slept through, and calls during the cooldown raise it without trying.
+    """
+    def __init__(self, api_url, pool_size=10, max_retries=2, backoff_base=0.5, backoff_max=8.0,
+                 connect_timeout=3.05, read_timeout=30, breaker=None, api_key=None):
+        self.api_url = api_url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker(failure_threshold=5, reset_timeout=30)
+        self._api_key = api_key
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def api_key(self):
+        return self._api_key or os.getenv('GROQ_API_KEY')
+
+    def backoff(self, attempt, response=None):
+        """
+        Seconds to wait before retry number `attempt` (starting at 1). Honours
+        a numeric Retry-After header, otherwise uses full-jitter backoff.
+        """
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def post(self, payload, stream=False):
+        """
+        Posts a chat-completions payload and returns the decoded JSON body,
+        or with `stream` the open response, to be read as it arrives.
+        """
+        if not self.api_key:
+            raise LLMError('GROQ API key not set.')
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json',
+        }
+        attempt = 0
+        while True:
+            _check_cooldown()
+            if not self.breaker.allow():
+                raise LLMUnavailable('GROQ API circuit is open.')
+            response, settled = None, False
+            try:
+                try:
+                    response = self.session.post(
+                        self.api_url, headers=headers, json=payload, timeout=self.timeout, stream=stream,
+                    )
+                except requests.RequestException as e:
+                    error = LLMError(f'GROQ API request failed: {e}')
+                else:
+                    if response.status_code == 200:
+                        self.breaker.record_success()
+                        settled = True
+                        if stream:
+                            return response
+                        try:
+                            return response.json()
+                        except ValueError as e:
+                            raise LLMError('GROQ API returned invalid JSON.') from e
+                    if stream:
+                        response.close()  # only the status and headers are needed
+                    if response.status_code == 429 or response.status_code not in RETRY_STATUSES:
+                        self.breaker.record_refused()
+                        settled = True
+                    if response.status_code == 429:
+                        attempt += 1
+                        time.sleep(self.rate_limited(attempt, response))
+                        continue
+                    if response.status_code not in RETRY_STATUSES:
+                        # Client errors (bad key, bad payload) will not heal by retrying.
+                        raise LLMError(f'GROQ API error: HTTP {response.status_code}')
+                    error = LLMError(f'GROQ API error: HTTP {response.status_code}')
+                self.breaker.record_failure()
+                settled = True
+            finally:
+                if not settled:
+                    # Anything else that ends the attempt (an unexpected error, the caller giving
+                    # up) must still settle it, or a half-open trial keeps the circuit shut for good.
+                    self.breaker.record_failure()
+            attempt += 1
+            if attempt > self.max_retries:
+                raise error
+            LLM_RETRIES.inc()
+            time.sleep(self.backoff(attempt, response))
+
+    def rate_limited(self, attempt, response):
+        """
+        Handles a 429: starts the shared cooldown and returns the seconds to
+        wait before retrying, or raises LLMRateLimited when GROQ asks for a
+        longer wait than `backoff_max` or the retries are used up. Not a
+        failure for the circuit breaker: GROQ is up, we are over quota.
+        """
+        requested, delay = _retry_after(response), self.backoff(attempt, response)
+        start_cooldown(requested if requested is not None else delay)
+        return self._retry_delay(attempt, requested, delay)
+
+    def _retry_delay(self, attempt, requested, delay):
+        if attempt > self.max_retries or (requested is not None and requested > self.backoff_max):
+            raise LLMRateLimited('GROQ API error: HTTP 429', requested if requested is not None else delay)
+        LLM_RETRIES.inc()
+        return delay
+
+    def chat(self, messages, max_tokens=256, model=GROQ_MODEL):
+        """
+        Runs a chat completion and returns the text of the first choice.
+        Latency, outcome and token usage are recorded in content.metrics.
+        """
+        with llm_call(model) as call:
+            result = self.post({'model': model, 'messages': messages, 'max_tokens': max_tokens})
+            return self.content(result, call)
+
+    def stream(self, messages, max_tokens=256, model=GROQ_MODEL):
+        """
+        Starts a streamed chat completion and returns an iterator over its
+        text as it arrives. Failures before the first byte (after the usual
+        retries) raise here, as with `chat`; later ones, including a stream
+        that ends without its closing `[DONE]`, raise LLMError from the
+        iterator. Closing the iterator early closes the connection,
+        which stops the completion upstream.
+        """
+        started = time.perf_counter()
+        try:
+            response = self.post(
+                {'model': model, 'messages': messages, 'max_tokens': max_tokens, 'stream': True}, stream=True,
+            )
+        except Exception as e:
+            record_llm_call(model, type(e).__name__, time.perf_counter() - started)
+            raise
+        return self._deltas(response, model, started)
+
+    def _deltas(self, response, model, started):
+        outcome, usage = 'ok', None
+        try:
+            # chunk_size=None hands over each chunk as it arrives instead of filling a buffer first.
+            for line in response.iter_lines(chunk_size=None):
+                parsed = parse_stream_line(line)
+                if parsed is None:
+                    break
+                text, usage = parsed[0], parsed[1] or usage
+                if text:
+                    yield text
+            else:  # the connection closed before [DONE]: the answer may be cut short
+                raise LLMError('GROQ API stream ended before it was complete.')
+        except requests.RequestException as e:
+            outcome = 'LLMError'
+            raise LLMError(f'GROQ API stream failed: {e}') from e
+        except BaseException as e:
+            outcome = _stream_outcome(e)
+            raise
+        finally:
+            response.close()
+            record_llm_call(model, outcome, time.perf_counter() - started, usage)
+            record_llm_usage(usage)
+
+    @staticmethod
+    def content(result, call):
+        try:
+            call.usage = result.get('usage')
+            record_llm_usage(call.usage)
+            return result['choices'][0]['message']['content']
+        except (AttributeError, KeyError, IndexError, TypeError) as e:
+            raise LLMError('Unexpected GROQ API response.') from e
+
+
+class AsyncGroqClient(GroqClient):
+    """
+    asyncio flavour of GroqClient built on a pooled `httpx.AsyncClient`, for
+    ASGI views: a request waiting on GROQ does not hold a thread. Retry,
+    backoff and circuit-breaker behaviour is the same as the sync client.
+    """
+    def __init__(self, api_url, pool_size=10, max_retries=2, backoff_base=0.5, backoff_max=8.0,
+                 connect_timeout=3.05, read_timeout=30, breaker=None, api_key=None):
+        self.api_url = api_url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker(failure_threshold=5, reset_timeout=30)
+        self._api_key = api_key
+        self.session = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def post(self, payload, stream=False):
+        if not self.api_key:
+            raise LLMError('GROQ API key not set.')
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json',
+        }
+        attempt = 0
+        while True:
+            await _acheck_cooldown()
+            if not self.breaker.allow():
+                raise LLMUnavailable('GROQ API circuit is open.')
+            response, settled = None, False
+            try:
+                try:
+                    request = self.session.build_request('POST', self.api_url, headers=headers, json=payload)
+                    response = await self.session.send(request, stream=stream)
+                except httpx.HTTPError as e:
+                    error = LLMError(f'GROQ API request failed: {e}')
+                else:
+                    if response.status_code == 200:
+                        self.breaker.record_success()
+                        settled = True
+                        if stream:
+                            return response
+                        try:
+                            return response.json()
+                        except ValueError as e:
+                            raise LLMError('GROQ API returned invalid JSON.') from e
+                    if stream:
+                        await response.aclose()
+                    if response.status_code == 429 or response.status_code not in RETRY_STATUSES:
+                        self.breaker.record_refused()
+                        settled = True
+                    if response.status_code == 429:
+                        attempt += 1
+                        await asyncio.sleep(await self.rate_limited(attempt, response))
+                        continue
+                    if response.status_code not in RETRY_STATUSES:
+                        raise LLMError(f'GROQ API error: HTTP {response.status_code}')
+                    error = LLMError(f'GROQ API error: HTTP {response.status_code}')
+                self.breaker.record_failure()
+                settled = True
+            finally:
+                if not settled:
+                    # Cancelled (e.g. by the latency budget) or failed unexpectedly mid-attempt.
+                    self.breaker.record_failure()
+            attempt += 1
+            if attempt > self.max_retries:
+                raise error
+            LLM_RETRIES.inc()
+            await asyncio.sleep(self.backoff(attempt, response))
+
+    async def rate_limited(self, attempt, response):
+        # GroqClient.rate_limited, with the shared cooldown written through the async cache API.
+        requested, delay = _retry_after(response), self.backoff(attempt, response)
+        await astart_cooldown(requested if requested is not None else delay)
+        return self._retry_delay(attempt, requested, delay)
+
+    async def chat(self, messages, max_tokens=256, model=GROQ_MODEL):
+        with llm_call(model) as call:
+            result = await self.post({'model': model, 'messages': messages, 'max_tokens': max_tokens})
+            return self.content(result, call)
+
+    async def stream(self, messages, max_tokens=256, model=GROQ_MODEL):
+        """
+        Same as GroqClient.stream, returning an async iterator. Cancelling
+        the task reading it (e.g. when the client disconnects) closes the
+        upstream connection.
+        """
+        started = time.perf_counter()
+        try:
+            response = await self.post(
+                {'model': model, 'messages': messages, 'max_tokens': max_tokens, 'stream': True}, stream=True,
+            )
+        except Exception as e:
+            record_llm_call(model, type(e).__name__, time.perf_counter() - started)
+            raise
+        return self._deltas(response, model, started)
+
+    async def _deltas(self, response, model, started):
+        outcome, usage = 'ok', None
+        try:
+            async for line in response.aiter_lines():
+                parsed = parse_stream_line(line)
+                if parsed is None:
+                    break
+                text, usage = parsed[0], parsed[1] or usage
+                if text:
+                    yield text
+            else:
+                raise LLMError('GROQ API stream ended before it was complete.')
+        except httpx.HTTPError as e:
+            outcome = 'LLMError'
+            raise LLMError(f'GROQ API stream failed: {e}') from e
+        except BaseException as e:
+            outcome = _stream_outcome(e)
+            raise
+        finally:
+            await response.aclose()
+            record_llm_call(model, outcome, time.perf_counter() - started, usage)
+            record_llm_usage(usage)
+
+
+def _client_options():
+    return {
+        'api_url': settings.GROQ_API_URL,
+        'pool_size': settings.GROQ_POOL_SIZE,
+        'max_retries': settings.GROQ_MAX_RETRIES,
+        'backoff_base': settings.GROQ_BACKOFF_BASE,
+        'backoff_max': settings.GROQ_BACKOFF_MAX,
+        'connect_timeout': settings.GROQ_CONNECT_TIMEOUT,
+        'read_timeout': settings.GROQ_READ_TIMEOUT,
+        'breaker': CircuitBreaker(
+            failure_threshold=settings.GROQ_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.GROQ_CIRCUIT_RESET_TIMEOUT,
+        ),
+    }
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """
+    Returns the shared per-process GROQ client, configured from settings. A
+    forked worker gets its own client rather than the parent's sockets.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = GroqClient(**_client_options())
+            _client_pid = os.getpid()
+        return _client
+
+
+def get_async_client():
+    """
+    Returns the shared async GROQ client for the running event loop (httpx
+    connections cannot be shared between loops).
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        options = dict(_client_options(), pool_size=settings.GROQ_ASYNC_POOL_SIZE)
+        client = _async_clients[loop] = AsyncGroqClient(**options)
+    return client
+
+
+@receiver(setting_changed)
+def reset_client(setting=None, **kwargs):
+    """
+    Drops the shared client when GROQ settings change (e.g. in tests).
+    """
+    global _client
+    if setting is None or setting.startswith('GROQ_'):
+        _client = None
+        _async_clients.clear()
@@ -0,0 +1,200 @@
+import re
+import numpy as np
+from content.services.chunking import SENTENCE_END
+
+# In-process analyzer used when GROQ is not wanted or not reachable: lexicon
+# sentiment, TF-IDF keyword topics over RAKE-style phrases and an extractive
+# summary. No network and no model files; the same batch always gives the
+# same results. Results carry 'engine': 'local' so they can be upgraded later.
+
+ENGINE = 'local'
+
+WORD = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+CLAUSE_BREAK = re.compile(r'[,;:()\[\]"“”]|\s[-–—]+\s')
+NEGATED = 'not_'
+NEGATION_SCOPE = 3  # content words after a negation whose polarity is flipped
+NEGATIONS = frozenset('not no never none nobody nothing neither nor without cannot'.split())
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below between
+both but by can could did do does doing down during each either else even ever every few first for from further get gets
+got had has have having he her here hers herself him himself his how however i if in into is it its itself just
+last least less let like likely lot made make makes many may me might more most much must my myself near need needs new next
+now of off often old on once one only or other others otherwise our ours ourselves out over overall own per perhaps quite
+rather really said same say says see seem seems several shall she should since so some something still such than
+that the their theirs them themselves then there these they thing things this those though through thus to too twice
+under until up upon us use used uses using very via was way we well were what whatever when where whether which
+while who whom whose why will with within would yet you your yours yourself yourselves
+""".split())
+
+POSITIVE = frozenset("""
+good great excellent amazing awesome fantastic wonderful love loved loves lovely enjoy enjoyed enjoyable happy glad
+pleased delighted best better perfect nice beautiful brilliant impressive outstanding superb helpful useful easy
+effective efficient reliable fast success successful succeed win wins won benefit benefits improve improved
+improves improving improvement improvements positive recommend recommended fun exciting excited favorite favourite clean clear smooth
+powerful innovative inspiring elegant solid satisfied satisfying thank thanks grateful incredible remarkable valuable
+strong safe secure stable affordable friendly comfortable progress gain gains growth profit profitable
+""".split())
+
+NEGATIVE = frozenset("""
+bad terrible awful horrible poor poorly worst worse hate hated hates dislike disliked sad angry annoyed annoying
+disappointed disappointing disappointment fail failed fails failure broken bug bugs buggy crash crashed crashes error
+errors problem problems slow difficult confusing confused useless ugly boring expensive wrong weak risk risky
+dangerous unsafe unstable unreliable loss losses lose lost decline declined negative complaint complain complained
+frustrating frustrated painful pain worry worried concern concerns fear scary toxic delay delayed mess messy waste
+wasted hurt damage damaged
+""".split())
+
+SENTIMENT_THRESHOLD = 0.2  # share of net polar words needed to leave 'neutral'
+PHRASE_BOOST = 1.5  # two-word phrases outrank their single words at equal frequency
+MAX_TOPICS = 5
+SUMMARY_SENTENCES = 2
+SUMMARY_MAX_CHARS = 600
+BATCH_SIZE = 256  # texts sharing one vocabulary (and one IDF)
+
+
+def _is_negation(word):
+    return word in NEGATIONS or word.endswith("n't")
+
+
+def tokenize(text):
+    """
+    Returns (terms, sentences) for one text. `terms` lists every counted
+    term: content words, adjacent content-word pairs (RAKE-style phrases,
+    which never span stopwords or punctuation) and lexicon words, the latter
+    prefixed with "not_" within a negation's scope. `sentences` pairs each
+    sentence with its content words.
+    """
+    terms, sentences = [], []
+    for sentence in SENTENCE_END.split(text.strip()):
+        sentence_words = []
+        for clause in CLAUSE_BREAK.split(sentence.lower()):
+            negation, previous = 0, None
+            for word in WORD.findall(clause):
+                word = word.replace('’', "'")
+                if _is_negation(word):
+                    negation, previous = NEGATION_SCOPE, None
+                    continue
+                if word in STOPWORDS or len(word) < 3:
+                    previous = None  # stopwords end a phrase but not a negation's scope
+                    continue
+                if word in POSITIVE or word in NEGATIVE:
+                    terms.append(NEGATED + word if negation else word)
+                    previous = None
+                else:
+                    terms.append(word)
+                    sentence_words.append(word)
+                    if previous:
+                        terms.append(f'{previous} {word}')
+                    previous = word
+                negation = max(negation - 1, 0)
+        if sentence.strip():
+            sentences.append((sentence.strip(), sentence_words))
+    return terms, sentences
+
+
+def _polarity(term):
+    negated = term.startswith(NEGATED)
+    word = term[len(NEGATED):] if negated else term
+    value = 1.0 if word in POSITIVE else -1.0 if word in NEGATIVE else 0.0
+    return -value if negated else value
+
+
+def _topic_weight(term):
+    if term.startswith(NEGATED) or term in POSITIVE or term in NEGATIVE:
+        return 0.0
+    return PHRASE_BOOST if ' ' in term else 1.0
+
+
+def analyze_local(texts):
+    """
+    Analyzes a list of texts and returns one analysis dict (summary,
+    sentiment, topics, recommendations and engine) per text, in order; empty
+    texts give an empty dict. Texts are processed BATCH_SIZE at a time, with
+    topic IDF computed across each batch, so results for a text can differ
+    slightly depending on the texts analyzed with it.
+    """
+    results = []
+    for start in range(0, len(texts), BATCH_SIZE):
+        results.extend(_analyze_batch(texts[start:start + BATCH_SIZE]))
+    return results
+
+
+def _analyze_batch(texts):
+    docs = [tokenize(text or '') for text in texts]
+    vocab = {}
+    doc_ids, term_ids = [], []
+    sent_docs, sent_ids, sent_terms, sentences = [], [], [], []
+    for doc, (terms, doc_sentences) in enumerate(docs):
+        for term in terms:
+            doc_ids.append(doc)
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+        for text, words in doc_sentences:
+            sent_docs.append(doc)
+            for word in words:
+                sent_ids.append(len(sentences))
+                sent_terms.append(vocab[word])
+            sentences.append(text)
+
+    n, size = len(docs), max(len(vocab), 1)
+    terms = list(vocab)
+    polarity = np.array([_polarity(term) for term in terms], dtype=np.float64)
+    boost = np.array([_topic_weight(term) for term in terms], dtype=np.float64)
+
+    # Sparse document-term counts: one entry per (document, term) pair, sorted by document then term.
+    keys, counts = np.unique(np.array(doc_ids, dtype=np.int64) * size + np.array(term_ids, dtype=np.int64), return_counts=True)
+    key_docs, key_terms = np.divmod(keys, size)
+
+    # Sentiment: net share of polar words.
+    net = np.bincount(key_docs, weights=counts * polarity[key_terms], minlength=n)
+    polar = np.bincount(key_docs, weights=counts * np.abs(polarity[key_terms]), minlength=n)
+    share = np.divide(net, polar, out=np.zeros(n), where=polar > 0)
+    labels = np.where(share >= SENTIMENT_THRESHOLD, 'positive', np.where(share <= -SENTIMENT_THRESHOLD, 'negative', 'neutral'))
+
+    # Topics: sublinear TF-IDF, best terms first within each document (ties keep first occurrence).
+    df = np.bincount(key_terms, minlength=size)
+    idf = np.log((1 + n) / (1 + df)) + 1
+    weights = (1 + np.log(counts)) * idf[key_terms] * boost[key_terms]
+    order = np.lexsort((-weights, key_docs))
+    starts = np.searchsorted(key_docs[order], np.arange(n + 1))
+
+    # Summary: sentences scored by the mean weight of their words, relative to the document's top term.
+    top = np.zeros(n)
+    np.maximum.at(top, key_docs, weights)
+    relative = weights / np.maximum(top[key_docs], 1e-9)
+    sent_docs = np.array(sent_docs, dtype=np.int64)
+    sent_ids = np.array(sent_ids, dtype=np.int64)
+    pair_keys = sent_docs[sent_ids] * size + np.array(sent_terms, dtype=np.int64) if len(sent_ids) else sent_ids
+    scores = np.bincount(sent_ids, weights=relative[np.searchsorted(keys, pair_keys)], minlength=len(sentences))
+    lengths = np.bincount(sent_ids, minlength=len(sentences))
+    scores = scores / np.sqrt(np.maximum(lengths, 1))
+    sent_order = np.lexsort((np.arange(len(sentences)), -scores, sent_docs))
+    sent_starts = np.searchsorted(sent_docs[sent_order], np.arange(n + 1))
+
+    results = []
+    for doc in range(n):
+        if not docs[doc][1]:
+            results.append({})
+            continue
+        topics, covered = [], set()
+        for index in order[starts[doc]:starts[doc + 1]]:
+            if weights[index] <= 0 or len(topics) >= MAX_TOPICS:
+                break
+            term = terms[key_terms[index]]
+            words = set(term.split())
+            if words & covered:
+                continue
+            topics.append(term)
+            covered |= words
+        chosen = sorted(sent_order[sent_starts[doc]:sent_starts[doc + 1]][:SUMMARY_SENTENCES])
+        summary = ' '.join(sentences[index] for index in chosen)
+        if len(summary) > SUMMARY_MAX_CHARS:
+            summary = summary[:SUMMARY_MAX_CHARS].rsplit(' ', 1)[0] + '…'
+        results.append({
+            'summary': summary,
+            'sentiment': str(labels[doc]),
+            'topics': topics,
+            'recommendations': f'Explore more content about {", ".join(topics[:3])}.' if topics else '',
+            'engine': ENGINE,
+        })
+    return results
@@ -0,0 +1,373 @@
+import fcntl, json, os, threading, zlib
+from collections import namedtuple
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from content.services.local_analysis import tokenize
+
+# Related-content index: one hashed TF-IDF vector of the words of each content
+# row (title and body), quantized to int8 with a per-row scale and kept in memory-mapped .npy
+# files, so every process serves queries from the same pages of the OS cache.
+#
+#   ids.npy      int64 (capacity,)               content id per slot, 0 = free
+#   scales.npy   float32 (capacity,)             dequantization factor per slot
+#   vectors.npy  int8 (capacity, dimensions)     unit-length vectors / scale
+#   slots.npy    int32 (largest id + 1 or more,) slot + 1 per content id, 0 = not indexed
+#   used.npy     int64 (1,)                      slots handed out so far; later ones are free
+#   df.npy       uint32 (DF_BUCKETS,)            hashed document frequencies
+#   meta.json    {"dimensions": ..., "documents": ...}
+#
+# Rows are written in place as content changes, finding their slot through
+# slots.npy, so a save costs the same whatever the size of the index. Slots
+# of removed rows stay empty until the files grow, which compacts them.
+# Document frequencies are only recomputed by `rebuild_similarity_index`, so
+# IDF weights reflect the corpus as of the last rebuild.
+
+DF_BUCKETS = 2 ** 20  # wide enough that distinct terms rarely share a frequency
+SCAN_ROWS = 2048  # rows converted to float32 per step of a query
+TITLE_WEIGHT = 2  # title terms count this many times
+
+
+def content_text(title, body):
+    return '\n'.join([title or ''] * TITLE_WEIGHT + [body or ''])
+
+
+def term_hashes(text):
+    # Content and sentiment words as stable (cross-process) 32-bit hashes. Two-word phrases are
+    # left out: most occur in one text only and would add noise to the few hashed dimensions.
+    terms = (term for term in tokenize(text)[0] if ' ' not in term)
+    return np.array([zlib.crc32(term.encode('utf-8')) for term in terms], dtype=np.uint32)
+
+
+def embed(texts, df, documents, dimensions):
+    """
+    Returns (vectors, scales) for the given texts: `dense_vectors`
+    quantized to int8, with one dequantization factor per text.
+    """
+    return quantize(dense_vectors(texts, df, documents, dimensions))
+
+
+def dense_vectors(texts, df, documents, dimensions):
+    """
+    Sublinear TF-IDF weights of each text's terms, folded into `dimensions`
+    signed buckets and normalized to unit length (float32, one row per
+    text). Texts without terms get a zero row.
+    """
+    hashes = [term_hashes(text) for text in texts]
+    rows = np.repeat(np.arange(len(texts), dtype=np.uint64), [len(h) for h in hashes])
+    keys, counts = np.unique((rows << np.uint64(32)) | np.concatenate(hashes or [[]]).astype(np.uint64), return_counts=True)
+    key_rows = (keys >> np.uint64(32)).astype(np.int64)
+    key_hashes = (keys & np.uint64(0xFFFFFFFF)).astype(np.int64)
+
+    idf = np.log((1 + documents) / (1 + df[key_hashes % DF_BUCKETS].astype(np.float64))) + 1
+    signs = np.where(key_hashes >> 31, 1.0, -1.0)
+    dense = np.zeros((len(texts), dimensions), dtype=np.float32)
+    np.add.at(dense, (key_rows, key_hashes % dimensions), (1 + np.log(counts)) * idf * signs)
+    norms = np.linalg.norm(dense, axis=1, keepdims=True)
+    return np.divide(dense, norms, out=np.zeros_like(dense), where=norms > 0)
+
+
+def quantize(dense):
+    scales = np.abs(dense).max(axis=1) / 127
+    vectors = np.round(np.divide(dense, scales[:, None], out=np.zeros_like(dense), where=scales[:, None] > 0))
+    return vectors.astype(np.int8), scales.astype(np.float32)
+
+
+def document_frequencies(texts):
+    """
+    Returns (df, documents): per-bucket counts of the texts containing each
+    term, and the number of texts.
+    """
+    df = np.zeros(DF_BUCKETS, dtype=np.uint32)
+    documents = 0
+    for text in texts:
+        np.add.at(df, np.unique(term_hashes(text).astype(np.int64) % DF_BUCKETS), 1)
+        documents += 1
+    return df, documents
+
+
+class Mapped(namedtuple('Mapped', 'documents df ids scales vectors slots used')):
+    def flush(self):
+        for array in (self.vectors, self.scales, self.ids, self.slots, self.used):
+            array.flush()
+
+    def slot_of(self, pks):
+        # Slot of each id, -1 for ids not in the index.
+        pks = np.asarray(pks, dtype=np.int64)
+        known = (pks > 0) & (pks < len(self.slots))
+        slots = np.full(len(pks), -1, dtype=np.int64)
+        slots[known] = self.slots[pks[known]].astype(np.int64) - 1
+        return slots
+
+
+class SimilarityIndex:
+    """
+    Memory-mapped nearest-neighbour index over content rows. Safe to share
+    between threads and processes: writers hold an exclusive file lock, and
+    readers pick up files replaced by a resize or rebuild on their next call.
+    """
+    def __init__(self, path, dimensions):
+        self.path = path
+        self.dimensions = dimensions
+        self._lock = threading.Lock()
+        self._inode = None
+        self._mapped = None
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _refresh(self, locked=False):
+        # Returns the mapped files, remapping them if they were replaced; creates an empty index
+        # (or adds the id -> slot map to an index written before it existed).
+        if not os.path.exists(self._file('slots.npy')):
+            if not locked:
+                with self._write_lock() as lock:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                    return self._refresh(locked=True)
+            if os.path.exists(self._file('ids.npy')):
+                self._resize(self._load(), 0, 0)
+            else:
+                self._create(1024, np.zeros(DF_BUCKETS, dtype=np.uint32), 0)
+        inode = os.stat(self._file('ids.npy')).st_ino
+        if inode == self._inode:
+            return self._mapped
+        # One assignment, so concurrent readers never mix arrays from two generations.
+        self._mapped = self._load()
+        self._inode = inode
+        return self._mapped
+
+    def _load(self):
+        with open(self._file('meta.json')) as f:
+            meta = json.load(f)
+        if meta['dimensions'] != self.dimensions:
+            raise ValueError(
+                f'Similarity index at {self.path} has {meta["dimensions"]} dimensions, not {self.dimensions}; '
+                'run rebuild_similarity_index.'
+            )
+        sidecar = os.path.exists(self._file('slots.npy'))
+        return Mapped(
+            meta['documents'], np.load(self._file('df.npy'), mmap_mode='r'),
+            np.load(self._file('ids.npy'), mmap_mode='r+'), np.load(self._file('scales.npy'), mmap_mode='r+'),
+            np.load(self._file('vectors.npy'), mmap_mode='r+'),
+            np.load(self._file('slots.npy'), mmap_mode='r+') if sidecar else None,
+            np.load(self._file('used.npy'), mmap_mode='r+') if sidecar else None,
+        )
+
+    def _create(self, capacity, df, documents, fill=None, suffix='.tmp', swap=True, id_capacity=1024):
+        """
+        Writes a complete set of files next to the live ones, calling
+        fill(ids, scales, vectors) to populate the new arrays from the
+        first slot on, then swaps them in unless `swap` is false. Callers
+        hold the lock when swapping.
+        """
+        shapes = {
+            'scales.npy': (np.float32, (capacity,)),
+            'vectors.npy': (np.int8, (capacity, self.dimensions)),
+            'ids.npy': (np.int64, (capacity,)),
+        }
+        arrays = {
+            name: np.lib.format.open_memmap(self._file(name + suffix), mode='w+', dtype=dtype, shape=shape)
+            for name, (dtype, shape) in shapes.items()
+        }
+        if fill:
+            fill(arrays['ids.npy'], arrays['scales.npy'], arrays['vectors.npy'])
+        ids = arrays['ids.npy']
+        occupied = np.flatnonzero(ids)
+        arrays['slots.npy'] = slots = np.lib.format.open_memmap(
+            self._file('slots.npy' + suffix), mode='w+', dtype=np.int32,
+            shape=(max(id_capacity, int(ids.max(initial=0)) + 1),),
+        )
+        slots[ids[occupied]] = occupied + 1
+        arrays['used.npy'] = used = np.lib.format.open_memmap(
+            self._file('used.npy' + suffix), mode='w+', dtype=np.int64, shape=(1,),
+        )
+        used[0] = occupied[-1] + 1 if len(occupied) else 0
+        with open(self._file('df.npy' + suffix), 'wb') as f:
+            np.save(f, df)
+        with open(self._file('meta.json' + suffix), 'w') as f:
+            json.dump({'dimensions': self.dimensions, 'documents': documents}, f)
+        for array in arrays.values():
+            array.flush()
+        if swap:
+            self._swap(suffix)
+
+    def _swap(self, suffix):
+        # ids.npy goes last: readers remap when it changes.
+        for name in ['meta.json', 'df.npy', 'scales.npy', 'vectors.npy', 'slots.npy', 'used.npy', 'ids.npy']:
+            os.replace(self._file(name + suffix), self._file(name))
+
+    def _resize(self, mapped, rows, largest_id):
+        # Rewrites the files with the occupied slots packed at the front, room for `rows` more
+        # rows and slots.npy covering `largest_id`; sizes at least double, so this stays rare.
+        occupied = np.flatnonzero(mapped.ids)
+        capacity = max(len(mapped.ids), 2 * (len(occupied) + rows))
+        id_capacity = max(len(mapped.slots) if mapped.slots is not None else 0, 2 * largest_id + 1)
+
+        def copy(ids, scales, vectors):
+            count = len(occupied)
+            ids[:count], scales[:count], vectors[:count] = mapped.ids[occupied], mapped.scales[occupied], mapped.vectors[occupied]
+
+        self._create(capacity, np.array(mapped.df), mapped.documents, copy, id_capacity=id_capacity)
+
+    def _write_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        return open(self._file('lock'), 'w')
+
+    def upsert(self, items):
+        """
+        Adds or replaces the vectors of `items`, a list of (content id, text);
+        for repeated ids the last text wins.
+        """
+        items = list(dict(items).items())
+        if not items:
+            return
+        pks = np.array([pk for pk, _ in items], dtype=np.int64)
+        texts = [text for _, text in items]
+        # Embedding only reads the document frequencies, so it runs before taking the lock.
+        before = self._refresh()
+        vectors, scales = embed(texts, before.df, before.documents, self.dimensions)
+        with self._lock, self._write_lock() as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            mapped, slots = self._slots(self._refresh(locked=True), pks)
+            if mapped.df is not before.df:  # remapped meanwhile (e.g. rebuilt with new IDF weights)
+                vectors, scales = embed(texts, mapped.df, mapped.documents, self.dimensions)
+            mapped.vectors[slots] = vectors
+            mapped.scales[slots] = scales
+            mapped.ids[slots] = pks
+            mapped.slots[pks] = slots + 1  # last, so readers never find a slot before its vector
+            mapped.flush()
+
+    def _slots(self, mapped, pks):
+        # Current slot of each (distinct) id, or the next unused one; grows the files when they are full.
+        slots = mapped.slot_of(pks)
+        missing = np.flatnonzero(slots < 0)
+        largest = int(pks.max())
+        if int(mapped.used[0]) + len(missing) > len(mapped.ids) or largest >= len(mapped.slots):
+            self._resize(mapped, len(missing), largest)
+            return self._slots(self._refresh(locked=True), pks)
+        slots[missing] = int(mapped.used[0]) + np.arange(len(missing))
+        mapped.used[0] += len(missing)
+        return mapped, slots
+
+    def remove(self, pks):
+        pks = np.unique(np.asarray(pks, dtype=np.int64))
+        with self._lock, self._write_lock() as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            mapped = self._refresh(locked=True)
+            slots = mapped.slot_of(pks)
+            pks, slots = pks[slots >= 0], slots[slots >= 0]
+            mapped.slots[pks] = 0
+            mapped.ids[slots] = 0
+            mapped.scales[slots] = 0
+            mapped.vectors[slots] = 0
+            mapped.flush()
+
+    def rebuild(self, rows, batch_size=1000):
+        """
+        Replaces the whole index. `rows` is a callable returning an iterable
+        of (content id, text); it is called twice, once to count document
+        frequencies and once to embed. Returns the number of rows indexed.
+        """
+        df, documents = document_frequencies(text for _, text in rows())
+
+        def fill(ids, scales, vectors):
+            position, batch = 0, []
+            for row in rows():
+                batch.append(row)
+                if len(batch) == batch_size:
+                    position = self._fill_batch(batch, df, documents, position, ids, scales, vectors)
+                    batch = []
+            self._fill_batch(batch, df, documents, position, ids, scales, vectors)
+
+        os.makedirs(self.path, exist_ok=True)
+        self._create(max(1024, documents + documents // 4), df, documents, fill, suffix='.rebuild', swap=False)
+        with self._lock, self._write_lock() as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Rows saved meanwhile went to the old files; they are picked up on their next save.
+            self._swap('.rebuild')
+        return documents
+
+    def _fill_batch(self, batch, df, documents, position, ids, scales, vectors):
+        if not batch:
+            return position
+        end = position + len(batch)
+        vectors[position:end], scales[position:end] = embed([text for _, text in batch], df, documents, self.dimensions)
+        ids[position:end] = [pk for pk, _ in batch]
+        return end
+
+    def vector(self, pk):
+        """
+        The stored (dequantized) vector of a content row, or None.
+        """
+        mapped = self._refresh()
+        slot = mapped.slot_of([pk])[0]
+        if slot < 0:
+            return None
+        return mapped.vectors[slot].astype(np.float32) * mapped.scales[slot]
+
+    def embed_text(self, text):
+        mapped = self._refresh()
+        vectors, scales = embed([text], mapped.df, mapped.documents, self.dimensions)
+        return vectors[0].astype(np.float32) * scales[0]
+
+    def search(self, vector, k, exclude=()):
+        """
+        Returns up to `k` (content id, cosine similarity) pairs closest to
+        `vector`, best first, skipping `exclude` and unrelated rows.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        mapped = self._refresh()
+        ids = np.array(mapped.ids[:int(mapped.used[0])])  # slots never handed out are skipped
+        scores = np.empty(len(ids), dtype=np.float32)
+        buffer = np.empty((SCAN_ROWS, self.dimensions), dtype=np.float32)
+        for start in range(0, len(ids), SCAN_ROWS):
+            block = buffer[:min(SCAN_ROWS, len(ids) - start)]
+            np.copyto(block, mapped.vectors[start:start + len(block)])
+            np.dot(block, vector, out=scores[start:start + len(block)])
+        scores *= mapped.scales[:len(ids)]
+        scores[(ids == 0) | np.isin(ids, np.asarray(exclude, dtype=np.int64))] = 0
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k] if k else []
+        top = sorted(top, key=lambda i: (-scores[i], ids[i]))
+        return [(int(ids[i]), round(float(scores[i]), 4)) for i in top if scores[i] > 0]
+
+    def related(self, pk, k, text=None):
+        """
+        Content rows most similar to row `pk`, using its stored vector or,
+        for rows not indexed yet, one computed from `text`.
+        """
+        vector = self.vector(pk)
+        if vector is None:
+            if not text:
+                return []
+            vector = self.embed_text(text)
+        return self.search(vector, k, exclude=[pk])
+
+
+def index_on_commit(contents):
+    """
+    Updates the vectors of the given content rows once the current
+    transaction commits. Index errors are logged, never raised into the
+    request: the next rebuild repairs a missed row.
+    """
+    items = [(content.pk, content_text(content.title, content.body)) for content in contents]
+    if items:
+        transaction.on_commit(lambda: get_similarity_index().upsert(items), robust=True)
+
+
+def unindex_on_commit(pks):
+    pks = list(pks)
+    transaction.on_commit(lambda: get_similarity_index().remove(pks), robust=True)
+
+
+_similarity_index = None
+
+
+def get_similarity_index():
+    """
+    Returns the per-process similarity index, configured from settings.
+    """
+    global _similarity_index
+    if _similarity_index is None or _similarity_index.path != settings.SIMILARITY_INDEX_DIR:
+        _similarity_index = SimilarityIndex(settings.SIMILARITY_INDEX_DIR, settings.SIMILARITY_DIMENSIONS)
+    return _similarity_index
@@ -0,0 +1,143 @@
+import asyncio, threading, time, uuid
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from content.metrics import ANALYSIS_COALESCED
+
+
+# Request coalescing. When many requests need the same uncached analysis at
+# once (a popular text, a burst of identical bodies), only one of them calls
+# GROQ: callers in the same process wait on its call, callers in other
+# processes wait on a lease in the default cache until the result shows up
+# in the analysis cache. Use a shared cache backend so leases span workers.
+
+LEASE_KEY = 'singleflight:{}'
+POLL_INTERVAL = (0.05, 0.5)  # seconds between checks while another process holds the lease, doubling
+
+
+class SingleFlight:
+    """
+    Runs one call per key at a time in this process; threads that ask for
+    a key already in flight wait for that call and get its result, or its
+    exception.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            ANALYSIS_COALESCED.inc('process')
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines on an event loop. The call runs as a task
+    that waiters share; it is cancelled only once every waiter has given up
+    (e.g. all of them ran out of latency budget).
+    """
+    def __init__(self):
+        self._calls = {}  # (loop, key) -> [task, waiters]
+
+    async def do(self, key, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = self._calls.get((loop, key))
+        if call is None:
+            task = loop.create_task(fn(*args, **kwargs))
+            call = self._calls[loop, key] = [task, 0]
+            task.add_done_callback(lambda _: self._calls.pop((loop, key), None))
+        else:
+            ANALYSIS_COALESCED.inc('process')
+        task = call[0]
+        call[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            call[1] -= 1
+            if not call[1] and not task.done():
+                task.cancel()
+
+
+def _lease_settings(key):
+    return LEASE_KEY.format(key), uuid.uuid4().hex, settings.ANALYSIS_SINGLEFLIGHT_LEASE_TTL
+
+
+def _release(lease_key, token):
+    if cache.get(lease_key) == token:
+        cache.delete(lease_key)
+
+
+@contextmanager
+def shared_lease(key, check):
+    """
+    Takes the cross-process lease on `key` and yields `check()`, which
+    should look up the result the lease protects. If another process holds
+    the lease, waits (up to ANALYSIS_SINGLEFLIGHT_WAIT seconds) until
+    `check()` finds its result or the lease is free. Yields None when the
+    caller should compute the result itself (with the lease held, unless
+    the wait ran out).
+    """
+    if not settings.ANALYSIS_SINGLEFLIGHT_WAIT:
+        yield None
+        return
+    lease_key, token, ttl = _lease_settings(key)
+    deadline, delay, waited = time.monotonic() + settings.ANALYSIS_SINGLEFLIGHT_WAIT, POLL_INTERVAL[0], False
+    while True:
+        held = cache.add(lease_key, token, ttl)
+        value = check()  # also after taking the lease: the previous holder may have just finished
+        if value is not None or held or time.monotonic() >= deadline:
+            break
+        time.sleep(delay)
+        delay, waited = min(delay * 2, POLL_INTERVAL[1]), True
+    if value is not None and waited:
+        ANALYSIS_COALESCED.inc('shared')
+    try:
+        yield value
+    finally:
+        if held:
+            _release(lease_key, token)
+
+
+@asynccontextmanager
+async def shared_lease_async(key, check):
+    """
+    Same as `shared_lease`, with an async `check` and without blocking the
+    event loop while waiting.
+    """
+    if not settings.ANALYSIS_SINGLEFLIGHT_WAIT:
+        yield None
+        return
+    lease_key, token, ttl = _lease_settings(key)
+    deadline, delay, waited = time.monotonic() + settings.ANALYSIS_SINGLEFLIGHT_WAIT, POLL_INTERVAL[0], False
+    while True:
+        held = await cache.aadd(lease_key, token, ttl)
+        value = await check()
+        if value is not None or held or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(delay)
+        delay, waited = min(delay * 2, POLL_INTERVAL[1]), True
+    if value is not None and waited:
+        ANALYSIS_COALESCED.inc('shared')
+    try:
+        yield value
+    finally:
+        if held and await cache.aget(lease_key) == token:
+            await cache.adelete(lease_key)
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from content.caching import invalidate
+from content.models import Category, Content
+from content.services.similarity import index_on_commit, unindex_on_commit
+
+
+@receiver([post_save, post_delete], sender=Content)
+def content_changed(sender, **kwargs):
+    invalidate('content')
+
+
+@receiver(post_save, sender=Content)
+def index_content(sender, instance, update_fields=None, **kwargs):
+    # Only the title and body feed the related-content index.
+    if update_fields is None or {'title', 'body'} & set(update_fields):
+        index_on_commit([instance])
+
+
+@receiver(post_delete, sender=Content)
+def unindex_content(sender, instance, **kwargs):
+    unindex_on_commit([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, **kwargs):
+    # Content responses embed their category.
+    invalidate('category', 'content')
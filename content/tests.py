@@ -1,9 +1,52 @@
-from django.test import TestCase
+import asyncio, json, os, re, shutil, tempfile, threading, time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from asgiref.sync import sync_to_async
+from unittest import mock
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
-from content.models import Category, Content
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import UserRateThrottle
+from rest_framework_simplejwt.tokens import RefreshToken
+from content import metrics
+from content.caching import check_response_cache_backend
+from content.models import AnalysisCacheEntry, AnalysisJob, AnalyticsCounter, AnalyticsCounterDelta, Category, Content
+from content.services.analysis import ANALYSIS_USER_PROMPT, AnalysisParseError, analyze_text, analyze_text_async, parse_analysis
+from content.services.chunking import estimate_tokens, split_text
+from content.services.counters import get_analytics, rollup_counters
+from content.services.cache import AnalysisCache, LRUCache, fingerprint, get_analysis_cache, make_key
+from content.services.llm import GROQ_MODEL, AsyncGroqClient, CircuitBreaker, GroqClient, LLMError, LLMRateLimited, LLMUnavailable, cooldown_remaining
+from content.services.batch import RateLimiter
+from content.services.local_analysis import analyze_local
+from content.services.similarity import SimilarityIndex, get_similarity_index
+from content.services.singleflight import LEASE_KEY, AsyncSingleFlight, SingleFlight, shared_lease
+from content.services.jobs import enqueue_analysis, process_jobs
+from content.throttling import LLMThrottle, acquire_llm, check_cache_backend
+from content.views.ai_views import SYSTEM_PROMPT
+
+
+class QueryBudgetMixin:
+    """
+    Asserts that an API call stays within a fixed number of SQL queries, so
+    N+1 regressions fail the suite.
+    """
+    def assertQueryBudget(self, budget, method, url, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, *args, **kwargs)
+        self.assertLess(response.status_code, 400)
+        sql = '\n'.join(query['sql'] for query in queries.captured_queries)
+        self.assertLessEqual(len(queries), budget, f'{method.upper()} {url} ran {len(queries)} queries:\n{sql}')
+        return response
 
 
 class CategoryModelTest(TestCase):
@@ -106,6 +149,12 @@ class AIAnalyzeTest(TestCase):
         response = self.client.post(url, data, format='json')
         self.assertIn(response.status_code, [200, 500])
 
+    def test_text_must_be_a_string(self):
+        for text in (['a'], {'a': 1}, 42):
+            response = self.client.post(reverse('ai-analyze'), {'text': text, 'engine': 'groq'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, text)
+            self.assertEqual(response.json(), {'error': 'Text must be a string.'})
+
 
 class RBACPermissionTest(TestCase):
     def setUp(self):
@@ -124,3 +173,1479 @@ class RBACPermissionTest(TestCase):
         url = reverse('user-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AnalysisJobQueueTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='user', email='user@test.com', password='pass12345')
+        self.client.force_authenticate(user=self.user)
+        self.ai_result = {'summary': 'Sum', 'sentiment': 'positive', 'topics': ['ai'], 'recommendations': 'More AI'}
+
+    def test_create_enqueues_analysis(self):
+        with mock.patch('content.services.jobs.analyze_text') as analyze:
+            response = self.client.post(reverse('content-list'), {'title': 'Test', 'body': 'Body'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['analysis_status'], 'pending')
+        analyze.assert_not_called()
+        self.assertEqual(AnalysisJob.objects.filter(content_id=response.json()['id'], status='queued').count(), 1)
+
+    def test_update_reuses_queued_job(self):
+        response = self.client.post(reverse('content-list'), {'title': 'Test', 'body': 'Body'})
+        url = reverse('content-detail', args=[response.json()['id']])
+        self.client.patch(url, {'body': 'New body'})
+        self.assertEqual(AnalysisJob.objects.count(), 1)
+
+    def test_worker_stores_result(self):
+        content = Content.objects.create(title='Test', body='Body', owner=self.user)
+        self.client.patch(reverse('content-detail', args=[content.pk]), {'title': 'Updated'})
+        with mock.patch('content.services.jobs.analyze_text', return_value=self.ai_result):
+            self.assertEqual(process_jobs(), 1)
+        content.refresh_from_db()
+        self.assertEqual(content.analysis_status, 'done')
+        self.assertEqual(content.summary, 'Sum')
+        self.assertEqual(AnalysisJob.objects.get().status, 'done')
+
+    def test_worker_skips_a_body_edited_during_the_analysis(self):
+        content = Content.objects.create(title='Test', body='Body', owner=self.user)
+        job = AnalysisJob.objects.create(content=content)
+
+        def edit_then_analyze(text, **options):
+            self.client.patch(reverse('content-detail', args=[content.pk]), {'body': 'A different body'})
+            return self.ai_result
+
+        with mock.patch('content.services.jobs.analyze_text', side_effect=edit_then_analyze):
+            process_jobs(batch_size=1)
+        content.refresh_from_db()
+        self.assertEqual((content.summary, content.analysis_status), (None, 'pending'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(AnalysisJob.objects.exclude(pk=job.pk).get().status, 'queued')  # the edit's job
+
+    def test_worker_retries_then_fails(self):
+        content = Content.objects.create(title='Test', body='Body', owner=self.user)
+        job = AnalysisJob.objects.create(content=content)
+        with self.settings(ANALYSIS_JOB_MAX_ATTEMPTS=2, ANALYSIS_JOB_RETRY_DELAY=0), \
+                mock.patch('content.services.jobs.analyze_text', return_value={}):
+            process_jobs()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('queued', 1))
+            process_jobs()
+        job.refresh_from_db()
+        content.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertEqual(content.analysis_status, 'failed')
+
+
+class ContentReadPathTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='user', email='user@test.com', password='pass12345')
+
+    def test_list_does_not_analyze(self):
+        Content.objects.create(title='Legacy', body='Body', owner=self.user, analysis_status='done')
+        Content.objects.create(title='Queued', body='Body', owner=self.user)
+        with mock.patch('content.services.analysis.get_client') as get_client:
+            response = self.client.get(reverse('content-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        get_client.assert_not_called()
+        statuses = sorted(item['analysis_status'] for item in response.json()['results'])
+        self.assertEqual(statuses, ['done', 'pending'])
+
+    def test_backfill_queues_pending_rows_once(self):
+        Content.objects.create(title='Pending', body='Body', owner=self.user)
+        Content.objects.create(title='Failed', body='Body', owner=self.user, analysis_status='failed')
+        call_command('backfill_analysis', stdout=mock.MagicMock())
+        call_command('backfill_analysis', stdout=mock.MagicMock())
+        self.assertEqual(AnalysisJob.objects.count(), 1)
+        call_command('backfill_analysis', '--include-failed', stdout=mock.MagicMock())
+        self.assertEqual(AnalysisJob.objects.count(), 2)
+
+    def test_worker_queues_rows_saved_around_the_api(self):
+        # e.g. created in the admin or by loaddata: pending, but nothing queued
+        content = Content.objects.create(title='Imported', body='Body', owner=self.user)
+        recent = Content.objects.create(title='Just saved', body='Body', owner=self.user)
+        Content.objects.filter(pk=content.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        with self.settings(ANALYSIS_SWEEP_INTERVAL=60, ANALYSIS_ENGINE='local'), \
+                mock.patch('content.management.commands.process_analysis_jobs.close_old_connections'):
+            call_command('process_analysis_jobs', '--once', stdout=mock.MagicMock())
+        content.refresh_from_db()
+        self.assertEqual(content.analysis_status, Content.AnalysisStatus.DONE)
+        self.assertFalse(AnalysisJob.objects.filter(content=recent).exists())  # the API may still be queuing its job
+
+
+class StubGroqServer:
+    """
+    Local HTTP server mimicking the GROQ chat-completions endpoint. Replies
+    are taken from `replies` in order as (status, message content) pairs,
+    optionally with a dict of extra headers; the last one is repeated.
+    Requests with "stream": true get the content as server-sent events, a
+    word per event, closed by `[DONE]` unless `done` is false.
+    """
+    def __init__(self, replies, done=True):
+        self.replies = list(replies)
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                stub.requests.append(json.loads(self.rfile.read(length)))
+                code, content, *headers = stub.replies[min(len(stub.requests), len(stub.replies)) - 1]
+                if stub.requests[-1].get('stream') and code == 200:
+                    content_type = 'text/event-stream'
+                    body = ''.join(
+                        f'data: {json.dumps({"choices": [{"delta": {"content": word}}]})}\n\n'
+                        for word in re.findall(r'\S+\s*', content)
+                    ).encode() + (b'data: [DONE]\n\n' if done else b'')
+                else:
+                    content_type = 'application/json'
+                    body = json.dumps({'choices': [{'message': {'content': content}}]}).encode()
+                self.send_response(code)
+                for name, value in (headers[0] if headers else {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/openai/v1/chat/completions'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class AnalysisCacheTest(TestCase):
+    def setUp(self):
+        get_analysis_cache().clear()
+        get_analysis_cache().reset_stats()
+
+    def test_key_ignores_whitespace(self):
+        self.assertEqual(make_key('a  b\n', 'm', 'p'), make_key(' a b', 'm', 'p'))
+        self.assertNotEqual(make_key('a b', 'm', 'p'), make_key('a b', 'm', 'other'))
+
+    def test_lru_evicts_oldest_and_expires(self):
+        lru = LRUCache(max_entries=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        expired = LRUCache(max_entries=2, ttl=-1)
+        expired.set('a', 1)
+        self.assertIsNone(expired.get('a'))
+
+    def test_database_tier_and_pruning(self):
+        cache = AnalysisCache(max_entries=10, ttl=60, db_max_entries=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, {'summary': key})
+        cache.memory.clear()
+        self.assertEqual(cache.get('a'), {'summary': 'a'})
+        self.assertEqual(cache.get('a'), {'summary': 'a'})
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual(cache.get_stats()['db_hits'], 1)
+        self.assertEqual(cache.get_stats()['memory_hits'], 1)
+        self.assertEqual(cache.get_stats()['misses'], 1)
+        cache.prune()
+        self.assertEqual(AnalysisCacheEntry.objects.count(), 2)
+        self.assertTrue(AnalysisCacheEntry.objects.filter(key='a').exists())
+
+    def test_analyze_text_calls_groq_once_per_body(self):
+        reply = '{"summary": "S", "sentiment": "neutral", "topics": ["x"], "recommendations": "R"}'
+        with StubGroqServer([(200, reply)]) as stub, self.settings(GROQ_API_URL=stub.url), \
+                mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}):
+            first = analyze_text('Same body')
+            second = analyze_text('Same   body ')
+        self.assertEqual(first['summary'], 'S')
+        self.assertEqual(first, second)
+        self.assertEqual(len(stub.requests), 1)
+
+
+class GroqClientTest(TestCase):
+    def make_client(self, url, **kwargs):
+        return GroqClient(url, api_key='test', backoff_base=0, backoff_max=0, **kwargs)
+
+    def test_retries_server_errors(self):
+        with StubGroqServer([(503, ''), (429, ''), (200, 'ok')]) as stub:
+            client = self.make_client(stub.url, max_retries=2)
+            self.assertEqual(client.chat([{'role': 'user', 'content': 'hi'}]), 'ok')
+        self.assertEqual(len(stub.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        with StubGroqServer([(401, '')]) as stub:
+            client = self.make_client(stub.url, max_retries=2)
+            with self.assertRaises(LLMError):
+                client.chat([{'role': 'user', 'content': 'hi'}])
+        self.assertEqual(len(stub.requests), 1)
+
+    def test_circuit_breaker_fails_fast(self):
+        with StubGroqServer([(500, '')]) as stub:
+            breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+            client = self.make_client(stub.url, max_retries=0, breaker=breaker)
+            for _ in range(2):
+                with self.assertRaises(LLMError):
+                    client.chat([{'role': 'user', 'content': 'hi'}])
+            with self.assertRaises(LLMUnavailable):
+                client.chat([{'role': 'user', 'content': 'hi'}])
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(breaker.state, 'open')
+
+    def test_circuit_breaker_half_open_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_half_open_trial_always_settles(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+        replies = [(500, ''), (500, ''), (400, ''), (500, ''), (500, ''), (429, '', {'Retry-After': '0'}), (200, 'ok')]
+        with StubGroqServer(replies) as stub:
+            client = self.make_client(stub.url, max_retries=0, breaker=breaker)
+            for error in (LLMError, LLMError, LLMError, LLMError, LLMError, LLMRateLimited):
+                with self.assertRaises(error):
+                    client.chat([{'role': 'user', 'content': 'hi'}])
+            # The 400 and the 429 trials showed GROQ is up, so the circuit closed each time.
+            self.assertEqual(breaker.state, 'closed')
+            self.assertEqual(client.chat([{'role': 'user', 'content': 'hi'}]), 'ok')
+        self.assertEqual(len(stub.requests), 7)
+
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        async def cancelled_trial():
+            client = AsyncGroqClient('http://127.0.0.1:9/', api_key='test', max_retries=0, breaker=breaker)
+            with mock.patch.object(client.session, 'send', hang):
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(client.chat([{'role': 'user', 'content': 'hi'}]), 0.05)
+
+        breaker.record_failure()
+        breaker.record_failure()
+        asyncio.run(cancelled_trial())
+        self.assertFalse(breaker._trial_running)  # the cancelled trial counted as a failure
+        self.assertTrue(breaker.allow())
+
+
+class BatchAnalysisTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='user', email='user@test.com', password='pass12345')
+        self.other = get_user_model().objects.create_user(username='other', email='other@test.com', password='pass12345')
+        self.client.force_authenticate(user=self.user)
+        self.ai_result = {'summary': 'Sum', 'sentiment': 'positive', 'topics': ['ai'], 'recommendations': 'More AI'}
+
+    def analyze(self, text, engine=None):
+        return self.ai_result if text != 'broken' else {}
+
+    def test_batch_endpoint_updates_own_rows(self):
+        mine = Content.objects.create(title='Mine', body='Body', owner=self.user)
+        broken = Content.objects.create(title='Broken', body='broken', owner=self.user)
+        theirs = Content.objects.create(title='Theirs', body='Body', owner=self.other)
+        AnalysisJob.objects.create(content=mine)
+        with mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}), \
+                mock.patch('content.services.batch.analyze_text', side_effect=self.analyze):
+            response = self.client.post(reverse('ai-analyze-batch'), {'ids': [mine.pk, broken.pk, theirs.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'], [
+            {'id': mine.pk, 'analysis_status': 'done'},
+            {'id': broken.pk, 'analysis_status': 'failed'},
+        ])
+        self.assertEqual(response.json()['not_found'], [theirs.pk])
+        mine.refresh_from_db()
+        self.assertEqual(mine.summary, 'Sum')
+        self.assertEqual(AnalysisJob.objects.get(content=mine).status, 'done')
+
+    def test_edit_during_analysis_keeps_its_job(self):
+        content = Content.objects.create(title='Mine', body='Old body', owner=self.user)
+
+        def edit_then_analyze(texts, **options):
+            # The body changes while the batch is waiting on GROQ; the edit queues its own job.
+            Content.objects.filter(pk=content.pk).update(body='New body')
+            enqueue_analysis(Content.objects.get(pk=content.pk))
+            return [self.ai_result for _ in texts]
+
+        with mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}), \
+                mock.patch('content.services.batch.analyze_texts', side_effect=edit_then_analyze):
+            self.client.post(reverse('ai-analyze-batch'), {'ids': [content.pk]}, format='json')
+        content.refresh_from_db()
+        self.assertEqual((content.summary, content.analysis_status), (None, 'pending'))
+        self.assertEqual(content.body_fingerprint, fingerprint('New body'))
+        self.assertEqual(AnalysisJob.objects.get(content=content).status, 'queued')
+
+    def test_batch_endpoint_limits_size(self):
+        with self.settings(AI_BATCH_MAX_ITEMS=2):
+            response = self.client.post(reverse('ai-analyze-batch'), {'texts': ['a', 'b', 'c']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_command_checkpoints_and_resumes(self):
+        contents = [Content.objects.create(title=str(i), body='Body', owner=self.user) for i in range(3)]
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+        with open(checkpoint, 'w') as f:
+            json.dump({'last_pk': contents[0].pk, 'processed': 1, 'succeeded': 1}, f)
+        with mock.patch('content.services.batch.analyze_text', side_effect=self.analyze):
+            call_command('analyze_content', '--resume', '--checkpoint', checkpoint, '--chunk-size', '1', '--rate', '0', stdout=mock.MagicMock())
+        statuses = [Content.objects.get(pk=c.pk).analysis_status for c in contents]
+        self.assertEqual(statuses, ['pending', 'done', 'done'])
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_rate_limiter_spaces_calls(self):
+        limiter = RateLimiter(rate=50, burst=1)
+        started = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.07)
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='user', email='user@test.com', password='pass12345')
+        self.other = get_user_model().objects.create_user(username='other', email='other@test.com', password='pass12345')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        self.reply = '{"summary": "S", "sentiment": "neutral", "topics": ["x"], "recommendations": "R"}'
+        get_analysis_cache().clear()
+
+    def post(self, url, data, method='post'):
+        return getattr(self.client, method)(url, json.dumps(data), content_type='application/json', **self.auth)
+
+    def test_requires_authentication(self):
+        response = self.client.post(reverse('async-ai-analyze'), '{}', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_async_analyze_validates_text_and_runs_local_off_the_loop(self):
+        headers = {'Authorization': self.auth['HTTP_AUTHORIZATION']}
+        url = reverse('async-ai-analyze')
+        response = await self.async_client.post(url, {'text': ['a']}, content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(json.loads(response.content), {'error': 'Text must be a string.'})
+
+        threads = []
+
+        def analyze(texts):
+            threads.append(threading.current_thread())
+            return analyze_local(texts)
+
+        with mock.patch('content.views.ai_views.analyze_local', analyze):
+            response = await self.async_client.post(
+                url, {'text': 'Great work', 'engine': 'local'}, content_type='application/json', headers=headers,
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())  # not the event loop's thread
+
+    def test_async_analyze(self):
+        with StubGroqServer([(200, 'Analysis')]) as stub, self.settings(GROQ_API_URL=stub.url), \
+                mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}):
+            response = self.post(reverse('async-ai-analyze'), {'text': 'Some text'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'ai_result': 'Analysis'})
+
+    def test_async_create_analyzes_inline(self):
+        with StubGroqServer([(200, self.reply)]) as stub, self.settings(GROQ_API_URL=stub.url), \
+                mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}):
+            response = self.post(reverse('async-content-create'), {'title': 'Test', 'body': 'Body'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['summary'], 'S')
+        self.assertEqual(response.json()['analysis_status'], 'done')
+        self.assertEqual(AnalysisJob.objects.get().status, 'done')
+
+    def test_async_create_falls_back_to_queue(self):
+        response = self.post(reverse('async-content-create'), {'title': 'Test', 'body': 'Body'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['analysis_status'], 'pending')
+        self.assertEqual(AnalysisJob.objects.get().status, 'queued')
+
+    async def test_async_analyze_stream(self):
+        with StubGroqServer([(200, 'Streamed analysis text')]) as stub, self.settings(GROQ_API_URL=stub.url), \
+                mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}):
+            response = await self.async_client.post(
+                reverse('async-ai-analyze'), {'text': 'Some text', 'stream': True}, content_type='application/json',
+                headers={'Authorization': self.auth['HTTP_AUTHORIZATION']},
+            )
+            body = b''.join([part async for part in response]).decode()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(body.count('event: delta'), 3)
+        self.assertIn('event: done\ndata: {"ai_result": "Streamed analysis text"}', body)
+
+        with StubGroqServer([(200, 'Cut short')], done=False) as stub, self.settings(GROQ_API_URL=stub.url), \
+                mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}):
+            response = await self.async_client.post(
+                reverse('async-ai-analyze'), {'text': 'Other text', 'stream': True}, content_type='application/json',
+                headers={'Authorization': self.auth['HTTP_AUTHORIZATION']},
+            )
+            body = b''.join([part async for part in response]).decode()
+        self.assertIn('event: error', body)
+        self.assertNotIn('event: done', body)
+        key = make_key('Other text', GROQ_MODEL, SYSTEM_PROMPT + ANALYSIS_USER_PROMPT)
+        self.assertIsNone(await sync_to_async(get_analysis_cache().get)(key))
+
+    def test_async_update_checks_owner(self):
+        content = Content.objects.create(title='Theirs', body='Body', owner=self.other)
+        response = self.post(reverse('async-content-update', args=[content.pk]), {'title': 'Mine'}, method='patch')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # Another user's private row does not exist as far as the caller can tell.
+        content = Content.objects.create(title='Secret', body='Body', owner=self.other, is_public=False)
+        response = self.post(reverse('async-content-update', args=[content.pk]), {'title': 'Mine'}, method='patch')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Content.objects.get(pk=content.pk).title, 'Secret')
+
+
+class ContentSearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='user', email='user@test.com', password='pass12345')
+
+    def search(self, terms):
+        response = self.client.get(reverse('content-list'), {'search': terms})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['title'] for item in response.json()['results']]
+
+    def test_ranks_title_above_body(self):
+        Content.objects.create(title='Gardening notes', body='Notes about robots in the garden.', owner=self.user)
+        Content.objects.create(title='Robots everywhere', body='A general article.', owner=self.user)
+        Content.objects.create(title='Cooking', body='Pasta recipes.', owner=self.user)
+        self.assertEqual(self.search('robot'), ['Robots everywhere', 'Gardening notes'])
+
+    def test_vector_follows_bulk_writes(self):
+        content = Content.objects.create(title='Plain', body='Nothing here.', owner=self.user)
+        Content.objects.filter(pk=content.pk).update(summary='Quantum computing overview', topics=['physics'])
+        self.assertEqual(self.search('quantum'), ['Plain'])
+        self.assertEqual(self.search('physics'), ['Plain'])
+        self.assertEqual(self.search('quantum -physics'), [])
+
+
+class PaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()  # anonymous throttle counts
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(username='user', email='user@test.com', password='pass12345')
+
+    def collect(self, url, params):
+        titles = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            titles += [item.get('title') or item.get('name') for item in response.json()['results']]
+            if not response.json()['next']:
+                return titles
+            response = self.client.get(response.json()['next'])
+
+    def test_content_cursor_walks_all_rows_newest_first(self):
+        for i in range(5):
+            Content.objects.create(title=f'Post {i}', body='Robots', owner=self.user)
+        titles = self.collect(reverse('content-list'), {'page_size': 2})
+        self.assertEqual(titles, [f'Post {i}' for i in reversed(range(5))])
+
+    def test_search_results_page_by_rank(self):
+        Content.objects.create(title='Robots robots', body='Robots', owner=self.user)
+        for i in range(3):
+            Content.objects.create(title=f'Post {i}', body='Robots', owner=self.user)
+        titles = self.collect(reverse('content-list'), {'page_size': 1, 'search': 'robots'})
+        self.assertEqual(titles[0], 'Robots robots')
+        self.assertEqual(sorted(titles[1:]), ['Post 0', 'Post 1', 'Post 2'])
+
+    def test_search_pages_across_tied_ranks(self):
+        # Identical rows tie exactly; the others differ in rank by tiny amounts.
+        for i in range(4):
+            Content.objects.create(title='Robots', body='Robots at work.', owner=self.user)
+        for i in range(1, 9):
+            Content.objects.create(title='Robots', body='robots ' * i, owner=self.user)
+        # Floats sent back rounded (as by Postgres before 12) must not shift the page boundaries.
+        with connection.cursor() as cursor:
+            cursor.execute('SET extra_float_digits = 0')
+        self.addCleanup(lambda: connection.cursor().execute('RESET extra_float_digits'))
+        params = {'search': 'robots'}
+        everything = [item['id'] for item in self.client.get(reverse('content-list'), params).json()['results']]
+        self.assertEqual(len(everything), 12)
+        for page_size in (1, 3, 5):
+            ids, response = [], self.client.get(reverse('content-list'), {**params, 'page_size': page_size})
+            while True:
+                ids += [item['id'] for item in response.json()['results']]
+                if not response.json()['next'] or len(ids) > len(everything):
+                    break
+                response = self.client.get(response.json()['next'])
+            self.assertEqual(ids, everything, f'page_size={page_size}')
+
+    def test_page_size_is_capped(self):
+        for i in range(3):
+            Category.objects.create(name=f'Cat {i}')
+        with self.settings(API_MAX_PAGE_SIZE=2):
+            response = self.client.get(reverse('category-list'), {'page_size': 50})
+        self.assertEqual(len(response.json()['results']), 2)
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(username='admin', email='admin@test.com', password='adminpass')
+        for i in range(10):
+            owner = get_user_model().objects.create(username=f'user{i}')
+            category = Category.objects.create(name=f'Category {i}')
+            Content.objects.create(title=f'Post {i}', body='Robots', owner=owner, category=category)
+        self.content = Content.objects.first()
+
+    def test_content_list(self):
+        response = self.assertQueryBudget(1, 'get', reverse('content-list'))
+        self.assertEqual(response.json()['results'][0]['category']['name'], 'Category 9')
+
+    def test_content_search(self):
+        self.assertQueryBudget(1, 'get', reverse('content-list'), {'search': 'robots'})
+
+    def test_content_detail(self):
+        self.assertQueryBudget(1, 'get', reverse('content-detail', args=[self.content.pk]))
+
+    def test_category_list(self):
+        self.assertQueryBudget(1, 'get', reverse('category-list'))
+
+    def test_user_list(self):
+        self.client.force_authenticate(user=self.admin)
+        self.assertQueryBudget(1, 'get', reverse('user-list'))
+
+
+class ContentVisibilityTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user')
+        self.other = get_user_model().objects.create(username='other')
+        self.admin = get_user_model().objects.create(username='admin', is_staff=True)
+        Content.objects.create(title='Public', body='Body', owner=self.other)
+        Content.objects.create(title='Mine', body='Body', owner=self.user, is_public=False)
+        self.private = Content.objects.create(title='Private', body='Body', owner=self.other, is_public=False)
+
+    def titles(self, user=None):
+        self.client.force_authenticate(user=user)
+        return sorted(item['title'] for item in self.client.get(reverse('content-list')).json()['results'])
+
+    def test_list_visibility(self):
+        self.assertEqual(self.titles(), ['Public'])
+        self.assertEqual(self.titles(self.user), ['Mine', 'Public'])
+        self.assertEqual(self.titles(self.admin), ['Mine', 'Private', 'Public'])
+
+    def test_private_detail_is_hidden(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('content-detail', args=[self.private.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=300)
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user')
+        self.category = Category.objects.create(name='Tech')
+        self.content = Content.objects.create(title='Post', body='Body', owner=self.user, category=self.category)
+
+    def test_second_read_is_a_hit(self):
+        url = reverse('content-list')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['results'][0]['title'], 'Post')
+
+    def test_writes_invalidate(self):
+        url = reverse('content-detail', args=[self.content.pk])
+        self.client.get(url)
+        self.content.title = 'Edited'
+        self.content.save()
+        self.assertEqual(self.client.get(url).json()['title'], 'Edited')
+        # Category changes show up in the nested representation too.
+        self.category.name = 'Science'
+        self.category.save()
+        self.assertEqual(self.client.get(url).json()['category']['name'], 'Science')
+        # Queryset updates bypass post_save.
+        Content.objects.filter(pk=self.content.pk).update(title='Bulk')
+        self.assertEqual(self.client.get(url).json()['title'], 'Bulk')
+
+    def test_etag_not_modified(self):
+        url = reverse('category-list')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        Category.objects.create(name='Other')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_private_content_is_not_shared(self):
+        Content.objects.create(title='Private', body='Body', owner=self.user, is_public=False)
+        url = reverse('content-list')
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(len(self.client.get(url).json()['results']), 2)
+        self.client.force_authenticate(user=None)
+        self.assertEqual(len(self.client.get(url).json()['results']), 1)
+
+    def test_needs_a_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            check_response_cache_backend()  # local memory is per process
+        with self.settings(RESPONSE_CACHE_TIMEOUT=0):
+            check_response_cache_backend()
+            response = self.client.get(reverse('content-list'))
+        self.assertNotIn('X-Cache', response)
+
+
+class AnalyticsCounterTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create(username='admin', is_staff=True)
+        self.user = get_user_model().objects.create(username='user')
+        self.tech = Category.objects.create(name='Tech')
+        self.news = Category.objects.create(name='News')
+        self.first = Content.objects.create(title='A', body='Body', owner=self.user, category=self.tech, sentiment='Positive')
+        self.second = Content.objects.create(title='B', body='Body', owner=self.user, category=self.tech)
+
+    def counter(self, dimension, key=''):
+        stored = AnalyticsCounter.objects.filter(dimension=dimension, key=key).values_list('value', flat=True).first()
+        pending = AnalyticsCounterDelta.objects.filter(dimension=dimension, key=key).aggregate(total=Sum('delta'))['total']
+        return (stored or 0) + (pending or 0)
+
+    def test_triggers_follow_writes(self):
+        Dimension = AnalyticsCounter.Dimension
+        self.assertEqual(self.counter(Dimension.CONTENT), 2)
+        self.assertEqual(self.counter(Dimension.CONTENT_CATEGORY, str(self.tech.pk)), 2)
+        self.assertEqual(self.counter(Dimension.CONTENT_SENTIMENT, 'positive'), 1)
+        # Bulk writes bypass signals but not triggers.
+        Content.objects.filter(pk=self.second.pk).update(category=self.news, sentiment='negative')
+        self.assertEqual(self.counter(Dimension.CONTENT_CATEGORY, str(self.tech.pk)), 1)
+        self.assertEqual(self.counter(Dimension.CONTENT_SENTIMENT, 'negative'), 1)
+        self.tech.delete()  # SET_NULL on content
+        self.assertEqual(self.counter(Dimension.CONTENT_CATEGORY), 1)
+        self.assertEqual(self.counter(Dimension.CATEGORIES), 1)
+        self.user.delete()  # cascades to content
+        self.assertEqual(self.counter(Dimension.CONTENT), 0)
+        self.assertEqual(self.counter(Dimension.USERS), 1)
+
+    def test_writers_do_not_wait_on_each_other(self):
+        # This test's open transaction has written content; a writer on another connection must not block on it.
+        other = connection.get_new_connection(connection.get_connection_params())
+        self.addCleanup(other.close)
+        cursor = other.cursor()
+        cursor.execute("SET lock_timeout = '2s'")
+        cursor.execute(
+            "INSERT INTO auth_user (password, is_superuser, username, first_name, last_name, email, is_staff, is_active, date_joined) "
+            "VALUES ('', false, 'concurrent', '', '', '', false, true, now()) RETURNING id"
+        )
+        cursor.execute(
+            "INSERT INTO content_content (title, body, owner_id, is_public, created_at, updated_at, analysis_status, analysis_engine, body_fingerprint) "
+            "VALUES ('C', 'Body', %s, true, now(), now(), 'pending', '', '')",
+            [cursor.fetchone()[0]],
+        )
+        other.rollback()
+
+    def test_rollup_and_top_owners(self):
+        Dimension = AnalyticsCounter.Dimension
+        writer = get_user_model().objects.create(username='writer')
+        for title in 'CDE':
+            Content.objects.create(title=title, body='Body', owner=writer)
+        self.assertGreater(rollup_counters(), 0)
+        self.assertFalse(AnalyticsCounterDelta.objects.exists())
+        self.assertEqual(self.counter(Dimension.CONTENT), 5)
+        self.assertEqual(self.counter(Dimension.CONTENT_OWNER, str(writer.pk)), 3)
+
+        # Pending deltas that lower the top owner let the next one overtake it.
+        Content.objects.filter(owner=writer).exclude(title='C').delete()
+        self.assertEqual(get_analytics(top_owners=1)['top_owners'], [{'owner': 'user', 'count': 2}])
+        self.assertEqual(get_analytics()['content_count'], 3)
+
+    def test_rollup_without_the_worker(self):
+        Content.objects.create(title='C', body='Body', owner=self.admin)
+        with self.settings(ANALYTICS_ROLLUP_THRESHOLD=100):
+            get_analytics()
+        self.assertTrue(AnalyticsCounterDelta.objects.exists())  # below the threshold: only read
+        with self.settings(ANALYTICS_ROLLUP_THRESHOLD=1):
+            self.assertEqual(get_analytics()['content_count'], 3)
+        self.assertFalse(AnalyticsCounterDelta.objects.exists())
+
+        Content.objects.create(title='D', body='Body', owner=self.admin)
+        call_command('rollup_counters', stdout=mock.MagicMock())
+        self.assertFalse(AnalyticsCounterDelta.objects.exists())
+        self.assertEqual(self.counter(AnalyticsCounter.Dimension.CONTENT), 4)
+
+    def test_analytics_view(self):
+        self.client.force_authenticate(user=self.admin)
+        with self.assertNumQueries(6):  # fixed, whatever the table sizes
+            data = self.client.get(reverse('analytics')).json()
+        self.assertEqual((data['user_count'], data['content_count'], data['category_count']), (2, 2, 2))
+        self.assertEqual(data['content_by_category'], [{'category': 'Tech', 'count': 2}])
+        self.assertEqual(data['top_owners'], [{'owner': 'user', 'count': 2}])
+        self.assertEqual(sum(item['count'] for item in data['content_by_day']), 2)
+
+    def test_reconcile(self):
+        AnalyticsCounter.objects.filter(dimension=AnalyticsCounter.Dimension.CONTENT).update(value=99)
+        call_command('reconcile_counters', stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.counter(AnalyticsCounter.Dimension.CONTENT), 2)
+
+
+class ContentExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user')
+        self.category = Category.objects.create(name='Tech')
+        for i in range(3):
+            Content.objects.create(
+                title=f'Post {i}', body='Body', owner=self.user, category=self.category, topics=['ai', 'ml'],
+            )
+        Content.objects.create(title='Private', body='Body', owner=self.user, is_public=False)
+
+    def export(self, **params):
+        response = self.client.get(reverse('content-export'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    @mock.patch('content.serializers.content_serializers.ContentSerializer.analyze_with_groq')
+    def test_ndjson(self, analyze):
+        response, body = self.export()
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Post 0', 'Post 1', 'Post 2'])
+        self.assertEqual(rows[0]['category'], 'Tech')
+        self.assertEqual(rows[0]['topics'], ['ai', 'ml'])
+        self.assertEqual(response['X-Export-Watermark'], rows[-1]['updated_at'])
+        analyze.assert_not_called()
+
+    def test_csv(self):
+        _, body = self.export(output='csv')
+        lines = body.splitlines()
+        self.assertTrue(lines[0].startswith('id,title,body,'))
+        self.assertEqual(len(lines), 4)
+
+    def test_since_watermark(self):
+        response, _ = self.export()
+        watermark = response['X-Export-Watermark']
+        _, body = self.export(since=watermark)
+        self.assertEqual(body, '')
+        content = Content.objects.get(title='Post 1')
+        content.title = 'Edited'
+        content.save()
+        _, body = self.export(since=watermark)
+        self.assertEqual([json.loads(line)['title'] for line in body.splitlines()], ['Edited'])
+
+    def test_owner_sees_private_rows(self):
+        self.client.force_authenticate(user=self.user)
+        _, body = self.export()
+        self.assertEqual(len(body.splitlines()), 4)
+
+    async def test_streams_under_asgi(self):
+        with mock.patch('content.services.export.FLUSH_BYTES', 1):
+            response = await self.async_client.get(reverse('content-export'))
+            self.assertTrue(response.is_async)  # Django would otherwise read the export into a list first
+            parts = [part async for part in response]
+        self.assertEqual([json.loads(part)['title'] for part in parts], ['Post 0', 'Post 1', 'Post 2'])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(reverse('content-export'), {'output': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('content-export'), {'since': 'yesterday'}).status_code, 400)
+
+
+class ContentBulkTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user')
+        self.other = get_user_model().objects.create(username='other')
+        self.category = Category.objects.create(name='Tech')
+        self.mine = Content.objects.create(title='Mine', body='Body', owner=self.user)
+        self.theirs = Content.objects.create(title='Theirs', body='Body', owner=self.other)
+        self.client.force_authenticate(user=self.user)
+
+    def test_creates_and_updates_in_one_request(self):
+        items = [
+            {'title': 'New', 'body': 'Fresh text', 'category_id': self.category.pk},
+            {'id': self.mine.pk, 'title': 'Edited'},
+            {'title': 'Missing body'},
+            {'id': self.theirs.pk, 'title': 'Hijacked'},
+            {'title': 'Bad category', 'body': 'Text', 'category_id': 999999},
+        ]
+        with mock.patch('content.serializers.content_serializers.analyze_text') as analyze:
+            response = self.client.post(reverse('content-bulk'), items, format='json')
+        analyze.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual((data['written'], data['failed']), (2, 3))
+        results = data['results']
+        self.assertEqual(results[0]['status'], 'created')
+        self.assertEqual(results[1], {'id': self.mine.pk, 'status': 'updated'})
+        self.assertIn('body', results[2]['errors'])
+        self.assertEqual(results[3]['errors'], {'id': ['Not found.']})
+        self.assertIn('category_id', results[4]['errors'])
+
+        created = Content.objects.get(pk=results[0]['id'])
+        self.assertEqual((created.owner, created.category), (self.user, self.category))
+        self.mine.refresh_from_db()
+        self.assertEqual((self.mine.title, self.mine.body), ('Edited', 'Body'))
+        self.assertEqual(Content.objects.get(pk=self.theirs.pk).title, 'Theirs')
+        queued = AnalysisJob.objects.filter(status=AnalysisJob.Status.QUEUED).values_list('content_id', flat=True)
+        self.assertEqual(set(queued), {created.pk, self.mine.pk})
+
+    def test_rejects_bad_and_duplicate_ids_per_item(self):
+        items = [
+            {'id': [self.mine.pk], 'title': 'List id'},
+            {'id': {'pk': self.mine.pk}, 'title': 'Object id'},
+            {'id': True, 'title': 'Boolean id'},
+            {'id': self.mine.pk, 'title': 'First'},
+            {'id': self.mine.pk, 'title': 'Second'},
+        ]
+        response = self.client.post(reverse('content-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        for result in results[:3]:
+            self.assertEqual(result['errors'], {'id': ['A valid integer is required.']})
+        self.assertEqual(results[3], {'id': self.mine.pk, 'status': 'updated'})
+        self.assertEqual(results[4]['errors'], {'id': ['Duplicate id in this batch.']})
+        self.assertEqual(Content.objects.get(pk=self.mine.pk).title, 'First')
+
+    def test_bad_category_id_is_an_item_error(self):
+        items = [
+            {'title': 'Superscript', 'body': 'Text', 'category_id': '²'},
+            {'title': 'Good', 'body': 'Text', 'category_id': str(self.category.pk)},
+        ]
+        response = self.client.post(reverse('content-bulk'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertIn('category_id', results[0]['errors'])
+        self.assertEqual(results[1]['status'], 'created')
+
+    def test_query_count_does_not_grow_with_batch(self):
+        items = [{'title': f'Post {i}', 'body': 'Text', 'category_id': self.category.pk} for i in range(50)]
+        items.append({'id': self.mine.pk, 'body': 'Changed'})
+        self.assertQueryBudget(10, 'post', reverse('content-bulk'), items, format='json')
+        self.assertEqual(Content.objects.filter(owner=self.user).count(), 51)
+
+    def test_rejects_invalid_batches(self):
+        url = reverse('content-bulk')
+        self.assertEqual(self.client.post(url, {'title': 'Not a list'}, format='json').status_code, 400)
+        with self.settings(CONTENT_BULK_MAX_ITEMS=1):
+            response = self.client.post(url, [{'title': 'A', 'body': 'B'}] * 2, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post(url, [{'title': 'No body'}], format='json').status_code, 400)
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.post(url, [{'title': 'A', 'body': 'B'}], format='json').status_code, 401)
+
+
+class AnalysisParsingTest(TestCase):
+    corpus_path = os.path.join(os.path.dirname(__file__), 'misc', 'llm_reply_corpus.json')
+
+    def test_corpus_success_rate(self):
+        with open(self.corpus_path, encoding='utf-8') as f:
+            corpus = json.load(f)
+        parsed, mismatches = 0, []
+        for case in corpus:
+            try:
+                result = parse_analysis(case['reply'])
+            except AnalysisParseError:
+                result = None
+            parsed += result is not None
+            if (result is not None) != case['valid']:
+                mismatches.append(case['note'])
+            if result is not None:
+                self.assertEqual(list(result), ['summary', 'sentiment', 'topics', 'recommendations'])
+                self.assertTrue(all(isinstance(topic, str) for topic in result['topics']))
+        valid = sum(case['valid'] for case in corpus)
+        self.assertEqual(mismatches, [], f'parsed {parsed}/{len(corpus)} replies, {valid} expected')
+
+    def test_normalizes_shapes(self):
+        result = parse_analysis(
+            'Here it is:\n```json\n{"Summary": "S", "sentiment": {"label": "Positive"}, '
+            '"topics": "a, b", "recommendations": ["x", "y"], "meta": {"nested": {}}}\n```'
+        )
+        self.assertEqual(result, {'summary': 'S', 'sentiment': 'positive', 'topics': ['a', 'b'], 'recommendations': 'x\ny'})
+
+    def test_unusable_reply_fails_job_without_retry(self):
+        user = get_user_model().objects.create(username='user')
+        content = Content.objects.create(title='Test', body='Body', owner=user)
+        job = AnalysisJob.objects.create(content=content)
+        with mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}), \
+                mock.patch('content.services.analysis.get_client') as get_client:
+            get_client.return_value.chat.return_value = "Sorry, I can't help with that."
+            process_jobs()
+            process_jobs()
+        get_client.return_value.chat.assert_called_once()
+        job.refresh_from_db()
+        content.refresh_from_db()
+        self.assertEqual((job.status, content.analysis_status), ('failed', 'failed'))
+        self.assertIn('No JSON object in reply.', job.last_error)
+        self.assertIn("Sorry, I can't help with that.", job.last_error)
+        # Callers that do not ask for parse errors still get an empty result.
+        with mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}), \
+                mock.patch('content.services.analysis.get_client', get_client), \
+                self.assertLogs('content.services.analysis', 'WARNING'):
+            self.assertEqual(analyze_text('Other body'), {})
+
+
+class ChunkedAnalysisTest(TestCase):
+    def setUp(self):
+        get_analysis_cache().clear()
+        self.paragraphs = [
+            f'Paragraph {i} talks about topic number {i}. ' + ' '.join(f'word{i}x{j}' for j in range(40))
+            for i in range(30)
+        ]
+        self.text = '\n\n'.join(self.paragraphs)
+
+    def reply(self, messages, **kwargs):
+        prompt = messages[-1]['content']
+        summary = 'Combined' if prompt.startswith('These are analyses') else prompt.split('Paragraph ')[1].split('.')[0]
+        return json.dumps({'summary': summary, 'sentiment': 'neutral', 'topics': ['t'], 'recommendations': ''})
+
+    def test_split_respects_budget(self):
+        self.assertEqual(split_text('Short text.', 100), ['Short text.'])
+        chunks = split_text(self.text, 300)
+        self.assertGreater(len(chunks), 3)
+        self.assertTrue(all(estimate_tokens(chunk) <= 300 for chunk in chunks))
+        self.assertEqual(' '.join(chunks).split(), self.text.split())
+        # A single oversized paragraph is cut at sentences and words.
+        self.assertTrue(all(estimate_tokens(chunk) <= 50 for chunk in split_text(self.paragraphs[0] * 5, 50)))
+
+    def test_edit_only_changes_nearby_chunks(self):
+        before = split_text(self.text, 300)
+        edited = list(self.paragraphs)
+        edited[15] = edited[15].replace('talks about', 'discusses at length')
+        after = split_text('\n\n'.join(edited), 300)
+        self.assertLessEqual(len(set(after) - set(before)), 2)
+
+    def test_map_reduce_reuses_chunk_cache(self):
+        with self.settings(ANALYSIS_CHUNK_TOKENS=300), mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}), \
+                mock.patch('content.services.analysis.get_client') as get_client:
+            get_client.return_value.chat.side_effect = self.reply
+            chunks = split_text(self.text, 300)
+            result = analyze_text(self.text)
+            first_calls = get_client.return_value.chat.call_count
+            edited = self.text.replace('Paragraph 15 talks about', 'Paragraph 15 discusses at length')
+            analyze_text(edited)
+            second_calls = get_client.return_value.chat.call_count - first_calls
+        self.assertEqual(result['summary'], 'Combined')
+        self.assertGreaterEqual(first_calls, len(chunks) + 1)
+        # Changed chunks plus the combine step(s); untouched chunks come from the cache.
+        self.assertLess(second_calls, first_calls - len(chunks) + 3)
+
+    async def test_async_chunk_calls_are_bounded(self):
+        running, peak = 0, 0
+
+        async def chat(messages, **kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return self.reply(messages)
+
+        with self.settings(ANALYSIS_CHUNK_TOKENS=300, ANALYSIS_CHUNK_WORKERS=2), \
+                mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}), \
+                mock.patch('content.services.analysis.get_async_client') as get_client:
+            get_client.return_value.chat = chat
+            result = await analyze_text_async(self.text, engine='groq')
+        self.assertEqual(result['summary'], 'Combined')
+        self.assertEqual(peak, 2)
+
+
+class ReanalysisTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user')
+        self.client.force_authenticate(user=self.user)
+        self.body = ' '.join(f'word{i}' for i in range(100))
+        response = self.client.post(reverse('content-list'), {'title': 'Post', 'body': self.body}, format='json')
+        self.content = Content.objects.get(pk=response.json()['id'])
+        AnalysisJob.objects.update(status=AnalysisJob.Status.DONE)
+        Content.objects.update(analysis_status=Content.AnalysisStatus.DONE)
+
+    def patch(self, data):
+        return self.client.patch(reverse('content-detail', args=[self.content.pk]), data, format='json')
+
+    def queued(self):
+        return AnalysisJob.objects.filter(status=AnalysisJob.Status.QUEUED).first()
+
+    def test_metadata_patch_skips_analysis(self):
+        self.patch({'is_public': False, 'title': 'Renamed'})
+        self.patch({'body': self.body.replace(' ', '  \n')})  # whitespace only
+        self.assertIsNone(self.queued())
+        self.content.refresh_from_db()
+        self.assertEqual(self.content.analysis_status, 'done')
+
+    def test_minor_edit_is_deferred(self):
+        with self.settings(ANALYSIS_MINOR_EDIT_SIMILARITY=0.9, ANALYSIS_MINOR_EDIT_DELAY=600):
+            self.patch({'body': self.body.replace('word5 ', 'typo ')})
+        job = self.queued()
+        self.assertGreater((job.run_after - timezone.now()).total_seconds(), 500)
+        # A real rewrite afterwards is analyzed at once with the same job.
+        self.patch({'body': 'Completely different text.'})
+        job.refresh_from_db()
+        self.assertLessEqual(job.run_after, timezone.now())
+        self.assertEqual(AnalysisJob.objects.filter(status=AnalysisJob.Status.QUEUED).count(), 1)
+
+    def test_bulk_update_skips_unchanged_bodies(self):
+        items = [{'id': self.content.pk, 'title': 'Bulk title'}, {'title': 'New', 'body': 'Text'}]
+        self.client.post(reverse('content-bulk'), items, format='json')
+        queued = AnalysisJob.objects.filter(status=AnalysisJob.Status.QUEUED).values_list('content__title', flat=True)
+        self.assertEqual(list(queued), ['New'])
+
+
+class LocalAnalyzerTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user')
+        self.client.force_authenticate(user=self.user)
+        self.text = (
+            'Machine learning tools keep improving. The new machine learning library is excellent and easy to use.\n\n'
+            'Installation crashed once, but the machine learning community loves it.'
+        )
+        get_analysis_cache().clear()
+
+    def test_batch_analysis(self):
+        positive, negative, empty = analyze_local([self.text, 'The update is not good. Support was terrible.', ''])
+        self.assertEqual(positive['sentiment'], 'positive')
+        self.assertEqual(positive['topics'][0], 'machine learning')
+        self.assertTrue(positive['summary'].startswith('Machine learning tools keep improving.'))
+        self.assertEqual(positive['engine'], 'local')
+        self.assertEqual(negative['sentiment'], 'negative')
+        self.assertEqual(empty, {})
+        self.assertEqual(analyze_local([self.text]), analyze_local([self.text]))
+
+    def test_auto_falls_back_when_groq_fails_or_is_slow(self):
+        def slow(*args, **kwargs):
+            time.sleep(0.5)
+            return 'not an analysis'
+
+        with self.settings(ANALYSIS_ENGINE='auto', ANALYSIS_LATENCY_BUDGET=0.1), \
+                mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}):
+            with mock.patch('content.services.analysis.get_client') as get_client:
+                get_client.return_value.chat.side_effect = LLMError('down')
+                self.assertEqual(analyze_text(self.text)['engine'], 'local')
+            with mock.patch('content.services.analysis.get_client') as get_client:
+                get_client.return_value.chat.side_effect = slow
+                started = time.monotonic()
+                self.assertEqual(analyze_text('Other text.')['engine'], 'local')
+                self.assertLess(time.monotonic() - started, 0.4)
+                time.sleep(0.5)  # let the abandoned call finish while the mock is in place
+
+    def test_engine_is_recorded_and_upgradable(self):
+        with self.settings(ANALYSIS_ENGINE='local'):
+            response = self.client.post(reverse('content-list'), {'title': 'Post', 'body': self.text}, format='json')
+            process_jobs()
+        content = Content.objects.get(pk=response.json()['id'])
+        self.assertEqual((content.analysis_status, content.analysis_engine), ('done', 'local'))
+        self.assertIn('machine learning', content.topics)
+
+        call_command('backfill_analysis', '--upgrade-local', stdout=mock.MagicMock())
+        self.assertEqual(AnalysisJob.objects.filter(content=content, status=AnalysisJob.Status.QUEUED).count(), 1)
+        ai_result = {'summary': 'S', 'sentiment': 'neutral', 'topics': ['ml'], 'recommendations': 'R'}
+        with mock.patch('content.services.jobs.analyze_text', return_value=ai_result):
+            process_jobs()
+        content.refresh_from_db()
+        self.assertEqual((content.summary, content.analysis_engine), ('S', 'groq'))
+
+    def test_endpoint_engine_selection(self):
+        with mock.patch.dict('os.environ', {'GROQ_API_KEY': ''}):
+            response = self.client.post(reverse('ai-analyze'), {'text': self.text, 'engine': 'local'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json()['engine'], 'local')
+            self.assertEqual(json.loads(response.json()['ai_result'])['sentiment'], 'positive')
+            response = self.client.post(reverse('ai-analyze-batch'), {'texts': [self.text, 'x'], 'engine': 'local'}, format='json')
+            self.assertEqual([result['engine'] for result in response.json()['results']], ['local', 'local'])
+            response = self.client.post(reverse('ai-analyze'), {'text': self.text, 'engine': 'gpt'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_local_engine_never_sees_non_string_text(self):
+        with mock.patch.dict('os.environ', {'GROQ_API_KEY': ''}), \
+                mock.patch('content.views.ai_views.analyze_local') as analyze:
+            for engine in ('local', 'auto'):
+                response = self.client.post(reverse('ai-analyze'), {'text': {'body': 'x'}, 'engine': engine}, format='json')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        analyze.assert_not_called()
+
+
+class RelatedContentTest(TestCase):
+    def setUp(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        self.enterContext(self.settings(SIMILARITY_INDEX_DIR=path))
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user')
+        self.other = get_user_model().objects.create(username='other')
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ml = self.create('Machine learning', 'Training neural networks for machine learning with Python.')
+            self.dl = self.create('Deep learning', 'Deep neural networks are a machine learning technique.')
+            self.bread = self.create('Sourdough', 'Baking sourdough bread needs a healthy starter.')
+            self.secret = self.create('Private ML', 'Machine learning with neural networks.', owner=self.other, is_public=False)
+
+    def create(self, title, body, owner=None, is_public=True):
+        return Content.objects.create(title=title, body=body, owner=owner or self.user, is_public=is_public)
+
+    def related(self, content, **params):
+        return self.client.get(reverse('content-related', args=[content.pk]), params)
+
+    def test_related_ranks_visible_rows(self):
+        response = self.related(self.ml)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual(results[0]['id'], self.dl.pk)
+        self.assertNotIn(self.secret.pk, [result['id'] for result in results])
+        self.assertNotIn(self.ml.pk, [result['id'] for result in results])
+        self.assertEqual(self.related(self.ml, limit=0).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.related(self.secret).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_index_follows_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('content-detail', args=[self.bread.pk]), {'body': 'Deep learning and neural networks.'}, format='json')
+            self.client.delete(reverse('content-detail', args=[self.dl.pk]))
+            self.client.post(reverse('content-bulk'), [{'title': 'Bread', 'body': 'Sourdough bread starter.'}], format='json')
+        self.assertEqual(self.related(self.ml).json()['results'][0]['id'], self.bread.pk)
+        self.assertNotIn(self.dl.pk, [result['id'] for result in self.related(self.ml).json()['results']])
+        self.assertIsNotNone(get_similarity_index().vector(Content.objects.get(title='Bread').pk))
+
+    def test_growth_and_rebuild(self):
+        index = SimilarityIndex(tempfile.mkdtemp(), 64)
+        self.addCleanup(shutil.rmtree, index.path)
+        index.upsert([(pk, f'filler text {pk}') for pk in range(100, 1300)])
+        index.upsert([(1, 'neural networks'), (2, 'neural networks and python')])
+        self.assertEqual([pk for pk, _ in index.related(1, 1)], [2])
+        index.remove([2])
+        self.assertNotIn(2, [pk for pk, _ in index.related(1, 5)])
+
+        call_command('rebuild_similarity_index', stdout=mock.MagicMock())
+        self.assertEqual(self.related(self.ml).json()['results'][0]['id'], self.dl.pk)
+
+    def test_slot_map_survives_growth(self):
+        index = SimilarityIndex(tempfile.mkdtemp(), 64)
+        self.addCleanup(shutil.rmtree, index.path)
+        index.upsert([(pk, f'text number {pk}') for pk in range(2000, 0, -1)])
+        index.remove(range(1, 2000, 2))
+        kept = {pk: index.vector(pk).tolist() for pk in (2, 1000, 2000)}
+        index.upsert([(pk, f'more text {pk}') for pk in range(5000, 5600)])  # past the slot map: grows and compacts
+        self.assertEqual(int(index._refresh().used[0]), 1600)
+        self.assertEqual({pk: index.vector(pk).tolist() for pk in kept}, kept)
+        self.assertIsNone(index.vector(1))
+        self.assertIsNotNone(index.vector(5599))
+        self.assertGreaterEqual(index.related(5000, 1)[0][0], 5000)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user')
+        Content.objects.create(title='Hello', body='World', owner=self.user)
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram('test_seconds', 'Test.', ['route'], buckets=[0.1, 1])
+        self.addCleanup(metrics.REGISTRY.remove, histogram)
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, 'a"b')
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{route="a\\"b",le="0.1"} 2', lines)
+        self.assertIn('test_seconds_bucket{route="a\\"b",le="1"} 3', lines)
+        self.assertIn('test_seconds_bucket{route="a\\"b",le="+Inf"} 4', lines)
+        self.assertIn('test_seconds_count{route="a\\"b"} 4', lines)
+
+    def test_requests_are_timed_per_route(self):
+        requests_before = metrics.HTTP_DURATION.get('GET', 'content-list')[0]
+        queries_before = metrics.DB_QUERIES.get('content-list')
+        response = self.client.get(reverse('content-list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="[1-9]\d* queries", llm;dur=0\.0;desc="0 calls, 0 cached", total;dur=')
+        self.assertEqual(metrics.HTTP_DURATION.get('GET', 'content-list')[0], requests_before + 1)
+        self.assertGreater(metrics.DB_QUERIES.get('content-list'), queries_before)
+
+        scrape = self.client.get(reverse('metrics'))
+        self.assertEqual(scrape['Content-Type'], metrics.CONTENT_TYPE)
+        self.assertIn('http_responses_total{method="GET",route="content-list",status="200"}', scrape.content.decode())
+        self.client.get('/no/such/page/')
+        self.assertIn('route="unmatched"', self.client.get(reverse('metrics')).content.decode())
+
+    def test_metrics_token(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+
+    def test_metrics_closed_to_outside_clients(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.5').status_code, 403)
+        with self.settings(METRICS_ALLOWED_NETWORKS=['203.0.113.0/24']):
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.5').status_code, 200)
+        staff = get_user_model().objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.5').status_code, 200)
+
+    def test_shared_directory_sums_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        retries = metrics.LLM_RETRIES.get()
+        other = {name: [] for name in (metric.name for metric in metrics.REGISTRY)}
+        other['llm_retries_total'] = [[[], 5]]
+        other['llm_request_duration_seconds'] = [[['llama3-8b-8192', 'ok'], [[1] + [0] * 10, 0.05, 1]]]
+        with open(os.path.join(directory, 'other-1-1.0.json'), 'w') as f:
+            json.dump({'started': 1.0, 'metrics': other}, f)
+        calls = metrics.LLM_DURATION.get('llama3-8b-8192', 'ok')[0]
+        with self.settings(METRICS_DIR=directory):
+            scrape = self.client.get(reverse('metrics')).content.decode()
+            self.assertEqual(len(os.listdir(directory)), 2)  # this process published its own file
+        self.assertIn(f'llm_retries_total {retries + 5}', scrape)
+        self.assertIn(f'llm_request_duration_seconds_count{{model="llama3-8b-8192",outcome="ok"}} {calls + 1}', scrape)
+        self.assertIn('process_start_time_seconds 1.0', scrape)
+
+    def test_llm_calls_tokens_and_cache_hits(self):
+        before = {
+            'calls': metrics.LLM_DURATION.get('llama3-8b-8192', 'ok')[0],
+            'prompt': metrics.LLM_TOKENS.get('llama3-8b-8192', 'prompt'),
+            'hits': metrics.ANALYSIS_CACHE.get('hit'),
+            'misses': metrics.ANALYSIS_CACHE.get('miss'),
+        }
+        reply = json.dumps({'summary': 'S', 'sentiment': 'neutral', 'topics': ['t'], 'recommendations': 'R'})
+        result = {'choices': [{'message': {'content': reply}}], 'usage': {'prompt_tokens': 40, 'completion_tokens': 12}}
+        self.client.force_authenticate(user=self.user)
+        with mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}), \
+                mock.patch.object(GroqClient, 'post', return_value=result):
+            first = self.client.post(reverse('ai-analyze'), {'text': 'Metrics text', 'engine': 'groq'}, format='json')
+            second = self.client.post(reverse('ai-analyze'), {'text': 'Metrics text', 'engine': 'groq'}, format='json')
+        self.assertIn('llm;dur=', first['Server-Timing'])
+        self.assertIn('desc="1 calls, 0 cached"', first['Server-Timing'])
+        self.assertIn('desc="0 calls, 1 cached"', second['Server-Timing'])
+        self.assertEqual(metrics.LLM_DURATION.get('llama3-8b-8192', 'ok')[0], before['calls'] + 1)
+        self.assertEqual(metrics.LLM_TOKENS.get('llama3-8b-8192', 'prompt'), before['prompt'] + 40)
+        self.assertEqual(metrics.ANALYSIS_CACHE.get('hit'), before['hits'] + 1)
+        self.assertEqual(metrics.ANALYSIS_CACHE.get('miss'), before['misses'] + 1)
+
+
+class SeedContentTest(TestCase):
+    def test_seeds_reproducible_rows(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        with self.settings(SIMILARITY_INDEX_DIR=path):
+            call_command('seed_content', users=3, categories=2, content=30, batch_size=8, prefix='seed', stdout=mock.MagicMock())
+            call_command('seed_content', users=3, categories=2, content=5, prefix='seed', skip_index=True, stdout=mock.MagicMock())
+        self.assertEqual(get_user_model().objects.filter(username__startswith='seed-').count(), 3)
+        self.assertTrue(get_user_model().objects.get(username='seed-1').check_password('benchpass123'))
+        self.assertEqual(Category.objects.filter(name__startswith='seed category').count(), 2)
+        self.assertEqual(Content.objects.count(), 35)
+        done = Content.objects.filter(analysis_status=Content.AnalysisStatus.DONE)
+        self.assertTrue(done.exists())
+        self.assertTrue(all(row.summary and row.analysis_engine == 'local' for row in done))
+        self.assertTrue(Content.objects.filter(analysis_status=Content.AnalysisStatus.PENDING).exists())
+        self.assertTrue(Content.objects.filter(search_vector__isnull=False).exists())
+
+
+class LLMThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username='user')
+        self.client.force_authenticate(user=self.user)
+
+    def analyze(self, text, engine='groq'):
+        return self.client.post(reverse('ai-analyze'), {'text': text, 'engine': engine}, format='json')
+
+    def test_token_budget(self):
+        with self.settings(LLM_USER_TOKENS_PER_WINDOW=1000, LLM_TOKEN_WINDOW=3600), \
+                mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}), \
+                mock.patch.object(GroqClient, 'chat', return_value='{}'):
+            self.assertEqual(self.analyze('word ' * 400).status_code, status.HTTP_200_OK)
+            response = self.analyze('text ' * 400)
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertGreater(int(response['Retry-After']), 0)
+            self.assertEqual(self.analyze('text ' * 400, engine='local').status_code, status.HTTP_200_OK)
+            self.assertEqual(self.analyze('word ' * 400).status_code, status.HTTP_200_OK)  # cached: no GROQ call
+
+            # Content writes are charged for the analysis they queue; reads are not.
+            other = get_user_model().objects.create(username='other')
+            self.client.force_authenticate(user=other)
+            body = {'title': 'Long', 'body': 'word ' * 2000}
+            self.assertEqual(self.client.post(reverse('content-list'), body, format='json').status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.client.post(reverse('content-list'), body, format='json').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(self.client.get(reverse('content-list')).status_code, status.HTTP_200_OK)
+
+    def test_reservation_follows_reported_usage(self):
+        reply = {'choices': [{'message': {'content': '{}'}}], 'usage': {'total_tokens': 20}}
+        with self.settings(LLM_USER_TOKENS_PER_WINDOW=1000, LLM_TOKEN_WINDOW=3600), \
+                mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}), \
+                mock.patch.object(GroqClient, 'post', return_value=reply):
+            # Each estimate is over half the budget, but GROQ reports using 20 tokens.
+            for i in range(3):
+                self.assertEqual(self.analyze(f'word{i} ' * 400).status_code, status.HTTP_200_OK)
+            reply['usage']['total_tokens'] = 2000
+            self.assertEqual(self.analyze('more ' * 400).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.analyze('other ' * 10).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_refused_requests_reserve_nothing(self):
+        with self.settings(LLM_USER_TOKENS_PER_WINDOW=1000), mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}), \
+                mock.patch.object(UserRateThrottle, 'allow_request', return_value=False), \
+                mock.patch.object(UserRateThrottle, 'wait', return_value=60), \
+                mock.patch.object(LLMThrottle, 'allow_request') as llm_throttle:
+            self.assertEqual(self.analyze('word ' * 400).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        llm_throttle.assert_not_called()
+
+    def test_limits_need_a_shared_atomic_cache(self):
+        check_cache_backend()  # no limits
+        with self.settings(LLM_GLOBAL_CONCURRENCY=64), self.assertRaises(ImproperlyConfigured):
+            check_cache_backend()  # local memory is per process
+
+    def test_concurrency_slots(self):
+        with self.settings(LLM_USER_CONCURRENCY=1):
+            lease = acquire_llm(self.user, 10)
+            with self.assertRaises(Throttled):
+                acquire_llm(self.user, 10)
+            lease.release()
+            acquire_llm(self.user, 10).release()
+
+    def test_streamed_analysis(self):
+        def events(response):
+            return [
+                (event[len('event: '):event.index('\n')], json.loads(event[event.index('data: ') + 6:]))
+                for event in b''.join(response.streaming_content).decode().strip().split('\n\n')
+            ]
+
+        with StubGroqServer([(200, 'Streamed analysis text')]) as stub, self.settings(GROQ_API_URL=stub.url, LLM_USER_CONCURRENCY=1), \
+                mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}):
+            response = self.client.post(reverse('ai-analyze'), {'text': 'Some text', 'stream': True}, format='json')
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            with self.assertRaises(Throttled):
+                acquire_llm(self.user, 10)  # the slot is held while the stream is open
+            self.assertEqual(events(response), [
+                ('delta', {'text': 'Streamed '}), ('delta', {'text': 'analysis '}), ('delta', {'text': 'text'}),
+                ('done', {'ai_result': 'Streamed analysis text'}),
+            ])  # consuming the stream closes the response, which frees the slot
+            acquire_llm(self.user, 10).release()
+
+            # The streamed answer was cached; cache hits stream as one delta.
+            self.assertEqual(self.analyze('Some text').json(), {'ai_result': 'Streamed analysis text'})
+            response = self.client.post(reverse('ai-analyze'), {'text': 'Some text', 'stream': True}, format='json')
+            self.assertEqual(events(response)[0], ('delta', {'text': 'Streamed analysis text'}))
+        self.assertEqual(len(stub.requests), 1)
+
+        # A stream cut off before [DONE] ends with an error and is not cached.
+        with StubGroqServer([(200, 'Cut short')], done=False) as stub, self.settings(GROQ_API_URL=stub.url), \
+                mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}):
+            response = self.client.post(reverse('ai-analyze'), {'text': 'Other text', 'stream': True}, format='json')
+            self.assertEqual([event for event, _ in events(response)], ['delta', 'delta', 'error'])
+            self.assertIsNone(get_analysis_cache().get(make_key('Other text', GROQ_MODEL, SYSTEM_PROMPT + ANALYSIS_USER_PROMPT)))
+
+        cancelled = metrics.LLM_DURATION.get('llama3-8b-8192', 'cancelled')[0]
+        with StubGroqServer([(200, 'One two three')]) as stub:
+            chunks = GroqClient(stub.url, api_key='test').stream([{'role': 'user', 'content': 'hi'}])
+            self.assertEqual(next(chunks), 'One ')
+            chunks.close()
+        self.assertEqual(metrics.LLM_DURATION.get('llama3-8b-8192', 'cancelled')[0], cancelled + 1)
+
+    def test_groq_rate_limit_starts_cooldown(self):
+        with StubGroqServer([(429, '', {'Retry-After': '30'})]) as stub:
+            client = GroqClient(stub.url, api_key='test', backoff_max=8)
+            with self.assertRaises(LLMRateLimited) as raised:
+                client.chat([{'role': 'user', 'content': 'hi'}])
+            self.assertEqual(raised.exception.retry_after, 30)
+            with self.assertRaises(LLMRateLimited):
+                client.chat([{'role': 'user', 'content': 'hi'}])
+        self.assertEqual(len(stub.requests), 1)  # the second call never left the process
+        self.assertEqual(client.breaker.state, 'closed')
+
+    def test_async_client_uses_the_async_cache_api(self):
+        # The blocking helpers would stall the event loop on a cache round trip.
+        async def run(client):
+            self.assertEqual(await client.chat([{'role': 'user', 'content': 'hi'}]), 'ok')
+            with self.assertRaises(LLMRateLimited):
+                await client.chat([{'role': 'user', 'content': 'hi'}])
+
+        with StubGroqServer([(429, '', {'Retry-After': '0'}), (200, 'ok'), (429, '', {'Retry-After': '30'})]) as stub, \
+                mock.patch('content.services.llm.cooldown_remaining', side_effect=AssertionError), \
+                mock.patch('content.services.llm.start_cooldown', side_effect=AssertionError):
+            asyncio.run(run(AsyncGroqClient(stub.url, api_key='test', backoff_max=8)))
+        self.assertGreater(cooldown_remaining(), 20)
+
+        with mock.patch.dict('os.environ', {'GROQ_API_KEY': 'test'}):
+            response = self.analyze('Some text')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response['Retry-After'], '30')
+            self.assertEqual(self.analyze('Some text', engine='auto').status_code, status.HTTP_200_OK)
+
+
+class SingleFlightTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_threads_share_one_call(self):
+        flights, calls, release = SingleFlight(), [], threading.Event()
+        shared = metrics.ANALYSIS_COALESCED.get('process')
+
+        def call():
+            calls.append(1)
+            release.wait(5)
+            if len(calls) > 1:
+                raise ValueError('failed')
+            return {'summary': 'S'}
+
+        results = []
+
+        def worker():
+            try:
+                results.append(flights.do('key', call))
+            except ValueError as e:
+                results.append(e)
+
+        for _ in range(2):
+            threads = [threading.Thread(target=worker) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            deadline = time.monotonic() + 5
+            while metrics.ANALYSIS_COALESCED.get('process') < shared + 4 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            release.set()
+            for thread in threads:
+                thread.join()
+            shared, release = metrics.ANALYSIS_COALESCED.get('process'), threading.Event()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(results[:5], [{'summary': 'S'}] * 5)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results[5:]))  # failures are shared too
+
+    def test_async_call_cancelled_with_last_waiter(self):
+        flights, calls = AsyncSingleFlight(), []
+
+        async def call(delay):
+            calls.append(1)
+            await asyncio.sleep(delay)
+            return 'done'
+
+        async def scenario():
+            results = await asyncio.gather(*(flights.do('key', call, 0.05) for _ in range(3)))
+            impatient = asyncio.ensure_future(flights.do('key', call, 0.2))
+            patient = asyncio.ensure_future(flights.do('key', call, 0.2))
+            await asyncio.sleep(0.05)
+            impatient.cancel()
+            results.append(await patient)  # the other waiter giving up does not cancel the call
+            lone = asyncio.ensure_future(flights.do('key', call, 10))
+            await asyncio.sleep(0.05)
+            lone.cancel()
+            await asyncio.sleep(0)
+            return results, flights._calls
+
+        results, pending = asyncio.run(scenario())
+        self.assertEqual(results, ['done'] * 4)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(pending, {})
+
+    def test_shared_lease_waits_for_other_process(self):
+        lease_key = LEASE_KEY.format('key')
+        with shared_lease('key', lambda: None) as value:
+            self.assertIsNone(value)
+            self.assertIsNotNone(cache.get(lease_key))
+        self.assertIsNone(cache.get(lease_key))
+
+        cache.add(lease_key, 'other', 60)  # held by another process, whose result lands on the third check
+        checks = []
+        with shared_lease('key', lambda: checks.append(1) or ('result' if len(checks) == 3 else None)) as value:
+            self.assertEqual(value, 'result')
+        with self.settings(ANALYSIS_SINGLEFLIGHT_WAIT=0.1), shared_lease('key', lambda: None) as value:
+            self.assertIsNone(value)  # gave up waiting; computes it without the lease
+        self.assertEqual(cache.get(lease_key), 'other')
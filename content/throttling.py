@@ -0,0 +1,255 @@
+import contextvars, math, threading, time
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+from content.metrics import LLM_THROTTLED
+
+
+# LLM usage limits. HTTP throttles count requests, but one request can cost
+# a few hundred GROQ tokens or tens of thousands. Requests that will call
+# GROQ (now, or through the analysis worker) reserve their estimated tokens
+# in sliding one-minute windows, per user and globally, and requests that
+# wait on GROQ also hold an in-flight slot. Once a request is done its
+# reservation is corrected to the tokens GROQ reported using. Counters live
+# in the default cache, which must be shared by every process and increment
+# atomically (Redis or memcached) while any limit is enabled.
+
+KEY = 'llm-throttle:{}'
+LIMITS = ('LLM_USER_TOKENS_PER_WINDOW', 'LLM_GLOBAL_TOKENS_PER_WINDOW', 'LLM_USER_CONCURRENCY', 'LLM_GLOBAL_CONCURRENCY')
+
+_metered = contextvars.ContextVar('llm_lease', default=None)
+
+
+def check_cache_backend():
+    """
+    Raises ImproperlyConfigured when an LLM limit is enabled on a cache that
+    is per-process (local memory) or increments non-atomically (files,
+    database): each worker would enforce its own limits, or lose updates.
+    """
+    enabled = [name for name in LIMITS if getattr(settings, name)]
+    if enabled and not isinstance(caches['default'], (RedisCache, BaseMemcachedCache)):
+        raise ImproperlyConfigured(
+            f'The LLM usage limits ({", ".join(enabled)}) need a Redis or memcached CACHE_BACKEND, not '
+            f'{settings.CACHES["default"]["BACKEND"]}; set one or set the limits to 0.'
+        )
+
+
+def _incr(key, amount, timeout):
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key, amount)
+    except ValueError:  # evicted in between
+        cache.set(key, amount, timeout)
+        return amount
+
+
+def _take_tokens(scope, tokens, limit, window):
+    """
+    Reserves `tokens` in the sliding window of `scope` and returns
+    (counter key, 0), or returns (None, seconds until they would fit). The window is approximated
+    from two fixed windows: the previous one counts in proportion to its
+    overlap with the last `window` seconds. A request larger than the limit
+    is let through when the window is empty.
+    """
+    now = time.time()
+    index, elapsed = divmod(now / window, 1)
+    current_key, previous_key = KEY.format(f'tokens:{scope}:{int(index)}'), KEY.format(f'tokens:{scope}:{int(index) - 1}')
+    previous = cache.get(previous_key) or 0
+    # Reserve first, then check, so concurrent requests cannot all squeeze into the same remainder.
+    current = _incr(current_key, tokens, math.ceil(window * 2))
+    before = previous * (1 - elapsed) + current - tokens
+    if before <= 0 or before + tokens <= limit:
+        return current_key, 0
+    cache.decr(current_key, tokens)
+    excess = before + tokens - limit
+    if excess <= previous * (1 - elapsed):
+        return None, excess / previous * window  # the previous window's share decays enough
+    # Wait for the current window to end, then for its own share to decay enough.
+    current -= tokens
+    share = 1 - (limit - tokens) / current if current else 0
+    return None, ((1 - elapsed) + min(max(share, 0.0), 1.0)) * window
+
+
+def _take_slot(scope, limit):
+    key = KEY.format(f'inflight:{scope}')
+    count = _incr(key, 1, settings.LLM_SLOT_TTL)
+    cache.touch(key, settings.LLM_SLOT_TTL)  # a crashed worker's slots are freed once the scope is idle this long
+    if count > limit:
+        cache.decr(key)
+        return None
+    return key
+
+
+class LLMLease:
+    """
+    What one request holds: its token reservations and in-flight slots.
+    GROQ calls made while it is the current lease (see `acquire_llm`)
+    report the tokens they used to it; `release` corrects the reservations
+    to that usage and frees the slots.
+    """
+    def __init__(self, tokens=0):
+        self.tokens = tokens
+        self.reserved = []
+        self.slots = []
+        self.used = None  # None until a GROQ call reports its usage
+        self._lock = threading.Lock()
+
+    def record_usage(self, tokens):
+        with self._lock:
+            if self.reserved:
+                self.used = (self.used or 0) + tokens
+
+    def release(self):
+        with self._lock:
+            reserved, used, self.reserved, self.used = self.reserved, self.used, [], None
+        if used is not None and used != self.tokens:
+            for key in reserved:
+                try:
+                    if used > self.tokens:
+                        cache.incr(key, used - self.tokens)
+                    else:
+                        cache.decr(key, self.tokens - used)
+                except ValueError:  # the window has expired
+                    pass
+        for key in self.slots:
+            try:
+                cache.decr(key)
+            except ValueError:  # expired meanwhile
+                pass
+        self.slots = []
+
+
+def record_llm_usage(usage):
+    """
+    Charges a finished GROQ call's `usage` block to the current request's
+    lease, if any.
+    """
+    lease, tokens = _metered.get(), (usage or {}).get('total_tokens')
+    if lease is not None and isinstance(tokens, int):
+        lease.record_usage(tokens)
+
+
+class LeasedStream:
+    """
+    Streaming response content that holds an LLMLease until the server
+    closes the response (after the last chunk, or once the client has gone)
+    rather than until its headers are ready. Django calls `close` on the
+    content of every streaming response, even one never iterated.
+    """
+    def __init__(self, content, lease):
+        self.content = content
+        self.lease = lease
+
+    def __iter__(self):
+        return iter(self.content)
+
+    def close(self):
+        self.lease.release()
+
+
+class AsyncLeasedStream(LeasedStream):
+    __iter__ = None  # Django serves content that is iterable synchronously as sync
+
+    def __aiter__(self):
+        return aiter(self.content)
+
+
+def hold_lease(response, lease):
+    """
+    Keeps `lease` until the streaming `response` is closed.
+    """
+    wrapper = AsyncLeasedStream if response.is_async else LeasedStream
+    response.streaming_content = wrapper(response.streaming_content, lease)
+
+
+def acquire_llm(user, tokens, concurrent=True):
+    """
+    Reserves `tokens` estimated GROQ tokens for `user` and, when
+    `concurrent`, an in-flight slot per user and globally. Returns an
+    LLMLease, which becomes the current lease of this context (and of the
+    contexts copied from it for worker threads); raises DRF's Throttled
+    (429 with Retry-After) when a limit is reached. Limits set to 0 are not
+    enforced.
+    """
+    window = settings.LLM_TOKEN_WINDOW
+    scopes = [
+        ('user', f'user:{user.pk}', settings.LLM_USER_TOKENS_PER_WINDOW, settings.LLM_USER_CONCURRENCY),
+        ('global', 'global', settings.LLM_GLOBAL_TOKENS_PER_WINDOW, settings.LLM_GLOBAL_CONCURRENCY),
+    ]
+    lease = LLMLease(tokens)
+    for name, scope, token_limit, _ in scopes:
+        if not token_limit or not tokens:
+            continue
+        key, wait = _take_tokens(scope, tokens, token_limit, window)
+        if key is None:
+            for key in lease.reserved:  # refused requests do not use up the user's budget
+                cache.decr(key, tokens)
+            LLM_THROTTLED.inc(f'{name}_tokens')
+            raise Throttled(wait, f'GROQ token budget exhausted ({name}).')
+        lease.reserved.append(key)
+    if concurrent:
+        for name, scope, _, slot_limit in scopes:
+            if not slot_limit:
+                continue
+            key = _take_slot(scope, slot_limit)
+            if key is None:
+                lease.release()
+                LLM_THROTTLED.inc(f'{name}_concurrency')
+                raise Throttled(1, f'Too many AI requests in flight ({name}).')
+            lease.slots.append(key)
+    _metered.set(lease)
+    return lease
+
+
+class LLMThrottle(BaseThrottle):
+    """
+    Applies the LLM usage limits to views that define
+    `get_llm_tokens(request)` (estimated tokens, or None when the request
+    will not use GROQ). Views with `llm_concurrent = True` also hold an
+    in-flight slot until the response is finalized (see LLMThrottleMixin).
+    """
+    def allow_request(self, request, view):
+        tokens = view.get_llm_tokens(request)
+        if tokens is None:
+            return True
+        try:
+            request.llm_lease = acquire_llm(request.user, tokens, concurrent=view.llm_concurrent)
+        except Throttled as e:
+            self._wait = e.wait
+            return False
+        return True
+
+    def wait(self):
+        return self._wait
+
+
+class LLMThrottleMixin:
+    """
+    Applies LLMThrottle after a DRF view's own throttles, and only to
+    requests they let through, and frees the request's in-flight slots once
+    its response is ready, or, for a streaming response, once it has been
+    sent.
+    """
+    llm_throttle_class = LLMThrottle
+    llm_concurrent = True
+
+    def get_llm_tokens(self, request):
+        return None
+
+    def check_throttles(self, request):
+        super().check_throttles(request)  # raises Throttled before any tokens are reserved
+        throttle = self.llm_throttle_class()
+        if not throttle.allow_request(request, self):
+            self.throttled(request, throttle.wait())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        lease = getattr(request, 'llm_lease', None)
+        if lease is not None and getattr(response, 'streaming', False):
+            hold_lease(response, lease)
+        elif lease is not None:
+            lease.release()
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -1,6 +1,7 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from content.views.ai_views import AIAnalysisView
+from content.views.ai_views import AIAnalysisView, AIBatchAnalysisView
+from content.views.async_views import AsyncAIAnalysisView, AsyncContentCreateView, AsyncContentUpdateView
 from content.views.category_views import CategoryViewSet
 from content.views.content_views import ContentViewSet
 from content.views.user_views import (
@@ -25,6 +26,15 @@ urlpatterns = [
     path('analytics/', AnalyticsView.as_view(), name='analytics'),
 
     path('ai/analyze/', AIAnalysisView.as_view(), name='ai-analyze'),
+
+    path('ai/analyze/batch/', AIBatchAnalysisView.as_view(), name='ai-analyze-batch'),
+
+    # Async variants, meant to be served by an ASGI server (uvicorn).
+    path('async/ai/analyze/', AsyncAIAnalysisView.as_view(), name='async-ai-analyze'),
+
+    path('async/content/', AsyncContentCreateView.as_view(), name='async-content-create'),
+
+    path('async/content/<int:pk>/', AsyncContentUpdateView.as_view(), name='async-content-update'),
 ]
 
 urlpatterns += router.urls
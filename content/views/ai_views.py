@@ -1,43 +1,238 @@
-import os
-import requests
+import json, math, os
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions, status
+from content.metrics import record_cache_lookup
+from content.models import Content
+from content.services.analysis import (
+    ANALYSIS_USER_PROMPT, ENGINE_AUTO, ENGINE_LOCAL, ENGINES, call_within_budget, coalesced, estimate_analysis_tokens,
+)
+from content.services.batch import analyze_contents, analyze_texts
+from content.services.cache import get_analysis_cache, make_key
+from content.services.llm import GROQ_MODEL, LLMError, LLMRateLimited, LLMUnavailable, get_client
+from content.services.local_analysis import analyze_local
+from content.throttling import LLMThrottleMixin
 
 
-class AIAnalysisView(APIView):
+SYSTEM_PROMPT = "You are an AI assistant that summarizes, analyzes sentiment, extracts topics, and recommends related content."
+
+
+def get_engine(data):
+    """
+    The analysis engine requested in `data` (ANALYSIS_ENGINE by default), or
+    None if it is not one of ENGINES.
+    """
+    engine = data.get('engine') or settings.ANALYSIS_ENGINE
+    return engine if engine in ENGINES else None
+
+
+def text_error(text):
+    """
+    Why `text` cannot be analyzed, or None. It is hashed, split and
+    tokenized as a string, so lists, objects and numbers are rejected.
+    """
+    if not text:
+        return 'Text is required.'
+    if not isinstance(text, str):
+        return 'Text must be a string.'
+    return None
+
+
+def rate_limited(e):
+    # GROQ asked us to back off; pass that on instead of holding the request.
+    return Response(
+        {'error': 'GROQ API rate limited', 'details': str(e)},
+        status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': str(math.ceil(e.retry_after))},
+    )
+
+
+def local_result(text):
+    # Shaped like a GROQ answer (the analysis as JSON text), tagged with the engine.
+    return {'ai_result': json.dumps(analyze_local([text])[0]), 'engine': ENGINE_LOCAL}
+
+
+def wants_stream(data):
+    return data.get('stream') in (True, 'true', '1')
+
+
+def sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def event_stream(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx would otherwise hold the events back
+    return response
+
+
+def result_events(result):
+    # An answer that is ready at once (cached or local), as a stream: one delta, then done.
+    yield sse('delta', {'text': result['ai_result']})
+    yield sse('done', result)
+
+
+def groq_events(chunks, cache_key):
+    """
+    Relays GROQ's text as `delta` events, then caches the full answer and
+    sends it in a `done` event. A failure midway, or a stream cut off before
+    GROQ finished, ends with an `error` event and caches nothing.
+    Closing this generator (the client went away) closes `chunks`, and with
+    it the GROQ request.
+    """
+    parts = []
+    try:
+        for text in chunks:
+            parts.append(text)
+            yield sse('delta', {'text': text})
+    except LLMError as e:
+        yield sse('error', {'error': 'GROQ API error', 'details': str(e)})
+        return
+    finally:
+        chunks.close()
+    result = {'ai_result': ''.join(parts)}
+    get_analysis_cache().set(cache_key, result)
+    yield sse('done', result)
+
+
+class AIAnalysisView(LLMThrottleMixin, APIView):
+    """
+    Analyzes `text` with the requested `engine` ("groq", "local" or "auto",
+    default ANALYSIS_ENGINE). In auto mode GROQ failures and answers slower
+    than ANALYSIS_LATENCY_BUDGET are replaced by a local analysis.
+
+    With `"stream": true` the answer is sent as server-sent events while
+    GROQ writes it: `delta` events with the text so far, then a `done`
+    event with the usual response body. Errors before the first token get
+    the usual JSON responses; the latency budget does not apply.
+    """
     permission_classes = [permissions.IsAuthenticated]  # Only logged-in users can use AI features (DRF built-in).
 
+    def get_llm_tokens(self, request):
+        text = request.data.get('text')
+        if not text or not isinstance(text, str) or get_engine(request.data) in (None, ENGINE_LOCAL):
+            return None
+        if self.lookup_cache(text)[1] is not None:
+            return None  # answered from the analysis cache
+        return estimate_analysis_tokens(text, max_tokens=256)
+
+    def lookup_cache(self, text):
+        # The cache key and cached analysis of `text`, looked up once per request.
+        if not hasattr(self, 'cache_lookup'):
+            cache_key = make_key(text, GROQ_MODEL, SYSTEM_PROMPT + ANALYSIS_USER_PROMPT)
+            cached = get_analysis_cache().get(cache_key)
+            record_cache_lookup(cached is not None)
+            self.cache_lookup = cache_key, cached
+        return self.cache_lookup
+
     def post(self, request):
         text = request.data.get('text')
-        if not text:
-            return Response({'error': 'Text is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        error = text_error(text)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+        engine = get_engine(request.data)
+        if engine is None:
+            return Response({'error': f'"engine" must be one of: {", ".join(ENGINES)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        stream = wants_stream(request.data)
+        respond = (lambda result: event_stream(result_events(result))) if stream else Response
+        if engine == ENGINE_LOCAL:
+            return respond(local_result(text))
 
         api_key = os.getenv('GROQ_API_KEY')
         if not api_key:
+            if engine == ENGINE_AUTO:
+                return respond(local_result(text))
             return Response({'error': 'GROQ API key not set.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        payload = {
-            "model": "llama3-8b-8192",
-            "messages": [
-                {"role": "system", "content": "You are an AI assistant that summarizes, analyzes sentiment, extracts topics, and recommends related content."},
-                {"role": "user", "content": f"Summarize, analyze sentiment, extract topics, and recommend related content for: {text}"}
-            ],
-            "max_tokens": 256,
-        }
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json',
-        }
+        # Identical texts are answered from the analysis cache.
+        cache_key, cached = self.lookup_cache(text)
+        if cached is not None:
+            return respond(cached)
+
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": ANALYSIS_USER_PROMPT.format(text=text)}
+        ]
+        budget = settings.ANALYSIS_LATENCY_BUDGET if engine == ENGINE_AUTO else 0
         try:
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30,
+            if stream:
+                return event_stream(groq_events(get_client().stream(messages, max_tokens=256), cache_key))
+            # Identical texts analyzed concurrently share one GROQ call.
+            result = call_within_budget(
+                budget, coalesced, cache_key, lambda: {'ai_result': get_client().chat(messages, max_tokens=256)},
             )
-            response.raise_for_status()
-            ai_content = response.json()['choices'][0]['message']['content']
-            return Response({'ai_result': ai_content})
-        except requests.RequestException as e:
+        except (LLMError, TimeoutError) as e:
+            if engine == ENGINE_AUTO:
+                return respond(local_result(text))
+            if isinstance(e, LLMRateLimited):
+                return rate_limited(e)
+            if isinstance(e, LLMUnavailable):
+                return Response({'error': 'GROQ API unavailable', 'details': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
             return Response({'error': 'GROQ API error', 'details': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(result)
+
+
+class AIBatchAnalysisView(LLMThrottleMixin, APIView):
+    """
+    Analyzes several items in one request, fanning the GROQ calls out over a
+    bounded thread pool. Send either `ids` (content rows to analyze and
+    update; your own rows unless you are an admin) or `texts`, and
+    optionally an `engine` as for AIAnalysisView.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_llm_tokens(self, request):
+        if get_engine(request.data) in (None, ENGINE_LOCAL):
+            return None
+        ids, texts = request.data.get('ids'), request.data.get('texts')
+        if isinstance(ids, list) and ids and len(ids) <= settings.AI_BATCH_MAX_ITEMS:
+            try:
+                queryset = Content.objects.filter(pk__in=[int(pk) for pk in ids])
+            except (TypeError, ValueError):
+                return None  # rejected by post()
+            if not request.user.is_staff:
+                queryset = queryset.filter(owner=request.user)
+            return sum(estimate_analysis_tokens(body) for body in queryset.values_list('body', flat=True))
+        if isinstance(texts, list) and texts and len(texts) <= settings.AI_BATCH_MAX_ITEMS:
+            return sum(estimate_analysis_tokens(str(text)) for text in texts)
+        return None
+
+    def post(self, request):
+        ids = request.data.get('ids')
+        texts = request.data.get('texts')
+        items = ids if ids is not None else texts
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'A non-empty "ids" or "texts" list is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.AI_BATCH_MAX_ITEMS:
+            return Response(
+                {'error': f'At most {settings.AI_BATCH_MAX_ITEMS} items per batch.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        engine = get_engine(request.data)
+        if engine is None:
+            return Response({'error': f'"engine" must be one of: {", ".join(ENGINES)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        if engine not in (ENGINE_AUTO, ENGINE_LOCAL) and not os.getenv('GROQ_API_KEY'):
+            return Response({'error': 'GROQ API key not set.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        options = {'workers': settings.AI_BATCH_WORKERS, 'rate': settings.AI_BATCH_RATE, 'engine': engine}
+        if ids is None:
+            results = analyze_texts([str(text) for text in texts], **options)
+            return Response({'results': results})
+
+        try:
+            ids = [int(pk) for pk in ids]
+        except (TypeError, ValueError):
+            return Response({'error': '"ids" must be a list of integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = Content.objects.filter(pk__in=ids)
+        if not request.user.is_staff:
+            queryset = queryset.filter(owner=request.user)
+        found = set(queryset.values_list('pk', flat=True))
+        for _ in analyze_contents(queryset, chunk_size=len(ids), **options):
+            pass
+        statuses = dict(Content.objects.filter(pk__in=found).values_list('pk', 'analysis_status'))
+        return Response({
+            'results': [{'id': pk, 'analysis_status': statuses[pk]} for pk in ids if pk in found],
+            'not_found': [pk for pk in ids if pk not in found],
+        })
@@ -0,0 +1,251 @@
+import asyncio, json, math, os
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.utils import timezone
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from content.metrics import record_cache_lookup
+from content.models import Content
+from content.serializers.content_serializers import ContentSerializer
+from content.services.analysis import (
+    ANALYSIS_USER_PROMPT, ENGINE_AUTO, ENGINE_LOCAL, ENGINES, analyze_text_async, coalesced_async, estimate_analysis_tokens,
+)
+from content.services.batch import save_results
+from content.services.cache import get_analysis_cache, make_key
+from content.services.llm import GROQ_MODEL, LLMError, LLMRateLimited, LLMUnavailable, get_async_client
+from content.throttling import acquire_llm, hold_lease
+from content.views.ai_views import (
+    SYSTEM_PROMPT, event_stream, get_engine, local_result, result_events, sse, text_error, wants_stream,
+)
+
+
+# Async (ASGI) versions of the AI endpoints. DRF views are sync-only, so
+# these are plain Django async views that reuse DRF's JWT authentication,
+# throttles and serializers. Under uvicorn a request waiting on GROQ does
+# not hold a worker thread.
+
+
+def authenticate(request):
+    """
+    Authenticates the request with JWT and applies the default throttles.
+    Returns an error JsonResponse, or None when the request may proceed.
+    """
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except APIException as e:
+        return JsonResponse({'detail': str(e.detail)}, status=e.status_code)
+    if result is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=status.HTTP_401_UNAUTHORIZED)
+    request.user = result[0]
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            response = JsonResponse({'detail': 'Request was throttled.'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            wait = throttle.wait()
+            if wait is not None:
+                response['Retry-After'] = str(int(wait) + 1)
+            return response
+    return None
+
+
+def too_many_requests(payload, wait):
+    response = JsonResponse(payload, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+def parse_json(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def local_result_async(text):
+    # The local analyzer is CPU-bound NumPy work; run it off the event loop.
+    return await sync_to_async(local_result, thread_sensitive=False)(text)
+
+
+async def result_events_async(result):
+    for event in result_events(result):
+        yield event
+
+
+async def groq_events_async(chunks, cache_key):
+    """
+    Same as `groq_events`, over the async client's stream. When the client
+    disconnects, Django cancels the task reading this generator, which
+    closes the GROQ request.
+    """
+    parts = []
+    try:
+        async for text in chunks:
+            parts.append(text)
+            yield sse('delta', {'text': text})
+    except LLMError as e:
+        yield sse('error', {'error': 'GROQ API error', 'details': str(e)})
+        return
+    finally:
+        await chunks.aclose()
+    result = {'ai_result': ''.join(parts)}
+    await sync_to_async(get_analysis_cache().set)(cache_key, result)
+    yield sse('done', result)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAIAnalysisView(View):
+    """
+    ASGI version of AIAnalysisView, including `"stream": true`.
+    """
+    http_method_names = ['post']
+
+    async def post(self, request):
+        error = await sync_to_async(authenticate)(request)
+        if error:
+            return error
+        data = parse_json(request)
+        text = data.get('text') if data else None
+        error = text_error(text)
+        if error:
+            return JsonResponse({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+        engine = get_engine(data)
+        if engine is None:
+            return JsonResponse({'error': f'"engine" must be one of: {", ".join(ENGINES)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        stream = wants_stream(data)
+        respond = self.stream_result if stream else JsonResponse
+        if engine == ENGINE_LOCAL:
+            return respond(await local_result_async(text))
+        if not os.getenv('GROQ_API_KEY'):
+            if engine == ENGINE_AUTO:
+                return respond(await local_result_async(text))
+            return JsonResponse({'error': 'GROQ API key not set.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # Cache hits do not use GROQ, so they are not charged against the limits.
+        cache_key = make_key(text, GROQ_MODEL, SYSTEM_PROMPT + ANALYSIS_USER_PROMPT)
+        cached = await sync_to_async(get_analysis_cache().get)(cache_key)
+        record_cache_lookup(cached is not None)
+        if cached is not None:
+            return respond(cached)
+
+        try:
+            lease = await sync_to_async(acquire_llm)(request.user, estimate_analysis_tokens(text, max_tokens=256))
+        except Throttled as e:
+            return too_many_requests({'detail': str(e.detail)}, e.wait)
+        response = None
+        try:
+            response = await self.analyze(text, engine, cache_key, stream)
+            return response
+        finally:
+            if response is not None and response.streaming:
+                hold_lease(response, lease)  # released once the stream is closed
+            else:
+                await sync_to_async(lease.release)()
+
+    @staticmethod
+    def stream_result(result):
+        return event_stream(result_events_async(result))
+
+    async def analyze(self, text, engine, cache_key, stream=False):
+        respond = self.stream_result if stream else JsonResponse
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": ANALYSIS_USER_PROMPT.format(text=text)}
+        ]
+        budget = settings.ANALYSIS_LATENCY_BUDGET if engine == ENGINE_AUTO else 0
+        try:
+            if stream:
+                chunks = await get_async_client().stream(messages, max_tokens=256)
+                return event_stream(groq_events_async(chunks, cache_key))
+            result = await asyncio.wait_for(
+                coalesced_async(cache_key, lambda: self.chat(messages)), budget or None,
+            )
+        except (LLMError, asyncio.TimeoutError) as e:
+            if engine == ENGINE_AUTO:
+                return respond(await local_result_async(text))
+            if isinstance(e, LLMRateLimited):
+                return too_many_requests({'error': 'GROQ API rate limited', 'details': str(e)}, e.retry_after)
+            if isinstance(e, LLMUnavailable):
+                return JsonResponse({'error': 'GROQ API unavailable', 'details': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            return JsonResponse({'error': 'GROQ API error', 'details': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse(result)
+
+    async def chat(self, messages):
+        return {'ai_result': await get_async_client().chat(messages, max_tokens=256)}
+
+
+class AsyncContentMixin:
+    """
+    Saves content through ContentSerializer (which queues the analysis job),
+    then awaits the analysis inline with the async client so the response
+    already carries the AI fields. If GROQ fails the queued job remains and
+    the background worker picks it up. Updates that leave the body unchanged
+    are not re-analyzed, and minor edits are left to the worker.
+    """
+    async def save_and_analyze(self, request, pk=None, partial=False):
+        error = await sync_to_async(authenticate)(request)
+        if error:
+            return error
+        data = parse_json(request)
+        if data is None:
+            return JsonResponse({'detail': 'Invalid JSON body.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        content, run_after, errors, error_status = await sync_to_async(self.save)(request, data, pk, partial)
+        if errors:
+            return JsonResponse(errors, status=error_status)
+
+        # Unchanged bodies keep their analysis; minor edits wait for the worker.
+        if run_after is not None and run_after <= timezone.now():
+            try:
+                lease = await sync_to_async(acquire_llm)(request.user, estimate_analysis_tokens(content.body))
+            except Throttled:
+                lease = None  # over the limits: the queued job analyzes it later
+            if lease is not None:
+                try:
+                    ai_result = await analyze_text_async(content.body)
+                finally:
+                    await sync_to_async(lease.release)()
+                if ai_result:
+                    await sync_to_async(save_results)([content], [ai_result])
+        payload = await sync_to_async(lambda: ContentSerializer(content).data)()
+        return JsonResponse(payload, status=status.HTTP_200_OK if pk else status.HTTP_201_CREATED)
+
+    def save(self, request, data, pk, partial):
+        instance = None
+        if pk is not None:
+            # Same lookup as ContentViewSet: others' private rows are not found rather than forbidden.
+            instance = Content.objects.visible_to(request.user).filter(pk=pk).first()
+            if instance is None:
+                return None, None, {'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND
+            if instance.owner_id != request.user.pk:
+                return None, None, {'detail': 'You do not have permission to perform this action.'}, status.HTTP_403_FORBIDDEN
+        serializer = ContentSerializer(instance, data=data, partial=partial)
+        if not serializer.is_valid():
+            return None, None, serializer.errors, status.HTTP_400_BAD_REQUEST
+        content = serializer.save(owner=request.user) if instance is None else serializer.save()
+        return content, serializer.analysis_run_after, None, None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncContentCreateView(AsyncContentMixin, View):
+    http_method_names = ['post']
+
+    async def post(self, request):
+        return await self.save_and_analyze(request)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncContentUpdateView(AsyncContentMixin, View):
+    http_method_names = ['put', 'patch']
+
+    async def put(self, request, pk):
+        return await self.save_and_analyze(request, pk=pk)
+
+    async def patch(self, request, pk):
+        return await self.save_and_analyze(request, pk=pk, partial=True)
@@ -1,11 +1,15 @@
 from rest_framework import viewsets, permissions, filters
+from content.caching import CachedResponseMixin
 from content.models import Category
+from content.pagination import CategoryCursorPagination
 from content.serializers.category_serializers import CategorySerializer
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]  # Anyone can read, only logged-in users can create/update (DRF built-in).
+    pagination_class = CategoryCursorPagination
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'description']
+    cache_namespaces = ('category',)
@@ -1,15 +1,142 @@
-from rest_framework import viewsets, filters
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from content.caching import CachedResponseMixin
+from content.filters import FullTextSearchFilter
 from content.models import Content
+from content.pagination import ContentCursorPagination
 from content.permissions import IsOwnerOrReadOnly
-from content.serializers.content_serializers import ContentSerializer
+from content.serializers.content_serializers import BulkContentSerializer, ContentSerializer
+from content.services.analysis import estimate_analysis_tokens
+from content.services.export import FORMATS, aiter_chunks, stream_export
+from content.services.similarity import content_text, get_similarity_index
+from content.throttling import LLMThrottleMixin
 
 
-class ContentViewSet(viewsets.ModelViewSet):
-    queryset = Content.objects.all()
+class ContentViewSet(CachedResponseMixin, LLMThrottleMixin, viewsets.ModelViewSet):
+    # Nested category and owner are rendered for every row; the search vector is never serialized.
+    queryset = Content.objects.select_related('category', 'owner').defer('search_vector')
     serializer_class = ContentSerializer
     permission_classes = [IsOwnerOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['title', 'body', 'metadata', 'summary', 'sentiment', 'topics', 'recommendations']
+    pagination_class = ContentCursorPagination
+    filter_backends = [FullTextSearchFilter]  # Ranked full-text search over title, summary, body and topics.
+
+    cache_namespaces = ('content', 'category')
+    llm_concurrent = False  # writes only queue the analysis; the worker calls GROQ
+
+    def get_llm_tokens(self, request):
+        # Charged when the body is written: every new or changed body is analyzed later.
+        if self.action in ('create', 'update', 'partial_update'):
+            items = [request.data]
+        elif self.action == 'bulk' and isinstance(request.data, list):
+            items = request.data
+        else:
+            return None
+        bodies = [item.get('body') for item in items if isinstance(item, dict)]
+        return sum(estimate_analysis_tokens(body) for body in bodies if isinstance(body, str)) or None
+
+    def get_cache_scope(self):
+        # Matches Content.objects.visible_to(): anonymous callers share one entry.
+        user = self.request.user
+        if user.is_staff:
+            return 'staff'
+        return f'user:{user.pk}' if user.is_authenticated else 'public'
+
+    def get_queryset(self):
+        # Private content is only visible to its owner (and admins).
+        return super().get_queryset().visible_to(self.request.user)
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
+
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def export(self, request):
+        """
+        Streams every visible content row as NDJSON (default) or CSV
+        (`?output=csv`), oldest change first. Pass the previous response's
+        `X-Export-Watermark` as `?since=` to only get rows changed after it.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in FORMATS:
+            return Response({'output': f'Choose one of: {", ".join(FORMATS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = Content.objects.visible_to(request.user)
+        since = request.query_params.get('since')
+        if since:
+            try:
+                since = parse_datetime(since)
+            except ValueError:
+                since = None
+            if since is None:
+                return Response({'since': 'Expected an ISO 8601 datetime.'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(updated_at__gt=since)
+        # Rows changed while the export runs are left for the next pull.
+        watermark = queryset.aggregate(watermark=Max('updated_at'))['watermark']
+        if watermark is not None:
+            queryset = queryset.filter(updated_at__lte=watermark)
+
+        chunks, content_type = stream_export(queryset, output, settings.EXPORT_CHUNK_SIZE)
+        if isinstance(request._request, ASGIRequest):
+            chunks = aiter_chunks(chunks)  # served by uvicorn: stream it instead of buffering
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="content.{output}"'
+        # Nothing changed: the client keeps its watermark.
+        watermark = watermark or since
+        if watermark:
+            response['X-Export-Watermark'] = watermark.isoformat()
+        return response
+
+    @action(detail=True, methods=['get'], pagination_class=None)
+    def related(self, request, pk=None):
+        """
+        The `?limit=` (default 10) visible content rows most similar to this
+        one by title and body, best first, from the related-content index.
+        """
+        content = self.get_object()
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= settings.RELATED_CONTENT_MAX_RESULTS:
+            return Response(
+                {'limit': f'Expected an integer from 1 to {settings.RELATED_CONTENT_MAX_RESULTS}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Over-fetch: rows the caller cannot see (or that were deleted) are dropped after ranking.
+        ranked = get_similarity_index().related(content.pk, limit * 4, text=content_text(content.title, content.body))
+        visible = {
+            row['id']: row
+            for row in Content.objects.visible_to(request.user).filter(pk__in=[pk for pk, _ in ranked]).values('id', 'title')
+        }
+        results = [{**visible[pk], 'score': score} for pk, score in ranked if pk in visible]
+        return Response({'id': content.pk, 'results': results[:limit]})
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        """
+        Creates (items without `id`) and updates (items with `id`) up to
+        CONTENT_BULK_MAX_ITEMS rows in one transaction. AI analysis is
+        queued for the background worker. Returns one result per item, in
+        request order: the row id and whether it was created or updated, or
+        the item's validation errors.
+        """
+        serializer = BulkContentSerializer(
+            child=ContentSerializer(), data=request.data, max_length=settings.CONTENT_BULK_MAX_ITEMS,
+            context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+        results = [None] * len(request.data)
+        for index, content, created in serializer.save(owner=request.user):
+            results[index] = {'id': content.pk, 'status': 'created' if created else 'updated'}
+        for index, errors in serializer.item_errors.items():
+            results[index] = {'errors': errors}
+        written = len(results) - len(serializer.item_errors)
+        return Response(
+            {'written': written, 'failed': len(serializer.item_errors), 'results': results},
+            status=status.HTTP_200_OK if written else status.HTTP_400_BAD_REQUEST,
+        )
@@ -0,0 +1,34 @@
+import hmac, ipaddress
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
+from content.metrics import CONTENT_TYPE, render
+
+
+def is_internal(address):
+    """
+    Whether `address` is in one of the METRICS_ALLOWED_NETWORKS.
+    """
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in settings.METRICS_ALLOWED_NETWORKS)
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. When METRICS_TOKEN is set, scrapers must
+    send it as `Authorization: Bearer <token>`; otherwise only staff users
+    and clients in METRICS_ALLOWED_NETWORKS may read it.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected.encode()):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    elif not (request.user.is_staff or is_internal(request.META.get('REMOTE_ADDR', ''))):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -2,9 +2,12 @@ from django.contrib.auth import get_user_model
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from content.caching import get_response_cache_stats
 from content.permissions import IsAdminUser
-from content.models import Content, Category
+from content.pagination import UserCursorPagination
 from content.serializers.user_serializers import UserRegistrationSerializer
+from content.services.cache import get_analysis_cache
+from content.services.counters import get_analytics
 
 
 class UserRegistrationView(generics.CreateAPIView):
@@ -24,6 +27,7 @@ class UserListView(generics.ListAPIView):
     queryset = get_user_model().objects.all()
     serializer_class = UserRegistrationSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = UserCursorPagination
 
 
 class UserDetailView(generics.RetrieveAPIView):
@@ -37,8 +41,9 @@ class AnalyticsView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
+        # Counts come from trigger-maintained counters instead of COUNT(*) scans.
         return Response({
-            'user_count': get_user_model().objects.count(),
-            'content_count': Content.objects.count(),
-            'category_count': Category.objects.count(),
+            **get_analytics(),
+            'analysis_cache': get_analysis_cache().get_stats(),
+            'response_cache': get_response_cache_stats(),
         })
@@ -0,0 +1,15 @@
+# Gunicorn reads this file from the working directory. Each worker thread can hold one database
+# connection (see DB_CONN_MAX_AGE and DB_POOL_MAX_SIZE in config/settings.py), so Postgres needs
+# max_connections of at least WEB_CONCURRENCY x GUNICORN_THREADS for the web service.
+import glob, os
+
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
+
+
+def on_starting(server):
+    # Metrics files of the previous run (METRICS_DIR): totals start again from zero, as after any restart.
+    directory = os.getenv('METRICS_DIR')
+    if directory:
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            os.remove(path)